@@ -0,0 +1,370 @@
+#
+# Service mode ACK pulse detection
+#
+# A decoder on the programming track acknowledges a service mode
+# instruction by drawing at least 60 mA more than its idle current for
+# 6 ms +/- 1 ms (S-9.2.3).  The pulse only shows on an analog current sense
+# channel recorded next to the DCC signal, so this tool finds the pulses in
+# an exported analog sample array and lines them up with the service mode
+# packets decoded from the frame CSV of the same capture, which gives the
+# outcome of every verify and write.
+#
+# The samples are memory-mapped and processed in fixed size chunks with
+# numpy: a moving average (running sum) smooths out the spikes at DCC bit
+# reversals, the idle current is the median of short blocks (an ACK covers
+# too little of a block to move its median), and the pulses are the runs
+# of samples more than the threshold above it, found with one comparison
+# and one diff per chunk.  Memory depends on the chunk size only, so
+# captures with tens of millions of samples take seconds.
+#
+# Sample files:
+#
+#	.npy                   numpy array of samples (needs --rate)
+#	Logic 2 binary export  analog channel, version 0 or 1 (first waveform)
+#	anything else          raw samples of --dtype (needs --rate)
+#
+# Samples are converted to mA with --scale, mA per sample unit (1000 / R
+# for the voltage across an R ohm sense resistor).  Sample times must be on
+# the time base of the frame CSV; --start sets the time of the first sample.
+#
+# ACK CSV columns:  start_time,end_time,mode,operation,register,cv,value,bit,packets,outcome,ack_time,ack_width_ms,ack_peak_ma,ack_delay_ms
+#
+# Usage:
+#
+#	python AckDetector.py frames.csv current.bin [--scale MA] [--threshold MA] [--out acks.csv] [--json]
+#
+
+import csv
+import os
+import struct
+import sys
+
+import numpy as np
+
+import DCCFrames
+
+
+SALEAE_MAGIC = b'<SALEAE>'
+SALEAE_ANALOG = 1
+
+ACK_FIELDS = ('start_time', 'end_time', 'mode', 'operation', 'register', 'cv', 'value', 'bit', 'packets',
+	'outcome', 'ack_time', 'ack_width_ms', 'ack_peak_ma', 'ack_delay_ms')
+
+#
+# Direct mode operations, indexed by bits 2-3 of the first byte
+#
+DIRECT_OPERATIONS = (None, 'verify byte', 'bit', 'write byte')
+
+#
+# CV of each register mode register, the page register (6) has none
+#
+REGISTER_CVS = (None, 1, 2, 3, 4, 29, None, 7, 8)
+PAGE_REGISTER = 6
+
+RESET_PACKET = '00 00 00'
+
+#
+# Load an analog sample file, returns (samples, sample rate, time of the
+# first sample).  The samples are a read only memory map.
+#
+def load_samples(path, rate=None, start=None, dtype='float32'):
+	with open(path, 'rb') as f:
+		header = f.read(64)
+	if header[:8] == SALEAE_MAGIC:
+		version, kind = struct.unpack_from('<ii', header, 8)
+		if kind != SALEAE_ANALOG:
+			raise ValueError("%s: not an analog channel export" % path)
+		if version == 0:
+			begin, sample_rate, downsample, count = struct.unpack_from('<dQQQ', header, 16)
+			offset = 48
+		elif version == 1:
+			begin, trigger, sample_rate, downsample, count = struct.unpack_from('<dddqQ', header, 24)
+			offset = 64
+		else:
+			raise ValueError("%s: unsupported Logic 2 binary export version %d" % (path, version))
+		samples = np.memmap(path, dtype='<f4', mode='r', offset=offset, shape=(count,))
+		return samples, rate or float(sample_rate) / max(1, downsample), begin if start is None else start
+	if rate is None:
+		raise ValueError("%s: the sample rate is needed for raw and .npy samples" % path)
+	if path.endswith('.npy'):
+		samples = np.load(path, mmap_mode='r')
+	else:
+		samples = np.memmap(path, dtype=dtype, mode='r')
+	return samples, float(rate), start or 0.0
+
+#
+# Find the ACK pulses in a sample array, yields (start time, end time,
+# peak mA above the idle current) in time order
+#
+# filter_time is the moving average length and block_time the length of
+# the blocks the idle current is taken over.  Chunks are whole blocks; the
+# moving average carries over chunk boundaries and so does a pulse still
+# open at the end of a chunk.
+#
+def detect_pulses(samples, rate, start=0.0, scale=1.0, threshold=60.0, filter_time=0.0005, block_time=0.02, chunk=1 << 22):
+	width = max(1, int(round(filter_time * rate)))
+	block = max(1, int(round(block_time * rate)))
+	chunk = max(block, chunk // block * block)
+	count = len(samples)
+
+	#
+	# The moving average trails the samples by half its length
+	#
+	delay = (width - 1) / 2.0
+	pulse_times = lambda pulse: (start + (pulse[0] - delay) / rate, start + (pulse[1] - delay) / rate, pulse[2])
+	base = None			# idle current of the last block of the previous chunk
+	rise = None			# sample index where the open pulse started
+	peak = 0.0
+	ended = None		# (rise, fall, peak) of the last pulse, until the next rise
+
+	for lo in range(0, count, chunk):
+		hi = min(count, lo + chunk)
+		n = hi - lo
+		pad = min(lo, width - 1)
+		x = np.asarray(samples[lo - pad:hi], dtype=np.float64) * scale
+		if pad < width - 1:
+			x = np.concatenate((np.full(width - 1 - pad, x[:width].mean()), x))
+		total = np.cumsum(x)
+		filtered = np.empty(n)
+		filtered[0] = total[width - 1]
+		filtered[1:] = total[width:] - total[:-width]
+		filtered /= width
+
+		#
+		# Idle current per block, taking the lower of a block and the one
+		# before it so a pulse across a block boundary cannot raise it
+		#
+		full = n // block * block
+		medians = np.median(filtered[:full].reshape(-1, block), axis=1)
+		if full < n:
+			medians = np.append(medians, np.median(filtered[full:]))
+		previous = np.empty_like(medians)
+		previous[0] = medians[0] if base is None else base
+		previous[1:] = medians[:-1]
+		base = medians[-1]
+		excess = filtered - np.repeat(np.minimum(medians, previous), block)[:n]
+
+		above = excess >= threshold
+		edges = np.flatnonzero(above[1:] != above[:-1]) + 1
+		if above[0] != (rise is not None):
+			edges = np.concatenate(([0], edges))
+		for index in edges.tolist():
+			if above[index]:
+				#
+				# Noise chatters across the threshold on slow edges: a
+				# gap shorter than the moving average joins two pulses
+				#
+				if ended is not None and lo + index - ended[1] < width:
+					rise, peak = ended[0], ended[2]
+				else:
+					if ended is not None:
+						yield pulse_times(ended)
+					rise, peak = lo + index, 0.0
+				ended = None
+			else:
+				if index > max(0, rise - lo):
+					peak = max(peak, float(excess[max(0, rise - lo):index].max()))
+				ended = (rise, lo + index, peak)
+				rise = None
+		if rise is not None:
+			peak = max(peak, float(excess[max(0, rise - lo):].max()))
+	if ended is not None:
+		yield pulse_times(ended)
+	if rise is not None:
+		yield pulse_times((rise, count, peak))
+
+#
+# Service mode instruction of a packet (byte values including the error
+# detection byte), returns (mode, operation, register, cv, value, bit) or
+# None.  Register and paged mode packets have three bytes and direct mode
+# packets four.
+#
+def service_instruction(packet):
+	if not packet or packet[0] & 0xF0 != 0x70:
+		return None
+	if len(packet) == 4:
+		operation = DIRECT_OPERATIONS[(packet[0] >> 2) & 0x03]
+		if operation is None:
+			return None
+		cv = (((packet[0] & 0x03) << 8) | packet[1]) + 1
+		data = packet[2]
+		if operation == 'bit':
+			#
+			# 111KDBBB: K set for write, D the bit value, BBB the bit position
+			#
+			operation = 'write bit' if data & 0x10 else 'verify bit'
+			return ('direct', operation, None, cv, (data >> 3) & 0x01, data & 0x07)
+		return ('direct', operation, None, cv, data, None)
+	if len(packet) == 3:
+		register = (packet[0] & 0x07) + 1
+		operation = 'write byte' if packet[0] & 0x08 else 'verify byte'
+		return ('register', operation, register, REGISTER_CVS[register], packet[1], None)
+	return None
+
+#
+# Service mode operations in a decoded packet stream, yields one dict per
+# run of identical instruction packets, with the end of the window an ACK
+# may start in: the next operation or window seconds after the last packet
+#
+# Service mode starts with a reset packet and ends at the first packet
+# that is not a reset, idle or service mode packet, so operations mode
+# packets to short addresses 112-127 are not mistaken for instructions.
+# Resets also separate the same instruction sent again.  A write to the
+# page register sets the page for paged mode CVs.
+#
+def service_operations(packets, window=0.05):
+	service = False
+	page = None
+	current = None
+	repeat = False
+	for ptype, pstime, petime, presult in packets:
+		if ptype != 'Packet':
+			continue
+		packet = presult.get('packet', '')
+		if packet == RESET_PACKET:
+			service = True
+			repeat = False
+			continue
+		try:
+			values = [int(byte, 16) for byte in packet.split()]
+		except ValueError:
+			continue
+		instruction = service_instruction(values) if service else None
+		if instruction is None:
+			if values and values[0] not in (0x00, 0xFF):
+				service = False
+				page = None
+			continue
+
+		if repeat and packet == current['packet']:
+			current['end_time'] = petime
+			current['packets'] += 1
+			continue
+		if current is not None:
+			current['close'] = min(pstime, current['end_time'] + window)
+			yield current
+
+		mode, operation, register, cv, value, bit = instruction
+		if mode == 'register':
+			if register == PAGE_REGISTER and operation == 'write byte':
+				page = value
+			elif page is not None and register <= 4:
+				mode = 'paged'
+				cv = (page - 1) * 4 + register
+		current = { 'packet': packet, 'start_time': pstime, 'end_time': petime, 'mode': mode, 'operation': operation,
+			'register': register, 'cv': cv, 'value': value, 'bit': bit, 'packets': 1 }
+		repeat = True
+	if current is not None:
+		current['close'] = current['end_time'] + window
+		yield current
+
+#
+# Attach the ACK pulses to the service mode operations
+#
+# Both streams are in time order, so this is one merge pass.  The first
+# pulse of at least min_width that starts inside an operation's window is
+# its ACK; the outcome of a verify is 'match' or 'no match' and of a write
+# 'ack' or 'no ack'.  Returns (operation records, pulse counts), the counts
+# being 'ack', 'long' (wider than max_width, still taken as an ACK),
+# 'short' and 'stray' (outside every window).
+#
+def match_acks(operations, pulses, min_width=0.005, max_width=0.007):
+	counts = dict.fromkeys(('ack', 'long', 'short', 'stray'), 0)
+	pulses = iter(pulses)
+	pulse = next(pulses, None)
+	records = []
+	for op in operations:
+		while pulse is not None and pulse[0] < op['start_time']:
+			counts['stray'] += 1
+			pulse = next(pulses, None)
+		ack = None
+		while pulse is not None and pulse[0] < op['close']:
+			width = pulse[1] - pulse[0]
+			if width < min_width:
+				counts['short'] += 1
+			elif ack is None:
+				ack = pulse
+				counts['long' if width > max_width else 'ack'] += 1
+			else:
+				counts['stray'] += 1
+			pulse = next(pulses, None)
+
+		verify = op['operation'].startswith('verify')
+		record = dict((field, op.get(field)) for field in ACK_FIELDS)
+		if ack is None:
+			record['outcome'] = 'no match' if verify else 'no ack'
+		else:
+			record['outcome'] = 'match' if verify else 'ack'
+			record['ack_time'] = ack[0]
+			record['ack_width_ms'] = (ack[1] - ack[0]) * 1000.0
+			record['ack_peak_ma'] = ack[2]
+			record['ack_delay_ms'] = (ack[0] - op['start_time']) * 1000.0
+		records.append(record)
+	while pulse is not None:
+		counts['stray'] += 1
+		pulse = next(pulses, None)
+	return records, counts
+
+#
+# CV values confirmed by a matched byte verify, { cv: value }
+#
+def verified_values(records):
+	values = {}
+	for record in records:
+		if record['operation'] == 'verify byte' and record['outcome'] == 'match' and record['cv'] is not None:
+			values[record['cv']] = record['value']
+	return values
+
+def write_acks(path, records):
+	with open(path, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(ACK_FIELDS)
+		for record in records:
+			writer.writerow(['' if record[field] is None else record[field] for field in ACK_FIELDS])
+
+def main(argv=None):
+	import argparse
+	import json
+	parser = argparse.ArgumentParser(description="Find service mode ACK pulses in a current sense capture and match them to the decoded instructions")
+	parser.add_argument('frames', help="frame CSV of the programming track")
+	parser.add_argument('samples', help="current sense samples (.npy, Logic 2 binary analog export or raw)")
+	parser.add_argument('--rate', type=float, help="sample rate in Hz (default: from the Logic 2 export)")
+	parser.add_argument('--start', type=float, help="time of the first sample in seconds (default: from the Logic 2 export, or 0)")
+	parser.add_argument('--dtype', default='float32', help="raw sample type")
+	parser.add_argument('--scale', type=float, default=1.0, help="mA per sample unit")
+	parser.add_argument('--threshold', type=float, default=60.0, help="ACK current above idle in mA")
+	parser.add_argument('--min-width', type=float, default=5.0, help="shortest ACK in ms")
+	parser.add_argument('--max-width', type=float, default=7.0, help="longest ACK in ms before it is reported as long")
+	parser.add_argument('--filter', type=float, default=0.5, help="moving average length in ms")
+	parser.add_argument('--block', type=float, default=20.0, help="idle current block length in ms")
+	parser.add_argument('--window', type=float, default=50.0, help="ms after the last instruction packet an ACK may start")
+	parser.add_argument('--out', help="ACK CSV (default: <frames>.acks.csv)")
+	parser.add_argument('--json', action='store_true', help="print the report as JSON")
+	args = parser.parse_args(argv)
+
+	samples, rate, start = load_samples(args.samples, args.rate, args.start, args.dtype)
+	pulses = detect_pulses(samples, rate, start, args.scale, args.threshold, args.filter / 1000.0, args.block / 1000.0)
+	operations = service_operations(DCCFrames.decode_frames(DCCFrames.read_frames(args.frames)), args.window / 1000.0)
+	records, counts = match_acks(operations, pulses, args.min_width / 1000.0, args.max_width / 1000.0)
+
+	out = args.out or os.path.splitext(args.frames)[0] + '.acks.csv'
+	write_acks(out, records)
+	outcomes = {}
+	for record in records:
+		key = "%s %s" % (record['operation'], record['outcome'])
+		outcomes[key] = outcomes.get(key, 0) + 1
+	if args.json:
+		json.dump({ "samples": len(samples), "rate": rate, "operations": outcomes, "pulses": counts,
+			"values": verified_values(records) }, sys.stdout, indent=2)
+		sys.stdout.write("\n")
+	else:
+		print("%s: %d operations, %d samples at %.0f Hz" % (out, len(records), len(samples), rate))
+		for key, count in sorted(outcomes.items()):
+			print("    %-24s %6d" % (key, count))
+		print("    pulses: %s" % ", ".join("%d %s" % (counts[kind], kind) for kind in ('ack', 'long', 'short', 'stray')))
+		for cv, value in sorted(verified_values(records).items()):
+			print("    CV%-5d %3d (0x%02x)" % (cv, value, value))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
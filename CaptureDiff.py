@@ -0,0 +1,268 @@
+#
+# Differential comparison of two decoded captures
+#
+# Lines up two decoded packet streams (for example two command stations, or
+# two firmware versions of one station, running the same DCSControl test)
+# by content and reports missing, extra and reordered packets and timing
+# shifts.
+#
+# Packets are compared by their bytes.  Each distinct packet is interned to
+# an integer, the stream is split per address and consecutive repeats of
+# the same packet (refresh) are collapsed into runs.  Only the much shorter
+# per-address run sequences are aligned, so a million packet capture
+# compares in seconds.
+#
+# Usage:
+#
+#	python CaptureDiff.py a.packets.csv b.packets.csv [--details N] [--json]
+#
+
+import csv
+import json
+import sys
+
+
+#
+# Address part of a packet, as a hex string prefix: one byte for short,
+# broadcast and idle packets, two bytes for long and accessory addresses
+#
+def address_key(packet):
+	first = int(packet[0:2], 16)
+	if 128 <= first < 232:
+		return packet[0:5]
+	return packet[0:2]
+
+#
+# Read a decoded packet CSV into { address: [(packet id, start time), ...] },
+# interning every distinct packet into ids shared by both captures
+#
+def read_stream(path, intern):
+	streams = {}
+	with open(path, newline='') as f:
+		reader = csv.reader(f)
+		header = next(reader)
+		time_col = header.index('start_time')
+		packet_col = header.index('packet')
+		for row in reader:
+			packet = row[packet_col]
+			if not packet:
+				continue
+			pid = intern.get(packet)
+			if pid is None:
+				pid = intern[packet] = len(intern)
+			key = address_key(packet)
+			stream = streams.get(key)
+			if stream is None:
+				stream = streams[key] = []
+			stream.append((pid, float(row[time_col])))
+	return streams
+
+#
+# Collapse consecutive repeats, returns ([packet id], [first time], [count])
+#
+def runs(stream):
+	ids = []
+	times = []
+	counts = []
+	last = None
+	for pid, t in stream:
+		if pid == last:
+			counts[-1] += 1
+		else:
+			ids.append(pid)
+			times.append(t)
+			counts.append(1)
+			last = pid
+	return ids, times, counts
+
+def percentiles(values):
+	if not values:
+		return {}
+	values = sorted(values)
+	pick = lambda f: values[min(len(values) - 1, int(f * len(values)))]
+	return { "min": values[0], "p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": values[-1] }
+
+#
+# Align two run sequences of one address
+#
+# Refresh makes the run sequences highly repetitive (a ramp test cycles
+# through the same speeds again and again), which defeats longest common
+# subsequence matchers: they happily align a cycle with the wrong cycle.
+# Instead both sequences are walked together and, on a mismatch, the
+# smallest skip on either side that resynchronizes them is taken, with
+# run start times (after removing the capture offset) breaking ties.  That
+# costs O(n * window) for n runs.
+#
+# Returns (matched [(i, j)], removed [i], added [j]).  A stray packet
+# splits a refresh run in two; the second half is folded back into the
+# matched run before it instead of being reported (its count moves over,
+# so every packet is still counted once).
+#
+def align(ids_a, times_a, counts_a, ids_b, times_b, counts_b, offset, window=32):
+	matched = []
+	removed = []
+	added = []
+	na = len(ids_a)
+	nb = len(ids_b)
+	i = j = 0
+	while i < na and j < nb:
+		if ids_a[i] == ids_b[j]:
+			matched.append((i, j))
+			i += 1
+			j += 1
+			continue
+
+		best = None
+		for d in range(1, window + 1):
+			for di, dj in ((0, d), (d, 0), (d, d)):
+				ci = i + di
+				cj = j + dj
+				if ci < na and cj < nb and ids_a[ci] == ids_b[cj]:
+					cost = abs(times_b[cj] - times_a[ci] - offset)
+					if best is None or cost < best[0]:
+						best = (cost, ci, cj)
+			if best is not None:
+				break
+		if best is None:
+			ci, cj = i + 1, j + 1
+		else:
+			ci, cj = best[1], best[2]
+
+		last_i, last_j = matched[-1] if matched else (None, None)
+		for k in range(i, ci):
+			if last_i is not None and ids_a[k] == ids_a[last_i]:
+				counts_a[last_i] += counts_a[k]
+				counts_a[k] = 0
+			else:
+				removed.append(k)
+		for k in range(j, cj):
+			if last_j is not None and ids_b[k] == ids_b[last_j]:
+				counts_b[last_j] += counts_b[k]
+				counts_b[k] = 0
+			else:
+				added.append(k)
+		i, j = ci, cj
+	removed.extend(range(i, na))
+	added.extend(range(j, nb))
+	return matched, removed, added
+
+#
+# Compare two captures
+#
+def diff(path_a, path_b, details=0):
+	intern = {}
+	streams_a = read_stream(path_a, intern)
+	streams_b = read_stream(path_b, intern)
+	packets = dict((pid, packet) for packet, pid in intern.items())
+	keys = set(streams_a) | set(streams_b)
+	runs_a = dict((key, runs(streams_a.get(key, ()))) for key in keys)
+	runs_b = dict((key, runs(streams_b.get(key, ()))) for key in keys)
+
+	#
+	# The capture start times are unrelated; estimate the offset from the
+	# first run of every address that starts with the same packet in both
+	#
+	starts = sorted(runs_b[key][1][0] - runs_a[key][1][0] for key in keys
+		if runs_a[key][0] and runs_b[key][0] and runs_a[key][0][0] == runs_b[key][0][0])
+	offset = starts[len(starts) // 2] if starts else 0.0
+
+	aligned = {}
+	for key in keys:
+		ids_a, times_a, counts_a = runs_a[key]
+		ids_b, times_b, counts_b = runs_b[key]
+		matched, removed, added = align(ids_a, times_a, counts_a, ids_b, times_b, counts_b, offset)
+		aligned[key] = (ids_a, times_a, counts_a, ids_b, times_b, counts_b, matched, removed, added)
+
+	#
+	# Timing shifts are measured against the median offset of all matched runs
+	#
+	offsets = sorted(times_b[j] - times_a[i]
+		for (ids_a, times_a, counts_a, ids_b, times_b, counts_b, matched, removed, added) in aligned.values()
+		for i, j in matched)
+	if offsets:
+		offset = offsets[len(offsets) // 2]
+
+	report = { "offset": offset, "addresses": {}, "totals": {} }
+	totals = dict.fromkeys(("packets_a", "packets_b", "changes_matched", "missing", "extra", "reordered", "repeat_delta"), 0)
+	all_shifts = []
+	for key in sorted(aligned):
+		ids_a, times_a, counts_a, ids_b, times_b, counts_b, matched, removed, added = aligned[key]
+		shifts = [times_b[j] - times_a[i] - offset for i, j in matched]
+		repeat_delta = sum(counts_b[j] - counts_a[i] for i, j in matched)
+
+		#
+		# A change that was dropped on one side and inserted on the other
+		# is a reorder, what is left is missing or extra
+		#
+		pending = {}
+		for i in removed:
+			pending.setdefault(ids_a[i], []).append(i)
+		reordered = []
+		extra = []
+		for j in added:
+			candidates = pending.get(ids_b[j])
+			if candidates:
+				reordered.append((candidates.pop(0), j))
+			else:
+				extra.append(j)
+		missing = [i for remaining in pending.values() for i in remaining]
+		missing.sort()
+
+		entry = {
+			"packets_a": sum(counts_a),
+			"packets_b": sum(counts_b),
+			"changes_matched": len(matched),
+			"missing": len(missing),
+			"extra": len(extra),
+			"reordered": len(reordered),
+			"repeat_delta": repeat_delta,
+			"shift": percentiles(shifts),
+		}
+		if details:
+			entry["missing_packets"] = [(times_a[i], packets[ids_a[i]]) for i in missing[:details]]
+			entry["extra_packets"] = [(times_b[j], packets[ids_b[j]]) for j in extra[:details]]
+			entry["reordered_packets"] = [(times_a[i], times_b[j], packets[ids_a[i]]) for i, j in reordered[:details]]
+		report["addresses"][key] = entry
+		for name in totals:
+			totals[name] += entry[name]
+		all_shifts.extend(shifts)
+
+	totals["shift"] = percentiles(all_shifts)
+	report["totals"] = totals
+	return report
+
+def print_report(report, out=sys.stdout):
+	out.write("time offset b-a: %.6f s\n" % report["offset"])
+	out.write("%-8s %9s %9s %8s %8s %8s %8s %9s %10s %10s\n" % ("address", "packets a", "packets b", "matched", "missing", "extra", "reorder", "repeats", "shift p50", "shift max"))
+	rows = list(report["addresses"].items()) + [("total", report["totals"])]
+	for key, e in rows:
+		shift = e["shift"]
+		out.write("%-8s %9d %9d %8d %8d %8d %8d %+9d %10s %10s\n" % (key, e["packets_a"], e["packets_b"], e["changes_matched"],
+			e["missing"], e["extra"], e["reordered"], e["repeat_delta"],
+			"%.3f ms" % (shift["p50"] * 1000) if shift else "-", "%.3f ms" % (shift["max"] * 1000) if shift else "-"))
+		for t, packet in e.get("missing_packets", ()):
+			out.write("    missing  %.6f  %s\n" % (t, packet))
+		for t, packet in e.get("extra_packets", ()):
+			out.write("    extra    %.6f  %s\n" % (t, packet))
+		for ta, tb, packet in e.get("reordered_packets", ()):
+			out.write("    reorder  %.6f -> %.6f  %s\n" % (ta, tb, packet))
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Compare two decoded DCC captures")
+	parser.add_argument('a', help="first decoded packet CSV")
+	parser.add_argument('b', help="second decoded packet CSV")
+	parser.add_argument('--details', type=int, default=0, help="list up to N missing, extra and reordered packets per address")
+	parser.add_argument('--json', action='store_true', help="print the report as JSON")
+	args = parser.parse_args(argv)
+
+	report = diff(args.a, args.b, args.details)
+	if args.json:
+		json.dump(report, sys.stdout, indent=2)
+		sys.stdout.write("\n")
+	else:
+		print_report(report)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,311 @@
+#
+# Conformance test session report
+#
+# Builds the report of a DCS test session from the frame capture of the
+# whole session and the command logs DCSControl.py wrote for each test:
+# report.json for tools and report.html, a self-contained page with one
+# section per test in DCSConformanceTests.getTestList().
+#
+# Every test run starts with the sync marker packet, which splits the
+# capture into one window per run.  Runs are matched to command logs in
+# the order the logs were written (or the order given with --order).  The
+# capture is decoded in one streaming pass: every packet updates the
+# statistics, conformance rule checks and command latencies of the current
+# window, and a window is rendered and its state dropped as soon as the
+# next sync marker starts, so memory does not depend on the capture length.
+#
+# Usage:
+#
+#	python ConformanceReport.py frames.csv --logs DIR [--order TEST ...] [--out report] [--cache DIR]
+#
+# DIR is the JMRI user files directory holding DCSCommandLog-<test>.csv.
+#
+
+import collections
+import html
+import json
+import os
+import sys
+
+import DCCFrames
+from ConformanceRules import ConformanceRules, RULES
+from DCCPacket import DCCPacket
+from LatencyCorrelator import instruction_kind, read_log, summarize
+
+
+LOG_PREFIX = 'DCSCommandLog-'
+TOP_ADDRESSES = 10
+
+STYLE = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+h1 { font-size: 1.5em; } h2 { font-size: 1.2em; border-bottom: 1px solid #ccc; margin-top: 2em; }
+table { border-collapse: collapse; margin: 0.5em 0; } td, th { border: 1px solid #ccc; padding: 2px 8px; text-align: right; }
+th { background: #f0f0f0; } td.text, th.text { text-align: left; }
+.pass { color: #070; } .fail { color: #b00; } .none { color: #888; }
+"""
+
+#
+# Test names in the order of DCSConformanceTests.getTestList(), read by
+# loading DCSControl.py on the headless JMRI stand-ins
+#
+def test_names():
+	import contextlib
+	import io
+	import MockJMRI
+	MockJMRI.install(autostart=False)
+	try:
+		with contextlib.redirect_stdout(io.StringIO()):
+			import DCSControl
+		return DCSControl.a.nmraTests.getTestList()
+	finally:
+		MockJMRI.uninstall()
+
+def log_path(logs, name):
+	return os.path.join(logs, LOG_PREFIX + name.replace(" ", "_") + '.csv')
+
+#
+# Statistics of one test window
+#
+class Section:
+	def __init__(self, name, records, start, sync_time, details=10, window=5.0):
+		self.Name = name
+		self.Start = start
+		self.End = start
+		self.Details = details
+		self.Window = window
+		self.Packets = 0
+		self.Errors = collections.Counter()
+		self.Violations = collections.Counter()
+		self.Examples = []
+		self.Addresses = collections.Counter()
+		self.Latencies = {}
+		self.Missing = collections.Counter()
+		self.System = ''
+
+		#
+		# Commands due on the rails, per expected packet in time order,
+		# skipping repeats of the packet already refreshed (see
+		# LatencyCorrelator.correlate)
+		#
+		self.Pending = {}
+		sync = next((r for r in records if r['command'] == 'sync'), None)
+		if sync is None:
+			return
+		self.System = sync.get('system', '')
+		offset = sync_time - sync['time']
+		last = {}
+		for record in records:
+			packet = record['packet']
+			if not packet or record is sync:
+				continue
+			key = (record['address'], record['long'], instruction_kind(record))
+			if last.get(key) == packet:
+				continue
+			last[key] = packet
+			self.Pending.setdefault(packet, collections.deque()).append((record['time'] + offset, record['command']))
+
+	def Add(self, ptype, pstime, petime, presult, violations):
+		self.Packets += 1
+		self.End = petime
+		error = presult.get('error')
+		if error:
+			for name in error.split(', '):
+				self.Errors[name] += 1
+		for violation in violations:
+			self.Violations[violation[0]] += 1
+			if self.Violations[violation[0]] <= self.Details:
+				self.Examples.append(violation)
+		address = presult.get('address')
+		if address:
+			self.Addresses[address] += 1
+		pending = self.Pending.get(presult.get('packet'))
+		while pending and pending[0][0] <= pstime:
+			due, command = pending.popleft()
+			if pstime - due <= self.Window:
+				self.Latencies.setdefault(command, []).append(pstime - due)
+			else:
+				self.Missing[command] += 1
+
+	def Report(self):
+		for pending in self.Pending.values():
+			for due, command in pending:
+				self.Missing[command] += 1
+		self.Pending = {}
+		latency = {}
+		for command in sorted(set(self.Latencies) | set(self.Missing)):
+			latency[command] = summarize(self.Latencies.get(command, []))
+			latency[command]["missing"] = self.Missing[command]
+		duration = self.End - self.Start
+		return {
+			"name": self.Name,
+			"ran": True,
+			"system": self.System,
+			"start": self.Start,
+			"end": self.End,
+			"duration": duration,
+			"packets": self.Packets,
+			"packet_rate": self.Packets / duration if duration > 0 else 0.0,
+			"errors": dict(self.Errors),
+			"violations": dict((rule, self.Violations[rule]) for rule in RULES),
+			"violation_examples": [{ "rule": rule, "address": address, "start": start, "end": end, "message": message }
+				for (rule, address, start, end, message) in self.Examples],
+			"addresses": dict(self.Addresses.most_common(TOP_ADDRESSES)),
+			"latency": latency,
+		}
+
+#
+# HTML rendering, one fragment per section
+#
+def table(header, rows):
+	out = ["<table><tr>"]
+	out += ["<th class=\"text\">%s</th>" % html.escape(header[0])] + ["<th>%s</th>" % html.escape(h) for h in header[1:]]
+	out.append("</tr>")
+	for row in rows:
+		out.append("<tr><td class=\"text\">%s</td>" % html.escape(str(row[0])))
+		out += ["<td>%s</td>" % html.escape(str(value)) for value in row[1:]]
+		out.append("</tr>")
+	out.append("</table>")
+	return "".join(out)
+
+def ms(value):
+	return "%.2f" % (value * 1000.0) if value is not None else "-"
+
+def render_section(section):
+	name = html.escape(section["name"])
+	if not section["ran"]:
+		return "<h2>%s</h2><p class=\"none\">Not run in this session.</p>" % name
+	failed = sum(section["violations"].values()) + sum(section["errors"].values()) + sum(s["missing"] for s in section["latency"].values())
+	status = "<span class=\"fail\">%d findings</span>" % failed if failed else "<span class=\"pass\">no findings</span>"
+	out = ["<h2>%s</h2>" % name, "<p>%s</p>" % status]
+	out.append(table(("", ""), (("command station", section["system"]), ("capture window", "%.3f s - %.3f s" % (section["start"], section["end"])),
+		("packets", section["packets"]), ("packets/s", "%.1f" % section["packet_rate"]))))
+	if section["latency"]:
+		out.append(table(("command", "count", "missing", "min ms", "p50 ms", "p90 ms", "p99 ms", "max ms"),
+			[(command, s["count"], s["missing"], ms(s.get("min")), ms(s.get("p50")), ms(s.get("p90")), ms(s.get("p99")), ms(s.get("max")))
+				for command, s in section["latency"].items()]))
+	out.append(table(("rule", "violations"), section["violations"].items()))
+	if section["violation_examples"]:
+		out.append(table(("rule", "time s", "message"), [(v["rule"], "%.6f" % v["start"], v["message"]) for v in section["violation_examples"]]))
+	if section["errors"]:
+		out.append(table(("decode error", "count"), sorted(section["errors"].items())))
+	if section["addresses"]:
+		out.append(table(("address", "packets"), section["addresses"].items()))
+	return "".join(out)
+
+#
+# Decode the capture and build the report, returns the report dict after
+# writing <out>.json and <out>.html.  With a cache directory the decoded
+# capture is reused from the decode cache (see DecodeCache.py), so
+# regenerating a report does not decode the capture again.
+#
+def build_report(frames_path, logs, out, order=None, details=10, window=5.0, sync_guard=0.5, names=None, cache=None):
+	if names is None:
+		names = test_names()
+	if order is None:
+		runs = [name for name in names if os.path.exists(log_path(logs, name))]
+		runs.sort(key=lambda name: os.path.getmtime(log_path(logs, name)))
+	else:
+		runs = list(order)
+	logs_by_run = [read_log(log_path(logs, name)) for name in runs]
+	sync_packets = set(r['packet'] for records in logs_by_run for r in records if r['command'] == 'sync')
+
+	rules = ConformanceRules()
+	if cache:
+		from DecodeCache import DecodeCache
+		decoded = DecodeCache(cache).Decode(frames_path)
+	else:
+		decoder = DCCPacket()
+		decoded = DCCFrames.decode_frames(DCCFrames.read_frames(frames_path), decoder)
+	fragments = {}
+	results = {}
+	section = None
+	run = 0
+	last_sync = None
+	packets = 0
+	start = end = None
+
+	def close(section):
+		result = section.Report()
+		results[section.Name] = result
+		fragments[section.Name] = render_section(result)
+
+	for ptype, pstime, petime, presult in decoded:
+		if start is None:
+			start = pstime
+		end = petime
+		packets += 1
+		violations = rules.Packet(ptype, pstime, petime, presult)
+
+		#
+		# A sync marker starts the next run unless another one was seen
+		# within sync_guard seconds (the marker is refreshed for a while)
+		#
+		if presult.get('packet') in sync_packets:
+			if (last_sync is None or pstime - last_sync > sync_guard) and run < len(runs):
+				if section is not None:
+					close(section)
+				section = Section(runs[run], logs_by_run[run], pstime, pstime, details, window)
+				run += 1
+			last_sync = pstime
+		if section is not None:
+			section.Add(ptype, pstime, petime, presult, violations)
+	if section is not None:
+		close(section)
+
+	for name in names + [name for name in runs if name not in names]:
+		if name not in results:
+			results[name] = { "name": name, "ran": False }
+			fragments[name] = render_section(results[name])
+
+	report = {
+		"capture": os.path.basename(frames_path),
+		"start": start,
+		"end": end,
+		"packets": packets,
+		"errors": decoded.Errors if cache else decoder.ErrorSummary(),
+		"violations": rules.Counts,
+		"runs": runs[:run],
+		"notes": [],
+		"tests": [results[name] for name in names + [name for name in runs if name not in names]],
+	}
+	if run < len(runs):
+		report["notes"].append("%d command logs but only %d sync markers in the capture" % (len(runs), run))
+
+	with open(out + '.json', 'w') as f:
+		json.dump(report, f, indent=2)
+	with open(out + '.html', 'w') as f:
+		f.write("<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>DCS Conformance Report</title><style>%s</style></head><body>" % STYLE)
+		f.write("<h1>DCS Conformance Report: %s</h1>" % html.escape(report["capture"]))
+		f.write(table(("", ""), (("packets", packets), ("capture", "%.3f s - %.3f s" % (start or 0.0, end or 0.0)),
+			("tests run", "%d of %d" % (run, len(names))))))
+		for note in report["notes"]:
+			f.write("<p class=\"fail\">%s</p>" % html.escape(note))
+		f.write(table(("rule", "violations"), sorted(rules.Counts.items())))
+		if report["errors"]:
+			f.write(table(("decode error", "count"), sorted(report["errors"].items())))
+		for test in report["tests"]:
+			f.write(fragments[test["name"]])
+		f.write("</body></html>\n")
+	return report
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Build the JSON and HTML report of a DCS conformance test session")
+	parser.add_argument('frames', help="frame CSV of the whole session")
+	parser.add_argument('--logs', required=True, help="directory holding the DCSControl command logs")
+	parser.add_argument('--order', nargs='+', metavar='TEST', help="tests in the order they were run (default: log file times)")
+	parser.add_argument('--out', default='report', help="output path without extension")
+	parser.add_argument('--sync-guard', type=float, default=0.5, help="seconds after a sync marker before another one starts a new run")
+	parser.add_argument('--details', type=int, default=10, help="rule violations listed per test and rule")
+	parser.add_argument('--window', type=float, default=5.0, help="longest latency in seconds before a command counts as missing")
+	parser.add_argument('--cache', metavar='DIR', help="reuse the decoded capture from the decode cache in DIR")
+	args = parser.parse_args(argv)
+
+	report = build_report(args.frames, args.logs, args.out, args.order, args.details, args.window, args.sync_guard, cache=args.cache)
+	print("%s.html: %d packets, %d of %d tests run" % (args.out, report["packets"], len(report["runs"]), len(report["tests"])))
+	for note in report["notes"]:
+		print("    %s" % note)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
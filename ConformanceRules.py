@@ -0,0 +1,134 @@
+####################################################################################
+#
+# Streaming packet format conformance rules
+#
+# Checks the NMRA S-9.2 timing rules a command station's output must obey,
+# packet by packet:
+#
+#	preamble    every packet has at least min_preamble preamble bits
+#	            (command stations must send 14)
+#	spacing     at least min_spacing between the end of a packet and the
+#	            start of the next packet to the same address (5 ms)
+#	gap         no more than max_gap between the end of one packet and
+#	            the start of the next on the rails (30 ms)
+#	refresh     no more than max_refresh between two packets to the same
+#	            address
+#
+# State is the last packet end time per address, so memory is O(1) per
+# address whatever the length of the capture.
+#
+# Times are floats in seconds.  Each packet may carry opaque start and end
+# stamps (the HLA passes the frame GraphTimes) which are handed back in the
+# violations so callers can place annotations without converting times back.
+#
+# Usage:
+#
+#	python ConformanceRules.py frames.csv [--details N] [--json]
+#
+####################################################################################
+import sys
+
+
+RULES = ('preamble', 'spacing', 'gap', 'refresh')
+
+
+class ConformanceRules:
+	def __init__(self, min_preamble=14, min_spacing=0.005, max_gap=0.030, max_refresh=0.5):
+		self.MinPreamble = min_preamble
+		self.MinSpacing = min_spacing
+		self.MaxGap = max_gap
+		self.MaxRefresh = max_refresh
+
+		self.LastEnd = {}		# address -> (end time, end stamp)
+		self.LastPacketEnd = None
+		self.Counts = dict.fromkeys(RULES, 0)
+
+	#-----------------------------------------------------------------------------------
+	#
+	# Check one decoded packet or error, returns a list of violations
+	#
+	# ptype and presult are as returned by DCCPacket.Decode, start and end
+	# are the packet times.  A violation is (rule, address, start_stamp,
+	# end_stamp, message); the stamps span the offending interval, or mark
+	# the packet start for a short preamble.
+	#
+	#-----------------------------------------------------------------------------------
+	def Packet(self, ptype, start, end, presult, start_stamp=None, end_stamp=None):
+		violations = []
+		if start_stamp is None:
+			start_stamp, end_stamp = start, end
+
+		last = self.LastPacketEnd
+		if last is not None and start - last[0] > self.MaxGap:
+			violations.append(('gap', None, last[1], start_stamp,
+				"no packet for %.1f ms" % ((start - last[0]) * 1000.0)))
+		self.LastPacketEnd = (end, end_stamp)
+		if ptype != 'Packet':
+			return self.Count(violations)
+
+		preamble = presult.get('preamble')
+		if preamble is not None and preamble < self.MinPreamble:
+			violations.append(('preamble', presult.get('address'), start_stamp, start_stamp,
+				"preamble %d bits, minimum %d" % (preamble, self.MinPreamble)))
+
+		address = presult.get('address')
+		if address is not None:
+			last = self.LastEnd.get(address)
+			if last is not None:
+				interval = start - last[0]
+				if interval < self.MinSpacing:
+					violations.append(('spacing', address, last[1], start_stamp,
+						"%s repeated after %.2f ms, minimum %.1f ms" % (address, interval * 1000.0, self.MinSpacing * 1000.0)))
+				elif interval > self.MaxRefresh:
+					violations.append(('refresh', address, last[1], start_stamp,
+						"%s not refreshed for %.1f ms" % (address, interval * 1000.0)))
+			self.LastEnd[address] = (end, end_stamp)
+		return self.Count(violations)
+
+	def Count(self, violations):
+		for violation in violations:
+			self.Counts[violation[0]] += 1
+		return violations
+
+#
+# Check a frame CSV, returns { rule: count } and up to details violations
+# per rule as (rule, address, start, end, message)
+#
+def check_file(path, details=10, rules=None):
+	import DCCFrames
+	if rules is None:
+		rules = ConformanceRules()
+	examples = []
+	for ptype, start, end, presult in DCCFrames.decode_frames(DCCFrames.read_frames(path)):
+		for violation in rules.Packet(ptype, start, end, presult):
+			if rules.Counts[violation[0]] <= details:
+				examples.append(violation)
+	return rules.Counts, examples
+
+def main(argv=None):
+	import argparse
+	import json
+	parser = argparse.ArgumentParser(description="Check a DCC capture against the S-9.2 packet timing rules")
+	parser.add_argument('frames', help="frame CSV file")
+	parser.add_argument('--min-preamble', type=int, default=14, help="minimum preamble bits")
+	parser.add_argument('--min-spacing', type=float, default=5.0, help="minimum ms between packets to one address")
+	parser.add_argument('--max-gap', type=float, default=30.0, help="maximum ms between packets")
+	parser.add_argument('--max-refresh', type=float, default=500.0, help="maximum ms between packets to one address")
+	parser.add_argument('--details', type=int, default=10, help="list up to N violations per rule")
+	parser.add_argument('--json', action='store_true', help="print the report as JSON")
+	args = parser.parse_args(argv)
+
+	rules = ConformanceRules(args.min_preamble, args.min_spacing / 1000.0, args.max_gap / 1000.0, args.max_refresh / 1000.0)
+	counts, examples = check_file(args.frames, args.details, rules)
+	if args.json:
+		json.dump({ "counts": counts, "violations": examples }, sys.stdout, indent=2)
+		sys.stdout.write("\n")
+	else:
+		for rule in RULES:
+			print("%-8s %8d" % (rule, counts[rule]))
+		for (rule, address, start, end, message) in examples:
+			print("    %-8s %.6f  %s" % (rule, start, message))
+	return 1 if any(counts.values()) else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
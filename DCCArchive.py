@@ -0,0 +1,314 @@
+#
+# Compact archive of decoded captures
+#
+# A decoded capture is mostly refresh repeats of a few distinct packets
+# at steady intervals, which a packet CSV spells out in full on every row.
+# An archive stores each distinct decoded result once, in a dictionary,
+# and every packet as three integers: the start time as a delta from the
+# previous packet, the packet length, both in ticks (1 ns by default),
+# and the dictionary index.  The columns are written in chunks of
+# --chunk packets, each compressed on its own with zlib.
+#
+#	MAGIC
+#	chunk ...               zlib(start deltas | lengths | indexes)
+#	footer                  JSON: tick rate, dictionary, decoder error
+#	                        counts and the chunk index (offset, size,
+#	                        packets, first start and last end times)
+#	footer offset, MAGIC    '<Q' and MAGIC again, so the footer is found
+#	                        from the end of the file
+#
+# Writing streams: only the current chunk and the dictionary are held in
+# memory.  Reading streams chunk by chunk, and a time window only reads
+# and decompresses the chunks the index says overlap it.
+#
+# Times are kept to the nearest tick; at 1 ns that is below the sample
+# period of any logic analyzer capturing DCC.
+#
+# Usage:
+#
+#	python DCCArchive.py pack capture.csv [capture.dcca] [--chunk 65536] [--cache DIR]
+#	python DCCArchive.py unpack capture.dcca [capture.packets.csv] [--start S] [--end S]
+#	python DCCArchive.py info capture.dcca
+#
+
+import array
+import bisect
+import itertools
+import json
+import os
+import struct
+import sys
+import zlib
+
+import DCCFrames
+from DCCPacket import DCCPacket
+
+
+MAGIC = b'DCCARCH1'
+FORMAT_VERSION = 1
+SUFFIX = '.dcca'
+TRAILER = struct.Struct('<Q')
+
+#
+# Column type codes, 8 byte signed for the start deltas (the first delta of
+# a chunk is from 0) and lengths, 4 byte unsigned for the indexes
+#
+DELTA_TYPE = 'q'
+INDEX_TYPE = 'I' if array.array('I').itemsize == 4 else 'L'
+
+
+class ArchiveError(ValueError):
+	pass
+
+#
+# Streaming archive writer, packets must be added in start time order
+#
+class ArchiveWriter:
+	def __init__(self, path, chunk=65536, ticks=1000000000, level=6):
+		self.Path = path
+		self.Chunk = chunk
+		self.Ticks = ticks
+		self.Level = level
+		self.Results = []
+		self.Known = {}
+		self.Index = []
+		self.Packets = 0
+		self.File = open(path, 'wb')
+		self.File.write(MAGIC)
+		self.Reset()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		if self.File.closed:
+			return
+		if exc[0] is None:
+			self.Close()
+		else:
+			self.File.close()
+
+	def Reset(self):
+		self.Deltas = array.array(DELTA_TYPE)
+		self.Lengths = array.array(DELTA_TYPE)
+		self.Indexes = array.array(INDEX_TYPE)
+		self.First = None
+		self.Previous = 0
+		self.End = None
+
+	def Add(self, ptype, pstime, petime, presult):
+		result = (ptype, tuple(presult.items()))
+		index = self.Known.get(result)
+		if index is None:
+			index = self.Known[result] = len(self.Results)
+			self.Results.append((ptype, presult))
+		start = int(round(pstime * self.Ticks))
+		if self.First is None:
+			self.First = pstime
+		self.Deltas.append(start - self.Previous)
+		self.Lengths.append(max(0, int(round(petime * self.Ticks)) - start))
+		self.Indexes.append(index)
+		self.Previous = start
+		self.End = petime
+		if len(self.Indexes) >= self.Chunk:
+			self.Flush()
+
+	def Flush(self):
+		count = len(self.Indexes)
+		if not count:
+			return
+		data = zlib.compress(self.Deltas.tobytes() + self.Lengths.tobytes() + self.Indexes.tobytes(), self.Level)
+		self.Index.append((self.File.tell(), len(data), count, self.First, self.End))
+		self.File.write(data)
+		self.Packets += count
+		self.Reset()
+
+	#
+	# Write the last chunk and the footer, errors are the decoder's error
+	# counts by name
+	#
+	def Close(self, errors=None, source=None):
+		self.Flush()
+		footer = { 'format': FORMAT_VERSION, 'byteorder': sys.byteorder, 'ticks': self.Ticks, 'source': source,
+			'count': self.Packets, 'errors': errors or {}, 'results': self.Results, 'chunks': self.Index }
+		offset = self.File.tell()
+		self.File.write(json.dumps(footer).encode())
+		self.File.write(TRAILER.pack(offset) + MAGIC)
+		self.File.close()
+		return self.Packets
+
+class ArchiveReader:
+	def __init__(self, path):
+		self.Path = path
+		self.File = open(path, 'rb')
+		try:
+			self.ReadFooter()
+		except (ArchiveError, ValueError, KeyError, struct.error):
+			self.File.close()
+			raise
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.Close()
+
+	def ReadFooter(self):
+		f = self.File
+		size = f.seek(0, os.SEEK_END)
+		if size < 2 * len(MAGIC) + TRAILER.size:
+			raise ArchiveError("%s: not a DCC archive" % self.Path)
+		f.seek(0)
+		head = f.read(len(MAGIC))
+		f.seek(size - TRAILER.size - len(MAGIC))
+		trailer = f.read()
+		if head != MAGIC or trailer[TRAILER.size:] != MAGIC:
+			raise ArchiveError("%s: not a DCC archive or not closed" % self.Path)
+		offset = TRAILER.unpack(trailer[:TRAILER.size])[0]
+		f.seek(offset)
+		footer = json.loads(f.read(size - TRAILER.size - len(MAGIC) - offset).decode())
+		if footer['format'] != FORMAT_VERSION:
+			raise ArchiveError("%s: archive format %s is not supported" % (self.Path, footer['format']))
+		self.Footer = footer
+		self.Ticks = footer['ticks']
+		self.Errors = footer['errors']
+		self.Results = [(ptype, presult) for ptype, presult in footer['results']]
+		self.Chunks = footer['chunks']
+		self.ChunkStarts = [chunk[3] for chunk in self.Chunks]
+		self.Swap = footer['byteorder'] != sys.byteorder
+
+	def __len__(self):
+		return self.Footer['count']
+
+	def __iter__(self):
+		for number in range(len(self.Chunks)):
+			for result in self.ReadChunk(number):
+				yield result
+
+	#
+	# Decoded packets of one chunk, (ptype, pstime, petime, presult) like
+	# DCCFrames.decode_frames.  Packets with the same result share one
+	# presult dict, which must not be modified.  first and last limit the
+	# packets to those starting in [first, last) ticks.
+	#
+	def ReadChunk(self, number, first=None, last=None):
+		offset, size, count = self.Chunks[number][:3]
+		self.File.seek(offset)
+		data = zlib.decompress(self.File.read(size))
+		deltas = array.array(DELTA_TYPE)
+		lengths = array.array(DELTA_TYPE)
+		indexes = array.array(INDEX_TYPE)
+		split = count * deltas.itemsize
+		deltas.frombytes(data[:split])
+		lengths.frombytes(data[split:split + count * lengths.itemsize])
+		indexes.frombytes(data[split + count * lengths.itemsize:])
+		if self.Swap:
+			for column in (deltas, lengths, indexes):
+				column.byteswap()
+		ticks = float(self.Ticks)
+		results = self.Results
+		starts = itertools.accumulate(deltas)
+		if first is not None or last is not None:
+			starts = list(starts)
+			lo = bisect.bisect_left(starts, first) if first is not None else 0
+			hi = bisect.bisect_left(starts, last) if last is not None else count
+			starts, lengths, indexes = starts[lo:hi], lengths[lo:hi], indexes[lo:hi]
+		for start, length, index in zip(starts, lengths, indexes):
+			ptype, presult = results[index]
+			yield ptype, start / ticks, (start + length) / ticks, presult
+
+	#
+	# Packets starting in [start, end), reading only the chunks that can
+	# hold them.  The bounds are compared in ticks, like the stored start
+	# times, so a packet starting exactly at start is never lost to
+	# rounding.
+	#
+	def Window(self, start=None, end=None):
+		first = last = None
+		number = 0
+		if start is not None:
+			first = int(round(start * self.Ticks))
+			number = max(0, bisect.bisect_right(self.ChunkStarts, start) - 1)
+		if end is not None:
+			last = int(round(end * self.Ticks))
+		for number in range(number, len(self.Chunks)):
+			if last is not None and int(round(self.Chunks[number][3] * self.Ticks)) >= last:
+				break
+			for result in self.ReadChunk(number, first, last):
+				yield result
+
+	def Close(self):
+		self.File.close()
+
+#
+# Archive a frame CSV (decoded on the way) or a packet CSV, returns the
+# packet count
+#
+def pack(path, out, chunk=65536, cache=None):
+	with open(path, newline='') as f:
+		header = f.readline().strip().split(',')
+	source = os.path.basename(path)
+	with ArchiveWriter(out, chunk) as writer:
+		add = writer.Add
+		if header[:len(DCCFrames.PACKET_FIELDS)] == list(DCCFrames.PACKET_FIELDS):
+			fields = DCCFrames.PACKET_FIELDS[3:]
+			for row in DCCFrames.read_packets(path):
+				add(row['type'], row['start_time'], row['end_time'], dict((name, row[name]) for name in fields if row[name]))
+			return writer.Close(None, source)
+		if cache:
+			from DecodeCache import DecodeCache
+			packets = DecodeCache(cache).Decode(path)
+			errors = packets.Errors
+		else:
+			decoder = DCCPacket()
+			packets = DCCFrames.decode_frames(DCCFrames.read_frames(path), decoder)
+		for result in packets:
+			add(*result)
+		return writer.Close(errors if cache else decoder.ErrorSummary(), source)
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Pack decoded captures into compact archives and read them back")
+	commands = parser.add_subparsers(dest='command')
+	command = commands.add_parser('pack', help="archive a frame CSV or packet CSV")
+	command.add_argument('input', help="frame CSV (decoded) or packet CSV")
+	command.add_argument('output', nargs='?', help="archive (default: next to the input)")
+	command.add_argument('--chunk', type=int, default=65536, help="packets per compressed chunk")
+	command.add_argument('--cache', metavar='DIR', help="reuse decoded packets from the decode cache in DIR")
+	command = commands.add_parser('unpack', help="write the packets of an archive to a packet CSV")
+	command.add_argument('input', help="archive")
+	command.add_argument('output', nargs='?', help="packet CSV (default: next to the archive)")
+	command.add_argument('--start', type=float, help="first packet start time in seconds")
+	command.add_argument('--end', type=float, help="packets starting before this time in seconds")
+	command = commands.add_parser('info', help="show the contents of an archive")
+	command.add_argument('input', help="archive")
+	args = parser.parse_args(argv)
+
+	base = os.path.splitext(args.input)[0] if args.command else None
+	if args.command == 'pack':
+		if base.endswith('.packets'):
+			base = base[:-len('.packets')]
+		out = args.output or base + SUFFIX
+		count = pack(args.input, out, args.chunk, args.cache)
+		size = os.path.getsize(out)
+		print("%s: %d packets, %d bytes (%.2f bytes/packet)" % (out, count, size, float(size) / max(1, count)))
+	elif args.command == 'unpack':
+		out = args.output or base + '.packets.csv'
+		with ArchiveReader(args.input) as reader:
+			count = DCCFrames.write_packets(out, reader.Window(args.start, args.end))
+		print("%s: %d packets" % (out, count))
+	elif args.command == 'info':
+		with ArchiveReader(args.input) as reader:
+			chunks = reader.Chunks
+			print("%s: %d packets, %d distinct, %d chunks" % (args.input, len(reader), len(reader.Results), len(chunks)))
+			if chunks:
+				print("    %.6f s to %.6f s" % (chunks[0][3], chunks[-1][4]))
+			for name, count in sorted(reader.Errors.items()):
+				print("    %8d  %s" % (count, name))
+	else:
+		parser.print_help()
+		return 2
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
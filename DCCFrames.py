@@ -0,0 +1,198 @@
+#
+# Offline DCC frame handling
+#
+# A minimal frame type that DCCPacket can decode outside of Logic 2, frame
+# and decoded packet CSV files, and a command line decoder that can spread
+# several capture files over a process pool.
+#
+# Frame CSV columns:   type,start_time,end_time,data
+#                      (data is the frame value as an integer, empty if none)
+# Packet CSV columns:  type,start_time,end_time,data,address,packet,error
+#                      (the same fields as the HLA data table export)
+#
+# Usage:
+#
+#	python DCCFrames.py frames.csv [more.csv ...] [--jobs N] [--out DIR] [--filter EXPR] [--cache DIR]
+#	python DCCFrames.py --import-time
+#
+
+import csv
+import os
+import sys
+from collections import namedtuple
+
+from DCCPacket import DCCPacket
+
+
+#
+# Minimal frame accepted by DCCPacket.Decode
+#
+Frame = namedtuple('Frame', 'type start_time end_time data')
+
+PACKET_FIELDS = ('type', 'start_time', 'end_time', 'data', 'address', 'packet', 'error')
+
+#
+# Frame data dicts are shared between frames with the same value
+#
+_FRAME_DATA = [{'data': bytes((value,))} for value in range(256)]
+_NO_DATA = {'data': b''}
+
+
+def make_frame(ftype, start_time, end_time, value=None):
+	return Frame(ftype, start_time, end_time, _NO_DATA if value is None else _FRAME_DATA[value])
+
+def frame_value(frame):
+	data = frame.data.get('data') if frame.data else None
+	return data[0] if data else None
+
+#
+# Synthesize the LLA frames for one packet given as a list of byte values
+# (address, data and error detection byte), returns (frames, end time).
+# The default bit time is a nominal DCC '1' half bit period pair.
+#
+def packet_frames(packet, start_time=0.0, preamble=14, bit_time=116e-6):
+	frames = []
+	t = start_time
+	frames.append(make_frame('preamble', t, t + preamble * bit_time, preamble))
+	t += preamble * bit_time
+	for i, value in enumerate(packet):
+		if i == 0:
+			ftype, stype = 'adbyte', 'psbit'
+		elif i == len(packet) - 1:
+			ftype, stype = 'edbyte', 'dsbit'
+		else:
+			ftype, stype = 'dbyte', 'dsbit'
+		frames.append(make_frame(stype, t, t + bit_time))
+		t += bit_time
+		frames.append(make_frame(ftype, t, t + 8 * bit_time, value))
+		t += 8 * bit_time
+	frames.append(make_frame('pebit', t, t + bit_time))
+	t += bit_time
+	return frames, t
+
+#
+# Append the error detection byte to a list of address and data bytes
+#
+def with_checksum(packet):
+	check = 0
+	for value in packet:
+		check ^= value
+	return list(packet) + [check]
+
+#
+# Read a frame CSV, yields Frames
+#
+def read_frames(path):
+	with open(path, newline='') as f:
+		reader = csv.reader(f)
+		next(reader, None)
+		for row in reader:
+			yield make_frame(row[0], float(row[1]), float(row[2]), int(row[3], 0) if row[3] else None)
+
+def write_frames(path, frames):
+	with open(path, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(('type', 'start_time', 'end_time', 'data'))
+		for frame in frames:
+			value = frame_value(frame)
+			writer.writerow((frame.type, repr(frame.start_time), repr(frame.end_time), '' if value is None else value))
+
+#
+# Decode a frame stream, yields (type, start_time, end_time, result) for
+# every packet or error, the same values the HLA turns into AnalyzerFrames
+#
+def decode_frames(frames, packet=None):
+	if packet is None:
+		packet = DCCPacket()
+	decode = packet.Decode
+	for frame in frames:
+		result = decode(frame)
+		if len(result) == 4:
+			yield result
+
+#
+# Read and write decoded packet CSVs
+#
+def packet_row(ptype, pstime, petime, presult):
+	return [ptype, repr(pstime), repr(petime), presult.get('data', ''), presult.get('address', ''), presult.get('packet', ''), presult.get('error', '')]
+
+def write_packets(path, packets):
+	count = 0
+	with open(path, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(PACKET_FIELDS)
+		for (ptype, pstime, petime, presult) in packets:
+			writer.writerow(packet_row(ptype, pstime, petime, presult))
+			count += 1
+	return count
+
+def read_packets(path):
+	with open(path, newline='') as f:
+		for row in csv.DictReader(f):
+			row['start_time'] = float(row['start_time'])
+			row['end_time'] = float(row['end_time'])
+			yield row
+
+#
+# Decode one frame CSV into a packet CSV, returns (output path, packet
+# count, error counts by name).  With a filter expression (see
+# PacketFilter.py) only the matching packets are written.  With a cache
+# directory the decoded packets come from, or go to, the decode cache (see
+# DecodeCache.py).
+#
+def decode_file(path, out_dir=None, expression=None, cache=None):
+	base = os.path.splitext(os.path.basename(path))[0]
+	out = os.path.join(out_dir or os.path.dirname(path), base + '.packets.csv')
+	if cache:
+		from DecodeCache import DecodeCache
+		decoded = packets = DecodeCache(cache).Decode(path)
+	else:
+		packet = DCCPacket()
+		packets = decode_frames(read_frames(path), packet)
+	if expression:
+		from PacketFilter import PacketFilter
+		match = PacketFilter(expression).Match
+		packets = (result for result in packets if match(result[3]))
+	count = write_packets(out, packets)
+	return out, count, decoded.Errors if cache else packet.ErrorSummary()
+
+#
+# Time to import the decoder in a fresh interpreter, which is what every
+# process pool worker pays on startup
+#
+def import_time(module='DCCPacket'):
+	import subprocess
+	code = "import time; t = time.perf_counter(); import %s; print(time.perf_counter() - t)" % module
+	here = os.path.dirname(os.path.abspath(__file__))
+	output = subprocess.check_output([sys.executable, '-c', code], cwd=here)
+	return float(output)
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Decode DCCAnalyzer frame CSV files into packet CSV files")
+	parser.add_argument('files', nargs='*', help="frame CSV files")
+	parser.add_argument('--jobs', type=int, default=1, help="number of worker processes")
+	parser.add_argument('--out', help="output directory (default: next to each input)")
+	parser.add_argument('--filter', help="only write packets matching this filter expression")
+	parser.add_argument('--cache', metavar='DIR', help="reuse decoded packets from the decode cache in DIR")
+	parser.add_argument('--import-time', action='store_true', help="report the decoder import time and exit")
+	args = parser.parse_args(argv)
+
+	if args.import_time:
+		print("DCCPacket import %.3f ms" % (import_time() * 1000.0))
+		return 0
+
+	if args.jobs > 1 and len(args.files) > 1:
+		from concurrent.futures import ProcessPoolExecutor
+		with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+			results = list(pool.map(decode_file, args.files, [args.out] * len(args.files), [args.filter] * len(args.files), [args.cache] * len(args.files)))
+	else:
+		results = [decode_file(path, args.out, args.filter, args.cache) for path in args.files]
+	for out, count, errors in results:
+		print("%s: %d packets" % (out, count))
+		for name, error_count in sorted(errors.items()):
+			print("    %8d  %s" % (error_count, name))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -1,10 +1,101 @@
+#
+# DCC packet decoder
+#
+# This module has no dependencies other than the speed step tables in
+# DCCSpeed.py, so it can be used by the Logic 2 HLA, command line tools,
+# process pool workers and tests alike.  Once compiled it imports in well
+# under a millisecond (see DCCFrames.py --import-time).  Decode() accepts
+# any frame object with the attributes of a DCCAnalyzer LLA frame:
+#
+#	type        'preamble', 'psbit', 'adbyte', 'dsbit', 'dbyte', 'edbyte' or 'pebit'
+#	start_time  frame start time (any type that supports subtraction)
+#	end_time    frame end time
+#	data        {'data': bytes} holding the frame value in data['data'][0]
+#
+# See DCCFrames.Frame for a minimal implementation.
+#
 
-from saleae.analyzers import HighLevelAnalyzer, AnalyzerFrame, StringSetting, NumberSetting, ChoicesSetting
+from DCCSpeed import ESTOP, STEP_FROM_28, STEP_FROM_128
+
+#
+# Instruction tables, indexed by the low nibble of the first instruction byte
+#
+DECODER_CONTROL = ("Reset", "Hard Reset", "Factory Test", "Factory Test",
+	"Reserved", "Reserved", "Set Flags", "Set Flags",
+	"Reserved", "Reserved", "Set Adv Adr", "Set Adv Adr",
+	"Reserved", "Reserved", "Reserved", "Req Ack")
+
+CONSIST_CONTROL = ("Reserved", "Reserved", "Set Consist FWD", "Set Consist REV") + ("Reserved",) * 12
+
+ADVANCED_OPERATIONS = ("Reserved",) * 13 + ("Analog Function", "Restricted Speed", None)
+
+CV_SHORT = ("CV Short N/A", "CV Short Reserved", "CV Short Accelerate", "CV Short Decelerate",
+	"CV Short Reserved", "CV Short Reserved", "CV Short Reserved", "CV Short Reserved",
+	"CV Short Reserved", "Decoder Lock", "CV Short Reserved", "CV Short Reserved",
+	"CV Short Reserved", "CV Short Reserved", "CV Short Reserved", "CV Short Reserved")
+
+#
+# Indexed by bits 2-3 of the first instruction byte
+#
+CV_LONG = ("CV Long Reserved", "CV Long Verify %x", "CV Long BITS %x", "CV Long Write %x")
+
+#
+# Indexed by the low 5 bits of the first instruction byte
+#
+FEATURE_EXPANSION = ("Binary State Long",) + ("Reserved",) * 28 + ("Binary State Short", "F13-F20 Control", "F21-F28 Control")
+
+#
+# Error kinds, used as indexes into DCCPacket.ErrorCounts.  The unexpected
+# frame kinds follow the decoder state the frame arrived in.
+#
+ERROR_UNEXPECTED_IDLE = 0
+ERROR_UNEXPECTED_PSBIT = 1
+ERROR_UNEXPECTED_ADDRESS = 2
+ERROR_UNEXPECTED_DSBIT = 3
+ERROR_UNEXPECTED_DATA = 4
+ERROR_UNEXPECTED_END = 5
+ERROR_BAD_ERROR_BYTE = 6
+ERROR_SHORT_PREAMBLE = 7
+ERROR_TRUNCATED_PACKET = 8
+ERROR_UNKNOWN_ADDRESS = 9
+
+ERROR_NAMES = ("unexpected frame waiting for preamble", "unexpected frame waiting for packet start bit",
+	"unexpected frame waiting for address", "unexpected frame waiting for data start bit",
+	"unexpected frame waiting for data", "unexpected frame waiting for packet end bit",
+	"bad error detection byte", "short preamble", "truncated packet", "unknown address range")
+
+UNEXPECTED_ERRORS = { None: ERROR_UNEXPECTED_IDLE, 'psbit': ERROR_UNEXPECTED_PSBIT, 'address': ERROR_UNEXPECTED_ADDRESS,
+	'dsbit': ERROR_UNEXPECTED_DSBIT, 'data': ERROR_UNEXPECTED_DATA, 'end': ERROR_UNEXPECTED_END }
+
+#
+# Decoders must see at least 10 preamble bits before a packet start bit
+#
+MIN_PREAMBLE_BITS = 10
+
+#
+# One error exemplar
+#
+class DCCError:
+	__slots__ = ('Kind', 'State', 'FrameType', 'StartTime', 'EndTime', 'Packet')
+
+	def __init__(self, kind, state, frame_type, start_time, end_time, packet):
+		self.Kind = kind
+		self.State = state
+		self.FrameType = frame_type
+		self.StartTime = start_time
+		self.EndTime = end_time
+		self.Packet = packet
+
+	def __repr__(self):
+		return "DCCError(%s, state=%s, frame=%s, start=%s, packet=%s)" % (ERROR_NAMES[self.Kind], self.State, self.FrameType, self.StartTime, self.Packet)
 
 
 class DCCPacket:
 	def __init__(self):
-		self.DCC_BASELINE_PACKET_SPEED_OFFSET = 3
+		self.Debug = False
+		self.ErrorCounts = [0] * len(ERROR_NAMES)
+		self.ErrorSamples = []		# DCCError exemplars, the first SampleLimit of each kind
+		self.SampleLimit = 0
 		
 		self.State = None
 		self.Type = ""
@@ -29,16 +120,32 @@ class DCCPacket:
 		self.Result = { "data": "" }
 		self.NextByte = 0
 
-	def Process(self, frame: AnalyzerFrame):
+	def Process(self, frame):
 		self.EndTime = frame.end_time
 		self.Type = 'Packet'
-		result = self.parse_address()
-		if self.NextByte <= (len(self.Data)-1):
-			result += ", "
-			result += self.parse_command()
+		packet = " ".join(["%02x" % byte for byte in ([self.Address] + self.Data + [self.ErrorByte])])
+		self.Result['packet'] = packet
+		self.Result['preamble'] = self.PreambleBits
+		try:
+			result = self.parse_address()
+			if self.NextByte <= (len(self.Data)-1):
+				result += ", "
+				result += self.parse_command()
+		except IndexError:
+			self.Type = 'Error'
+			self.Result['data'] = "Error: truncated packet"
+			self.CountError(ERROR_TRUNCATED_PACKET, frame.type, frame.end_time)
+			return
 		while (self.NextByte <= (len(self.Data)-1)):
 			result += ", %02x" % self.Data[self.NextByte]
 			self.NextByte += 1
+
+		if self.PreambleBits < MIN_PREAMBLE_BITS:
+			result += ", Short Preamble %d bits" % self.PreambleBits
+			self.CountError(ERROR_SHORT_PREAMBLE, frame.type, frame.end_time)
+		if (self.CheckPEByte() != 0):
+			result += ", Invalid Packet End Byte"
+			self.CountError(ERROR_BAD_ERROR_BYTE, frame.type, frame.end_time)
 			
 		self.Result['data'] = result
 		
@@ -48,22 +155,41 @@ class DCCPacket:
 			val = val ^ dbyte
 		return (val ^ self.ErrorByte)
 		
-	def Error(self, frame: AnalyzerFrame):
+	def Error(self, frame):
 		self.EndTime = frame.end_time
 		self.Type = 'Error'
 		if self.StartTime == None:
 			self.StartTime = frame.start_time
-		self.Type = 'Error'
-		result = "Error detected with %s" % self.State
-		self.Result['data'] = result
+		kind = UNEXPECTED_ERRORS[self.State]
+		self.Result['data'] = "Error: %s frame, %s" % (frame.type, ERROR_NAMES[kind])
+		self.CountError(kind, frame.type, frame.end_time)
 
-	def Decode(self, frame: AnalyzerFrame):
+	#
+	# Count an error, and keep it as an exemplar while there are fewer than
+	# SampleLimit exemplars of its kind.  The count is all an error costs
+	# when sampling is off.
+	#
+	def CountError(self, kind, frame_type, end_time):
+		self.ErrorCounts[kind] += 1
+		if self.ErrorCounts[kind] <= self.SampleLimit:
+			self.ErrorSamples.append(DCCError(kind, self.State, frame_type, self.StartTime, end_time, self.Result.get('packet')))
+		errors = self.Result.get('error')
+		self.Result['error'] = ERROR_NAMES[kind] if errors is None else errors + ", " + ERROR_NAMES[kind]
+
+	#
+	# Error counts by name, leaving out kinds that never occurred
+	#
+	def ErrorSummary(self):
+		return dict((ERROR_NAMES[kind], count) for kind, count in enumerate(self.ErrorCounts) if count)
+
+	def Decode(self, frame):
 		retval = []
 		valid = False
 		if (self.State == None):
 			if frame.type == 'preamble':
 				preamble_bits = frame.data['data'][0]
-				print("Preamble %d bits" % preamble_bits)
+				if self.Debug:
+					print("Preamble %d bits" % preamble_bits)
 				self.StartTime = frame.start_time
 				self.PreambleBits = preamble_bits
 				self.State = 'psbit'
@@ -75,7 +201,8 @@ class DCCPacket:
 		elif (self.State == 'address'):
 			if frame.type == 'adbyte':
 				address_byte = frame.data['data'][0]
-				print("Address %x bits" % address_byte)
+				if self.Debug:
+					print("Address %x bits" % address_byte)
 				self.Address = address_byte
 				self.State = 'dsbit'
 				valid = True
@@ -86,13 +213,15 @@ class DCCPacket:
 		elif (self.State == 'data'):
 			if frame.type == 'dbyte':
 				data_byte = frame.data['data'][0]
-				print("Data %x bits" % data_byte)
+				if self.Debug:
+					print("Data %x bits" % data_byte)
 				self.Data.append(data_byte)
 				self.State = 'dsbit'
 				valid = True
 			elif (frame.type == 'edbyte'):
 				pebyte = frame.data['data'][0]
-				print("Error Detection Byte: %x" % pebyte)
+				if self.Debug:
+					print("Error Detection Byte: %x" % pebyte)
 				self.ErrorByte = pebyte
 				self.State = 'end'
 				valid = True
@@ -103,8 +232,6 @@ class DCCPacket:
 				pstime   = self.StartTime
 				petime   = self.EndTime
 				presult  = self.Result
-				if (self.CheckPEByte() != 0):
-					presult += ", Invalid Packet End Byte"
 				self.Reset()
 				retval = [ptype, pstime, petime, presult]
 				valid = True
@@ -117,6 +244,12 @@ class DCCPacket:
 			presult  = self.Result
 			self.Reset()
 			retval = [ptype, pstime, petime, presult]
+			#
+			# A preamble always starts a new packet, so resynchronize on it
+			# instead of dropping it
+			#
+			if frame.type == 'preamble':
+				self.Decode(frame)
 					
 		return retval
 
@@ -125,19 +258,23 @@ class DCCPacket:
 		if (self.Address == 0):
 			return "broadcast address"
 		elif (self.Address >0 and self.Address < 128):
+			self.Result['address'] = "%d(S)" % self.Address
 			return "decoder short address=%d" % self.Address
 		elif (self.Address > 127 and self.Address < 192):
+			self.Result['address'] = "A%d" % self.Address
 			return "accessory address=%d" % self.Address
 		elif (self.Address >191 and self.Address < 232):
 			msaddr = self.Address & 0x3F
 			lsaddr = self.Data[0]
 			long_address = (msaddr << 8) | lsaddr
 			self.NextByte = 1
+			self.Result['address'] = "%d(L)" % long_address
 			return "decoder long address=%d" % long_address
 		elif (self.Address == 255):
 			return "idle"
 		else:
-			return "RFU: 0x%x" % address_byte
+			self.CountError(ERROR_UNKNOWN_ADDRESS, 'pebit', self.EndTime)
+			return "RFU: 0x%x" % self.Address
 		
 	def parse_service_mode(self, data):
 		cmd = ((data >> 2) & 0x03)
@@ -166,64 +303,37 @@ class DCCPacket:
 		cmd_msb = self.Data[self.NextByte] >> 4
 		cmd_lsb = self.Data[self.NextByte] & 0x0F
 		if cmd_msb == 0:
-			if cmd_lsb == 0:
-				retval = "Reset"
-			elif cmd_lsb == 1:
-				retval = "Hard Reset"
-			elif cmd_lsb == 2 or cmd_lsb == 3:
-				retval = "Factory Test"
-			elif cmd_lsb == 6 or cmd_lsb == 7:
-				retval = "Set Flags"
-			elif cmd_lsb == 10 or cmd_lsb == 11:
-				retval = "Set Adv Adr"
-			elif cmd_lsb == 15:
-				retval = "Req Ack"
-			else:
-				retval = "Reserved"
+			retval = DECODER_CONTROL[cmd_lsb]
 		elif cmd_msb == 1:
-			if cmd_lsb == 2:
-				retval = "Set Consist FWD"
-			elif cmd_lsb == 3:
-				retval = "Set Consist REV"
-			else:
-				retval = "Reserved"
+			retval = CONSIST_CONTROL[cmd_lsb]
 		elif cmd_msb == 3:
-			if cmd_lsb == 13:
-				retval = "Analog Function"
-			elif cmd_lsb == 14:
-				retval = "Restricted Speed"
-			elif cmd_lsb == 15:
+			retval = ADVANCED_OPERATIONS[cmd_lsb]
+			if cmd_lsb == 15:
 				self.NextByte += 1
 				st128dir = self.Data[self.NextByte] & 0x80
-				st128spd = self.Data[self.NextByte] & 0x7f
+				st128step = STEP_FROM_128[self.Data[self.NextByte] & 0x7f]
 				if (st128dir == 0x80):
 					dirstr = "FWD"
 				else:
 					dirstr = "REV"
-				if (st128spd == 0):
+				if (st128step == 0):
 					retval = "Speed 128 %s STOP" % dirstr
-				elif (st128spd == 1):
+				elif (st128step == ESTOP[128]):
 					retval = "Speed 128 %s ESTOP" % dirstr
 				else:
-					retval = "Speed 128 %s %d" % (dirstr, (st128spd-1))
-			else:
-				retval = "Reserved"
-		elif cmd_msb == 4 or cmd_msb == 5:
-			cSpeed = (cmd_lsb << 1) | (cmd_msb & 0x01)
-			if cSpeed == 0 or cSpeed == 1:
-				retval = "Speed 14/28 REV STOP"
-			elif cSpeed == 2 or cSpeed == 3:
-				retval = "Speed 14/28 REV ESTOP"
+					retval = "Speed 128 %s %d" % (dirstr, st128step)
+		elif cmd_msb >= 4 and cmd_msb <= 7:
+			if cmd_msb >= 6:
+				dirstr = "FWD"
 			else:
-				retval = "Speed 14/28 REV %d" % (cSpeed - self.DCC_BASELINE_PACKET_SPEED_OFFSET)
-		elif cmd_msb == 6 or cmd_msb == 7:
-			cSpeed = (cmd_lsb << 1) | (cmd_msb & 0x01)
-			if cSpeed == 0 or cSpeed == 1:
-				retval = "Speed 14/28 FWD STOP"
-			elif cSpeed == 2 or cSpeed == 3:
-				retval = "Speed 14/28 FWD ESTOP"
+				dirstr = "REV"
+			step = STEP_FROM_28[self.Data[self.NextByte] & 0x1F]
+			if step == 0:
+				retval = "Speed 14/28 %s STOP" % dirstr
+			elif step == ESTOP[28]:
+				retval = "Speed 14/28 %s ESTOP" % dirstr
 			else:
-				retval = "Speed 14/28 FWD %d" % (cSpeed - self.DCC_BASELINE_PACKET_SPEED_OFFSET)
+				retval = "Speed 14/28 %s %d" % (dirstr, step)
 		elif cmd_msb == 8 or cmd_msb == 9:
 			if (self.Data[self.NextByte] & 0x10):
 				retval = "Func grp 1 ON %d" % cmd_lsb
@@ -235,41 +345,16 @@ class DCCPacket:
 			else:
 				retval = "Func grp 2 H %d" % cmd_lsb
 		elif cmd_msb == 12 or cmd_msb == 13:
-			state = self.Data[self.NextByte] & 0x1F
-			if state == 0:
-				retval = "Binary State Long"
-			elif state == 0x1D:
-				retval = "Binary State Short"
-			elif state == 0x1E:
-				retval = "F13-F20 Control"
-			elif state == 0x1F:
-				retval = "F21-F28 Control"
-			else:
-				retval = "Reserved"
+			retval = FEATURE_EXPANSION[self.Data[self.NextByte] & 0x1F]
 		elif cmd_msb == 14:
 			state = ((self.Data[self.NextByte] >> 2) & 0x03)
 			val = self.Data[self.NextByte] & 0x03
 			if state == 0:
-				retval = "CV Long Reserved"
-			elif state == 1:
-				retval = "CV Long Verify %x" % val
-			elif state == 2:
-				retval = "CV Long BITS %x" % val
-			elif state == 3:
-				retval = "CV Long Write %x" % val
+				retval = CV_LONG[state]
 			else:
-				retval = "Reserved"
+				retval = CV_LONG[state] % val
 		elif cmd_msb == 15:
-			if cmd_lsb == 0:
-				retval = "CV Short N/A"
-			elif cmd_lsb == 2:
-				retval = "CV Short Accelerate"
-			elif cmd_lsb == 3:
-				retval = "CV Short Decelerate"
-			elif cmd_lsb == 9:
-				retval = "Decoder Lock"
-			else:
-				retval = "CV Short Reserved"
+			retval = CV_SHORT[cmd_lsb]
 		else:
 			 retval = "Reserved"
 			 
@@ -0,0 +1,219 @@
+#
+# Golden corpus regression runner for DCCPacket
+#
+# Decodes every frame stream in corpus/ and checks the output against its
+# golden packet file, then checks decode throughput and import time against
+# the thresholds in corpus/thresholds.json, all in one run.  Any mismatch,
+# exception or slowdown fails the run.
+#
+# The synthetic streams are generated from the packet lists below and
+# cover every branch of DCCPacket.parse_address and parse_command and every
+# DCCPacket error kind, including the unexpected frame error of each
+# decoder state.  Recorded captures can be
+# added by dropping <name>.frames.csv next to them and running --bless.
+#
+# Usage:
+#
+#	python DCCRegression.py             check the corpus
+#	python DCCRegression.py --bless     (re)write the synthetic frame streams
+#	                                    and every golden from the current decoder
+#
+
+import csv
+import glob
+import json
+import os
+import sys
+import time
+
+import DCCFrames
+from DCCPacket import DCCPacket
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+THRESHOLDS = os.path.join(CORPUS, 'thresholds.json')
+
+SHORT = [3]
+LONG = [0xC3, 0xE8]		# long address 1000
+
+
+#
+# Synthetic corpus: name -> list of packets (address and data bytes, the
+# error detection byte is added) or of explicit (type, value) frame lists
+#
+def addresses():
+	packets = [[0x00, 0x00], [0x01, 0x60], [0x7F, 0x60], [0x80, 0x80], [0xBF, 0xF8],
+		[0xC0, 0x00, 0x60], [0xE7, 0xFF, 0x60], [0xFF, 0x00]]
+	packets += [[address, 0x60] for address in range(0xE8, 0xFF)]
+	return packets
+
+def instructions(address):
+	packets = []
+	for first in range(256):
+		if first == 0x3F:
+			for second in (0x00, 0x01, 0x02, 0x50, 0xFF, 0x80, 0x81, 0x82, 0xD0, 0x7F):
+				packets.append(address + [first, second])
+		elif first >= 0xC0:
+			packets.append(address + [first, 0x00])
+		else:
+			packets.append(address + [first])
+	return packets
+
+#
+# The top short addresses with extra data bytes, between a reset and an
+# idle packet.  These are the address bytes of service mode instructions,
+# which DCCPacket decodes as operations mode packets: service mode is only
+# known from the programming track context (see AckDetector.py).
+#
+def addresses_124_127():
+	return [[0x7C | low, 0x00, 0x00] for low in range(4)] + [[0x00, 0x00], [0xFF, 0x00]]
+
+def unexpected_frames():
+	#
+	# Drop one frame of a good packet so the decoder sees the wrong frame
+	# type in each of its states
+	#
+	frames, end = DCCFrames.packet_frames(DCCFrames.with_checksum(SHORT + [0x62]))
+	streams = []
+	for skip in range(len(frames)):
+		streams.append([(f.type, DCCFrames.frame_value(f)) for i, f in enumerate(frames) if i != skip])
+	streams.append([('dbyte', 0x62)])
+	return streams
+
+def packet_errors():
+	#
+	# Bad error detection byte, short preamble and truncated packets
+	#
+	streams = []
+	for packet, preamble in ((SHORT + [0x62, 0x00], 14), (DCCFrames.with_checksum(SHORT + [0x62]), 8),
+			(DCCFrames.with_checksum(SHORT + [0x3F]), 14), (DCCFrames.with_checksum(LONG[0:1]), 14),
+			(LONG + [0x62, 0x55], 9)):
+		frames, end = DCCFrames.packet_frames(packet, preamble=preamble)
+		streams.append([(f.type, DCCFrames.frame_value(f)) for f in frames])
+	return streams
+
+SYNTHETIC = {
+	'addresses': addresses,
+	'instructions_short': lambda: instructions(SHORT),
+	'instructions_long': lambda: instructions(LONG),
+	'addresses_124_127': addresses_124_127,
+	'unexpected_frames': unexpected_frames,
+	'packet_errors': packet_errors,
+}
+
+def synthetic_frames(items, gap=0.005):
+	frames = []
+	t = 0.0
+	for item in items:
+		if item and isinstance(item[0], tuple):
+			for ftype, value in item:
+				frames.append(DCCFrames.make_frame(ftype, t, t + 0.0005, value))
+				t += 0.0005
+		else:
+			packet_frames, t = DCCFrames.packet_frames(DCCFrames.with_checksum(item), t)
+			frames.extend(packet_frames)
+		t += gap
+	return frames
+
+#
+# Decode a frame list, returns (rows, error) where rows are packet CSV rows
+#
+def decode(frames):
+	rows = []
+	try:
+		for result in DCCFrames.decode_frames(frames):
+			rows.append(DCCFrames.packet_row(*result))
+	except Exception as e:
+		return rows, "%s: %s" % (type(e).__name__, e)
+	return rows, None
+
+def read_golden(path):
+	with open(path, newline='') as f:
+		reader = csv.reader(f)
+		next(reader, None)
+		return list(reader)
+
+def write_golden(path, rows):
+	with open(path, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(DCCFrames.PACKET_FIELDS)
+		writer.writerows(rows)
+
+#
+# Frames per second decoding the whole corpus, repeated for at least
+# min_time seconds so the figure is stable
+#
+def throughput(streams, min_time=0.5):
+	frames = [frame for stream in streams for frame in stream]
+	count = 0
+	start = time.perf_counter()
+	elapsed = 0.0
+	while elapsed < min_time:
+		packet = DCCPacket()
+		decode_one = packet.Decode
+		for frame in frames:
+			decode_one(frame)
+		count += len(frames)
+		elapsed = time.perf_counter() - start
+	return count / elapsed
+
+def bless():
+	os.makedirs(CORPUS, exist_ok=True)
+	for name, generate in SYNTHETIC.items():
+		DCCFrames.write_frames(os.path.join(CORPUS, name + '.frames.csv'), synthetic_frames(generate()))
+	for path in sorted(glob.glob(os.path.join(CORPUS, '*.frames.csv'))):
+		rows, error = decode(list(DCCFrames.read_frames(path)))
+		if error:
+			print("%s: %s" % (os.path.basename(path), error))
+			return 1
+		write_golden(path.replace('.frames.csv', '.golden.csv'), rows)
+		print("%s: %d packets" % (os.path.basename(path), len(rows)))
+	return 0
+
+def check(out=sys.stdout):
+	failures = 0
+	streams = []
+	for path in sorted(glob.glob(os.path.join(CORPUS, '*.frames.csv'))):
+		name = os.path.basename(path)[:-len('.frames.csv')]
+		frames = list(DCCFrames.read_frames(path))
+		streams.append(frames)
+		rows, error = decode(frames)
+		golden = read_golden(path.replace('.frames.csv', '.golden.csv'))
+		if error:
+			out.write("FAIL %s: %s after %d packets\n" % (name, error, len(rows)))
+			failures += 1
+			continue
+		mismatch = next((i for i, (got, want) in enumerate(zip(rows, golden)) if got != want), None)
+		if mismatch is None and len(rows) != len(golden):
+			mismatch = min(len(rows), len(golden))
+		if mismatch is not None:
+			got = rows[mismatch] if mismatch < len(rows) else "<end>"
+			want = golden[mismatch] if mismatch < len(golden) else "<end>"
+			out.write("FAIL %s: row %d\n  got  %s\n  want %s\n" % (name, mismatch + 1, got, want))
+			failures += 1
+		else:
+			out.write("ok   %s: %d packets\n" % (name, len(rows)))
+
+	with open(THRESHOLDS) as f:
+		thresholds = json.load(f)
+	rate = throughput(streams)
+	import_ms = DCCFrames.import_time() * 1000.0
+	for label, value, limit, ok in (
+			("decode frames/s", rate, thresholds['min_frames_per_second'], rate >= thresholds['min_frames_per_second']),
+			("import ms", import_ms, thresholds['max_import_ms'], import_ms <= thresholds['max_import_ms'])):
+		out.write("%s %s: %.1f (threshold %.1f)\n" % ("ok  " if ok else "FAIL", label, value, limit))
+		if not ok:
+			failures += 1
+	return failures
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Check DCCPacket against the golden corpus")
+	parser.add_argument('--bless', action='store_true', help="rewrite the synthetic streams and goldens from the current decoder")
+	args = parser.parse_args(argv)
+	if args.bless:
+		return bless()
+	return 1 if check() else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,127 @@
+####################################################################################
+#
+# Speed step mapping for the 14, 28 and 128 speed step modes
+#
+# One set of precomputed tables shared by DCSControl.py (Jython, to drive
+# throttles and predict packets) and the decoder side (DCCPacket,
+# PacketFilter) so commanded and decoded speeds always agree:
+#
+#	JMRI speed setting -> speed step           speed_step(speed, mode)
+#	speed step -> JMRI speed setting           SETTINGS[mode][step]
+#	speed step -> instruction byte             INSTRUCTIONS[mode][forward][step]
+#	instruction byte -> speed step             STEP_FROM_14/28/128[speed bits]
+#
+# Speed steps follow the DCSControl numbering: 0 is STOP, 1 to STEPS[mode]
+# are the speeds and STEPS[mode] + 1 (ESTOP[mode]) is emergency stop.
+#
+# The 128 step instruction byte is the second byte of the 0x3F advanced
+# operations instruction.  The 14 step instruction byte leaves out the FL
+# (F0) bit in bit 4.
+#
+# This module must run on Jython 2.7 as well as Python 3 and has no
+# dependencies.  install.sh copies it next to DCSControl.py.
+#
+####################################################################################
+
+MODES = (14, 28, 128)
+
+STEPS = { 14: 14, 28: 28, 128: 126 }
+
+ESTOP = { 14: 15, 28: 29, 128: 127 }
+
+#
+# Wire speed values of STOP and ESTOP and of the first speed step: the
+# speed steps follow on from the first step value
+#
+_WIRE = { 14: (0, 1, 2), 28: (0, 2, 4), 128: (0, 1, 2) }
+
+def _settings(mode):
+	steps = STEPS[mode]
+	return [0.0] + [float(step) / steps for step in range(1, steps + 1)] + [-1.0]
+
+def _wire_value(mode, step):
+	stop, estop, first = _WIRE[mode]
+	if step == 0:
+		return stop
+	if step == ESTOP[mode]:
+		return estop
+	return step - 1 + first
+
+def _instruction(mode, forward, value):
+	if mode == 128:
+		return (0x80 if forward else 0x00) | value
+	if mode == 28:
+		return (0x60 if forward else 0x40) | ((value & 0x01) << 4) | (value >> 1)
+	return (0x60 if forward else 0x40) | value
+
+def _steps_from_wire(mode, size):
+	stop, estop, first = _WIRE[mode]
+	table = []
+	for value in range(size):
+		if value < estop:
+			table.append(0)
+		elif value < first:
+			table.append(ESTOP[mode])
+		else:
+			table.append(value - first + 1)
+	return table
+
+SETTINGS = dict((mode, _settings(mode)) for mode in MODES)
+
+INSTRUCTIONS = dict((mode, ([_instruction(mode, False, _wire_value(mode, step)) for step in range(ESTOP[mode] + 1)],
+	[_instruction(mode, True, _wire_value(mode, step)) for step in range(ESTOP[mode] + 1)])) for mode in MODES)
+
+#
+# Speed step from the speed bits of an instruction:
+#
+#	STEP_FROM_14[byte & 0x0F]      14 step instruction
+#	STEP_FROM_28[byte & 0x1F]      28 step instruction (bit 4 is the
+#	                               least significant speed bit)
+#	STEP_FROM_128[byte & 0x7F]     second byte of a 128 step instruction
+#
+STEP_FROM_14 = _steps_from_wire(14, 16)
+STEP_FROM_28 = [_steps_from_wire(28, 32)[((bits & 0x0F) << 1) | (bits >> 4)] for bits in range(32)]
+STEP_FROM_128 = _steps_from_wire(128, 128)
+
+#-----------------------------------------------------------------------------------
+#
+# Speed step for a JMRI speed setting, rounded the same way JMRI does: a
+# negative setting is ESTOP, 0 is STOP and any other setting is at least
+# step 1
+#
+#-----------------------------------------------------------------------------------
+def speed_step(speed, mode):
+	steps = STEPS[mode]
+	if speed < 0:
+		return ESTOP[mode]
+	step = int(speed * steps + 0.5)
+	if speed > 0 and step < 1:
+		step = 1
+	if step > steps:
+		step = steps
+	return step
+
+#-----------------------------------------------------------------------------------
+#
+# JMRI speed setting for a speed step, STOP for steps out of range
+#
+#-----------------------------------------------------------------------------------
+def speed_setting(mode, step):
+	settings = SETTINGS[mode]
+	if step < 0 or step >= len(settings):
+		return 0.0
+	return settings[step]
+
+#-----------------------------------------------------------------------------------
+#
+# Speed and direction instruction bytes for a speed step, fl is the F0
+# state carried by 14 step instructions
+#
+#-----------------------------------------------------------------------------------
+def instruction(mode, forward, step, fl=False):
+	byte = INSTRUCTIONS[mode][1 if forward else 0][step]
+	if mode == 128:
+		return [0x3F, byte]
+	if mode == 14 and fl:
+		byte = byte | 0x10
+	return [byte]
@@ -18,7 +18,617 @@ import jmri
 #
 ####################################################################################	
 import collections
-import inspect
+import os
+import threading
+
+import DCCSpeed
+
+####################################################################################
+#
+# Throttle Pool
+#
+# Acquiring a throttle is a slow round trip on slot based command stations
+# (LocoNet, XpressNet) and every throttle that is not released holds a slot.
+# The pool reuses throttles keyed by (address, long), releases the least
+# recently used throttle when the slot cap is reached and records how long
+# each acquisition took.
+#
+####################################################################################
+class ThrottlePool:
+
+	def __init__(self, maxSlots = 8):
+		self.maxSlots = maxSlots
+		self.throttles = collections.OrderedDict()	# (address, long) -> throttle, oldest first
+		self.hits = 0
+		self.evictions = 0
+		self.latencies = []	# acquisition latency in seconds
+	#--------------------------------------------------------------------------
+	#
+	# Return a throttle for the address, acquiring it with dcs.getThrottle
+	# only when it is not already held by the pool
+	#
+	#--------------------------------------------------------------------------
+	def getThrottle(self, dcs, address, isLong):
+		key = (address, isLong)
+		throttle = self.throttles.pop(key, None)
+		if throttle != None:
+			self.throttles[key] = throttle
+			self.hits = self.hits + 1
+			return throttle
+
+		while len(self.throttles) >= self.maxSlots:
+			self.evict()
+
+		start = java.lang.System.nanoTime()
+		throttle = dcs.getThrottle(address, isLong)
+		self.latencies.append((java.lang.System.nanoTime() - start) / 1000000000.0)
+		if throttle == None:
+			raise RuntimeError("Throttle request failed for %d" % address)
+		self.throttles[key] = throttle
+		return throttle
+	#--------------------------------------------------------------------------
+	#
+	# Release the least recently used throttle
+	#
+	#--------------------------------------------------------------------------
+	def evict(self):
+		key, throttle = self.throttles.popitem(last = False)
+		self.evictions = self.evictions + 1
+		throttle.release(None)
+		return key
+	#--------------------------------------------------------------------------
+	#
+	# Release every throttle held by the pool
+	#
+	#--------------------------------------------------------------------------
+	def releaseAll(self):
+		while len(self.throttles) > 0:
+			self.evict()
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Summary of the acquisition statistics
+	#
+	#--------------------------------------------------------------------------
+	def getStats(self):
+		count = len(self.latencies)
+		stats = { "acquired": count, "reused": self.hits, "evicted": self.evictions, "held": len(self.throttles) }
+		if count > 0:
+			stats["min"] = min(self.latencies)
+			stats["max"] = max(self.latencies)
+			stats["mean"] = sum(self.latencies) / count
+		return stats
+
+	def getStatsText(self):
+		stats = self.getStats()
+		text = "Throttles acquired %d, reused %d, evicted %d, held %d" % (stats["acquired"], stats["reused"], stats["evicted"], stats["held"])
+		if stats["acquired"] > 0:
+			text += ", latency min/mean/max %.1f/%.1f/%.1f ms" % (stats["min"] * 1000.0, stats["mean"] * 1000.0, stats["max"] * 1000.0)
+		return text
+
+####################################################################################
+#
+# Command Log
+#
+# Records every throttle command sent by a test with a high resolution
+# timestamp and the DCC packet the command station is expected to put on
+# the rails for it, so the command station's traffic can be correlated
+# with the log (see LatencyCorrelator.py).
+#
+# The log keeps the speed, direction, speed step mode and function state
+# of every address because a DCC speed or function packet carries the
+# whole state, not just the value that changed.
+#
+####################################################################################
+class DCSCommandLog:
+
+	def __init__(self):
+		self.system = ""
+		self.state = {}		# (address, long) -> [mode, forward, speed, functions]
+		self.clear()
+	#--------------------------------------------------------------------------
+	#
+	# Discard all records and restart the log clock
+	#
+	# The address state is kept: the throttle pool hands the same throttles,
+	# with their direction and functions, to the next test.
+	#
+	#--------------------------------------------------------------------------
+	def clear(self):
+		self.records = []
+		self.startTime = java.lang.System.nanoTime()
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Record one throttle command
+	#
+	# command is one of "mode", "direction", "speed", "function" or "sync"
+	# and value is the speed step mode, forward flag, JMRI speed setting or
+	# "F<n>=<state>" string respectively
+	#
+	#--------------------------------------------------------------------------
+	def log(self, address, isLong, command, value):
+		stamp = java.lang.System.nanoTime()
+		packet = self.expectedPacket(address, isLong, command, value)
+		self.records.append((stamp, address, isLong, command, value, packet))
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Update the address state for a command and return the expected
+	# packet as a hex string, or "" if the command sends no packet
+	#
+	#--------------------------------------------------------------------------
+	def expectedPacket(self, address, isLong, command, value):
+		key = (address, isLong)
+		if key not in self.state:
+			self.state[key] = [28, True, 0.0, [False] * 29]
+		state = self.state[key]
+
+		if command == "mode":
+			state[0] = value
+			return ""
+		elif command == "direction":
+			state[1] = value
+			instruction = self.speedInstruction(state)
+		elif command == "speed" or command == "sync":
+			state[2] = value
+			instruction = self.speedInstruction(state)
+		elif command == "function":
+			function = int(value[1:value.index("=")])
+			state[3][function] = value.endswith("1")
+			instruction = self.functionInstruction(state, function)
+		else:
+			return ""
+
+		if isLong:
+			packet = [0xC0 | (address >> 8), address & 0xFF] + instruction
+		else:
+			packet = [address] + instruction
+		check = 0
+		for byte in packet:
+			check = check ^ byte
+		packet.append(check)
+		return " ".join(["%02x" % byte for byte in packet])
+	#--------------------------------------------------------------------------
+	#
+	# Speed and direction instruction bytes for the address state
+	#
+	#--------------------------------------------------------------------------
+	def speedInstruction(self, state):
+		(mode, forward, speed, functions) = state[0:4]
+		return DCCSpeed.instruction(mode, forward, DCCSpeed.speed_step(speed, mode), functions[0])
+	#--------------------------------------------------------------------------
+	#
+	# Function group instruction bytes for the group holding a function
+	#
+	#--------------------------------------------------------------------------
+	def functionInstruction(self, state, function):
+		functions = state[3]
+		if function <= 4:
+			value = 0x80 | (0x10 if functions[0] else 0x00)
+			first, count = 1, 4
+		elif function <= 8:
+			value, first, count = 0xB0, 5, 4
+		elif function <= 12:
+			value, first, count = 0xA0, 9, 4
+		elif function <= 20:
+			value, first, count = 0x00, 13, 8
+		else:
+			value, first, count = 0x00, 21, 8
+		for bit in range(count):
+			if functions[first + bit]:
+				value = value | (1 << bit)
+		if function > 12:
+			return [0xDE if function <= 20 else 0xDF, value]
+		return [value]
+	#--------------------------------------------------------------------------
+	#
+	# Write the log as CSV, times are in seconds from the start of the log
+	#
+	#--------------------------------------------------------------------------
+	def write(self, path):
+		out = open(path, "w")
+		try:
+			out.write("time,system,address,long,command,value,packet\n")
+			for (stamp, address, isLong, command, value, packet) in self.records:
+				out.write("%.9f,%s,%d,%d,%s,%s,%s\n" % ((stamp - self.startTime) / 1000000000.0, self.system, address, isLong, command, value, packet))
+		finally:
+			out.close()
+		return
+####################################################################################
+#
+# Timed Scenario
+#
+# A scripted timeline of throttle actions run at absolute deadlines, so
+# ramps, function toggling at a set rate and stop/start bursts produce
+# the same command station traffic on every run.
+#
+# Every deadline is computed from the scenario start on the monotonic
+# clock (java.lang.System.nanoTime) rather than from the previous action,
+# so a late action never pushes back the ones after it.  The planned and
+# actual time of every action is recorded.  Deadlines are waited out in
+# whole milliseconds rather than by spinning, which would hold a core the
+# JMRI and connection threads need; the remainder shows in the records.
+#
+# An action is (offset, address, isLong, command, value) with offset in
+# seconds from the start of the timeline and command one of "mode" (14,
+# 28 or 128), "direction" (True for forward), "speed" (speed step in the
+# address's mode, the ESTOP step stops in an emergency) or "function"
+# ((function, state)).
+#
+####################################################################################
+class DCSScenario:
+
+	def __init__(self, name = "scenario"):
+		self.name = name
+		self.actions = []
+		self.records = []	# (loop, planned ns, actual ns, address, long, command, value)
+	#--------------------------------------------------------------------------
+	#
+	# Add one action to the timeline
+	#
+	#--------------------------------------------------------------------------
+	def add(self, offset, address, isLong, command, value):
+		self.actions.append((offset, address, isLong, command, value))
+		return self
+	#--------------------------------------------------------------------------
+	#
+	# Step the speed from first to last, one step every interval seconds
+	#
+	#--------------------------------------------------------------------------
+	def ramp(self, start, address, isLong, first, last, interval):
+		if last >= first:
+			steps = range(first, last + 1)
+		else:
+			steps = range(first, last - 1, -1)
+		for i, step in enumerate(steps):
+			self.add(start + i * interval, address, isLong, "speed", step)
+		return self
+	#--------------------------------------------------------------------------
+	#
+	# Switch a function on and off count times, once every period seconds
+	#
+	#--------------------------------------------------------------------------
+	def toggle(self, start, address, isLong, function, period, count):
+		for i in range(count):
+			self.add(start + i * period, address, isLong, "function", (function, True))
+			self.add(start + i * period + period / 2.0, address, isLong, "function", (function, False))
+		return self
+	#--------------------------------------------------------------------------
+	#
+	# Alternate between stop and a speed step count times, once every
+	# period seconds
+	#
+	#--------------------------------------------------------------------------
+	def burst(self, start, address, isLong, step, period, count):
+		for i in range(count):
+			self.add(start + i * period, address, isLong, "speed", step)
+			self.add(start + i * period + period / 2.0, address, isLong, "speed", 0)
+		return self
+	#--------------------------------------------------------------------------
+	#
+	# Length of one pass through the timeline in seconds
+	#
+	#--------------------------------------------------------------------------
+	def duration(self):
+		if len(self.actions) == 0:
+			return 0.0
+		return max([action[0] for action in self.actions])
+	#--------------------------------------------------------------------------
+	#
+	# Every (address, long) the timeline drives, in order of first use
+	#
+	#--------------------------------------------------------------------------
+	def addresses(self):
+		keys = []
+		for (offset, address, isLong, command, value) in self.actions:
+			if (address, isLong) not in keys:
+				keys.append((address, isLong))
+		return keys
+	#--------------------------------------------------------------------------
+	#
+	# Run the timeline loops times back to back, each pass period seconds
+	# long (by default the timeline duration plus one second)
+	#
+	# Throttles are configured before the clock starts.  Commands go
+	# through the tests' set* methods so they are written to the command
+	# log as well.  Returns False if 'Done' or 'Exit' stopped the run.
+	#
+	#--------------------------------------------------------------------------
+	def run(self, tests, dcs, loops = 1, period = None):
+		self.records = []
+		timeline = sorted(self.actions, key = lambda action: action[0])
+		if period == None:
+			period = self.duration() + 1.0
+
+		throttles = {}
+		modes = {}
+		for (address, isLong) in self.addresses():
+			tests.jmri_test_throttle_address = address
+			tests.jmri_test_throttle_address_long = isLong
+			if not tests.configureThrottle(dcs):
+				return False
+			throttles[(address, isLong)] = dcs.throttle
+			modes[(address, isLong)] = tests.jmri_speed_step_mode
+
+		start = java.lang.System.nanoTime()
+		for loop in range(loops):
+			for (offset, address, isLong, command, value) in timeline:
+				planned = int((loop * period + offset) * 1000000000)
+				if not tests.waitForDeadline(dcs, start + planned):
+					return False
+				actual = java.lang.System.nanoTime() - start
+
+				key = (address, isLong)
+				tests.jmri_test_throttle_address = address
+				tests.jmri_test_throttle_address_long = isLong
+				dcs.throttle = throttles[key]
+				if command == "mode":
+					modes[key] = value
+					tests.jmri_speed_step_mode = value
+					tests.setSpeedStepMode(dcs)
+				elif command == "direction":
+					tests.jmri_throttle_direction = value
+					tests.setThrottleDirection(dcs)
+				elif command == "speed":
+					tests.setThrottleSpeed(dcs, DCCSpeed.speed_setting(modes[key], value))
+				elif command == "function":
+					tests.setThrottleFunction(dcs, value[0], value[1])
+				self.records.append((loop, planned, actual, address, isLong, command, value))
+			dcs.ui.setText(dcs.testStatus, "Scenario %s pass %d of %d, %s" % (self.name, loop + 1, loops, self.getStatsText()))
+		return True
+	#--------------------------------------------------------------------------
+	#
+	# Lateness (actual - planned) statistics in seconds
+	#
+	#--------------------------------------------------------------------------
+	def getStats(self):
+		late = sorted([(actual - planned) / 1000000000.0 for (loop, planned, actual, address, isLong, command, value) in self.records])
+		stats = { "actions": len(late) }
+		if len(late) > 0:
+			stats["min"] = late[0]
+			stats["mean"] = sum(late) / len(late)
+			stats["p99"] = late[min(len(late) - 1, int(0.99 * len(late)))]
+			stats["max"] = late[-1]
+		return stats
+
+	def getStatsText(self):
+		stats = self.getStats()
+		text = "%d actions" % stats["actions"]
+		if stats["actions"] > 0:
+			text += ", late mean/p99/max %.2f/%.2f/%.2f ms" % (stats["mean"] * 1000.0, stats["p99"] * 1000.0, stats["max"] * 1000.0)
+		return text
+	#--------------------------------------------------------------------------
+	#
+	# Write the planned and actual times as CSV
+	#
+	#--------------------------------------------------------------------------
+	def write(self, path):
+		out = open(path, "w")
+		try:
+			out.write("loop,planned,actual,late,address,long,command,value\n")
+			for (loop, planned, actual, address, isLong, command, value) in self.records:
+				if command == "function":
+					value = "F%d=%d" % (value[0], value[1])
+				out.write("%d,%.9f,%.9f,%.9f,%d,%d,%s,%s\n" % (loop, planned / 1000000000.0, actual / 1000000000.0,
+					(actual - planned) / 1000000000.0, address, isLong, command, value))
+		finally:
+			out.close()
+		return
+
+####################################################################################
+#
+# Panel Updates
+#
+# Swing widgets may only be touched on the event dispatch thread, but the
+# tests run on the automaton thread and change the status line, buttons
+# and test values many times per step.  Tests post their changes here
+# instead.  Only the latest value of each widget property is kept, and the
+# pending changes are applied together on the event dispatch thread with
+# SwingUtilities.invokeLater, at most maxRate times a second, so posting a
+# change never waits for the UI and fast runs cannot flood it.
+#
+####################################################################################
+class DCSPanelUpdates:
+
+	def __init__(self, maxRate = 20):
+		self.minInterval = 1000000000 // maxRate	# ns between two batches
+		self.lock = threading.Lock()
+		self.pending = {}	# (widget, setter) -> latest value
+		self.scheduled = False
+		self.lastApplied = 0
+		self.posted = 0
+		self.applied = 0
+		self.batches = 0
+	#--------------------------------------------------------------------------
+	#
+	# Post a change, replacing any change to the same property that is
+	# still waiting
+	#
+	#--------------------------------------------------------------------------
+	def setText(self, widget, text):
+		self.post(widget, "setText", text)
+
+	def setEnabled(self, widget, enabled):
+		self.post(widget, "setEnabled", enabled)
+
+	def post(self, widget, setter, value):
+		self.lock.acquire()
+		try:
+			self.pending[(widget, setter)] = value
+			self.posted = self.posted + 1
+			if self.scheduled:
+				return
+			self.scheduled = True
+			delay = self.lastApplied + self.minInterval - java.lang.System.nanoTime()
+		finally:
+			self.lock.release()
+		if delay > 0:
+			timer = threading.Timer(delay / 1000000000.0, self.schedule)
+			timer.daemon = True
+			timer.start()
+		else:
+			self.schedule()
+		return
+
+	def schedule(self):
+		javax.swing.SwingUtilities.invokeLater(self.apply)
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Apply the pending changes, runs on the event dispatch thread
+	#
+	#--------------------------------------------------------------------------
+	def apply(self):
+		self.lock.acquire()
+		try:
+			pending = self.pending
+			self.pending = {}
+			self.scheduled = False
+			self.lastApplied = java.lang.System.nanoTime()
+			self.applied = self.applied + len(pending)
+			self.batches = self.batches + 1
+		finally:
+			self.lock.release()
+		for (widget, setter), value in pending.items():
+			getattr(widget, setter)(value)
+		return
+
+	def getStatsText(self):
+		return "Panel updates posted %d, applied %d in %d batches" % (self.posted, self.applied, self.batches)
+
+####################################################################################
+#
+# Test Catalog
+#
+# Tests are declared in a catalog instead of being written as test_
+# methods.  Most tests are parameter sweeps: a sweep is the space
+# addresses x address forms (short/long) x speed step modes x directions
+# x speed steps, expanded lazily into test points in that order.  Points
+# with the same address, form and mode make up a group: the throttle is
+# configured once per group and only the direction and speed change
+# between its points.  Every other test is a template method of
+# DCSConformanceTests run with a set of jmri_* settings.
+#
+# Names are given as in the standards ("S-9.2-A.1-short"); the test list
+# spells out the prefix ("Standard S-9.2-A.1-short").
+#
+####################################################################################
+class DCSTestSweep:
+
+	def __init__(self, addresses, forms = (False,), modes = (28,), directions = (True,), steps = (0,), dwell = 0.0):
+		self.addresses = addresses
+		self.forms = forms			# False for short, True for long addresses
+		self.modes = modes
+		self.directions = directions	# True for forward
+		self.steps = steps			# None for every step of the mode
+		self.dwell = dwell			# seconds at each point
+		self.results = []			# (point, address, long, mode, forward, step, speed, ns, result)
+	#--------------------------------------------------------------------------
+	#
+	# Speed steps of the sweep in one mode, leaving out steps the mode
+	# does not have
+	#
+	#--------------------------------------------------------------------------
+	def getSteps(self, mode):
+		if self.steps == None:
+			return range(0, DCCSpeed.STEPS[mode] + 1)
+		return [step for step in self.steps if step <= DCCSpeed.ESTOP[mode]]
+	#--------------------------------------------------------------------------
+	#
+	# Addresses in one form, short addresses above 127 do not exist
+	#
+	#--------------------------------------------------------------------------
+	def getAddresses(self, isLong):
+		if isLong:
+			return self.addresses
+		return [address for address in self.addresses if address <= 127]
+	#--------------------------------------------------------------------------
+	#
+	# Every test point (address, long, mode, forward, step), generated as
+	# it is needed
+	#
+	#--------------------------------------------------------------------------
+	def points(self):
+		for address in self.addresses:
+			for isLong in self.forms:
+				if not isLong and address > 127:
+					continue
+				for mode in self.modes:
+					for forward in self.directions:
+						for step in self.getSteps(mode):
+							yield (address, isLong, mode, forward, step)
+	#--------------------------------------------------------------------------
+	#
+	# Number of test points, without expanding them
+	#
+	#--------------------------------------------------------------------------
+	def count(self):
+		perAddress = len(self.directions) * sum([len(self.getSteps(mode)) for mode in self.modes])
+		return perAddress * sum([len(self.getAddresses(isLong)) for isLong in self.forms])
+	#--------------------------------------------------------------------------
+	#
+	# Record the outcome of one point
+	#
+	#--------------------------------------------------------------------------
+	def record(self, point, address, isLong, mode, forward, step, speed, time, result):
+		self.results.append((point, address, isLong, mode, forward, step, speed, time, result))
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Write the results as CSV
+	#
+	#--------------------------------------------------------------------------
+	def write(self, path):
+		out = open(path, "w")
+		try:
+			out.write("point,address,long,mode,direction,step,speed,time,result\n")
+			for (point, address, isLong, mode, forward, step, speed, time, result) in self.results:
+				if forward:
+					direction = "FWD"
+				else:
+					direction = "REV"
+				out.write("%d,%d,%d,%d,%s,%d,%.6f,%.9f,%s\n" % (point, address, isLong, mode, direction, step, speed, time / 1000000000.0, result))
+		finally:
+			out.close()
+		return
+
+class DCSTestCatalog:
+
+	prefixes = (("S-", "Standard "), ("RP-", "Recommended Practice "))
+
+	def __init__(self):
+		self.entries = collections.OrderedDict()	# display name -> (method, settings)
+	#--------------------------------------------------------------------------
+	#
+	# Test list name for a catalog name
+	#
+	#--------------------------------------------------------------------------
+	def getDisplayName(self, name):
+		for (prefix, text) in self.prefixes:
+			if name.startswith(prefix):
+				return text + name
+		return name
+	#--------------------------------------------------------------------------
+	#
+	# Add a test run by a template method of DCSConformanceTests after
+	# the settings (jmri_* attribute -> value) are applied
+	#
+	#--------------------------------------------------------------------------
+	def template(self, name, method, settings = None):
+		displayName = self.getDisplayName(name)
+		if displayName in self.entries:
+			raise ValueError("duplicate test %s" % displayName)
+		self.entries[displayName] = (method, settings or {})
+		return self
+	#--------------------------------------------------------------------------
+	#
+	# Add a parameter sweep, see DCSTestSweep for the parameters
+	#
+	#--------------------------------------------------------------------------
+	def sweep(self, name, addresses, forms = (False,), modes = (28,), directions = (True,), steps = (0,), dwell = 0.0):
+		sweep = DCSTestSweep(addresses, forms, modes, directions, steps, dwell)
+		return self.template(name, "sweepTest", { "jmri_sweep": sweep })
 
 class DCSConformanceTests:
 
@@ -29,22 +639,32 @@ class DCSConformanceTests:
 #-----------------------------------------------------------------------------------
 	def __init__(self):
 		self.test = {}	# dictionary of tests
-		self.jmri_28_speed_step_table = [ 0.0,	# STOP
-								  1.0/28.0,  2.0/28.0,  3.0/28.0,  4.0/28.0,  5.0/28.0,  6.0/28.0,  7.0/28.0,	# speed steps 1-7
-								  8.0/28.0,  9.0/28.0, 10.0/28.0, 11.0/28.0, 12.0/28.0, 13.0/28.0, 14.0/28.0, 	# speed steps 8-14
-								 15.0/28.0, 16.0/28.0, 17.0/28.0, 18.0/28.0, 19.0/28.0, 20.0/28.0, 21.0/28.0, 	# speed steps 15-21
-								 22.0/28.0, 23.0/28.0, 24.0/28.0, 25.0/28.0, 26.0/28.0, 27.0/28.0, 28.0/28.0,	# speed steps 22-28
-								 -1.0]	# ESTOP
-		self.jmri_14_speed_step_table = [ 0.0,	# STOP
-								  1.0/14.0,  2.0/14.0,  3.0/14.0,  4.0/14.0,  5.0/14.0,  6.0/14.0,  7.0/14.0,	# speed steps 1-7
-								  8.0/14.0,  9.0/14.0, 10.0/14.0, 11.0/14.0, 12.0/14.0, 13.0/14.0, 14.0/14.0, 	# speed steps 8-14
-								 -1.0]	# ESTOP
+		self.jmri_28_speed_step_table = DCCSpeed.SETTINGS[28]	# STOP, speed steps 1-28, ESTOP
+		self.jmri_14_speed_step_table = DCCSpeed.SETTINGS[14]	# STOP, speed steps 1-14, ESTOP
 		self.jmri_speed_step_mode = 28
 		self.jmri_throttle_direction = True
 		self.jmri_test_throttle_address = 3
 		self.jmri_test_throttle_address_long = False
 		self.jmri_test_throttle_speed = 0.0
 		self.jmri_test_throttle_speed_step = 0
+		self.throttlePool = ThrottlePool()
+		self.commandLog = DCSCommandLog()
+		self.jmri_sync_address = 9999	# long address of the sync marker
+		self.jmri_sync_step = 85		# 128 step speed of the sync marker
+		self.jmri_sync_hold_ms = 250	# time the marker runs before it is stopped
+		self.jmri_load_first_address = 1
+		self.jmri_load_last_address = 8
+		self.jmri_load_rate = 20	# commands per second across all throttles
+		self.jmri_load_script = [ ("speed", 4), ("function", (0, True)), ("speed", 14),
+								  ("function", (1, True)), ("speed", 28), ("function", (0, False)),
+								  ("speed", 14), ("function", (1, False)), ("speed", 0) ]
+		self.jmri_scenario = None
+		self.jmri_scenario_loops = 1
+		self.jmri_sweep = None
+		self.jmri_sweep_start = None	# nanoTime of the first point, None for now
+		self.jmri_campaign_tests = []
+		self.outputPath = None		# None for the JMRI user files directory
+		self.throttleManager = None	# None for the default throttle manager
 	#--------------------------------------------------------------------------
 	#
 	# Returns a sorted list of all of the tests registered in this class
@@ -55,24 +675,13 @@ class DCSConformanceTests:
 		return sorted(items.keys())
 	#--------------------------------------------------------------------------
 	#
-	# Searches the methods defined in this class and builds a list
-	# of all methods that implement a test (by naming convention
+	# Builds the list of tests from the test catalog (see buildCatalog)
 	#
 	#--------------------------------------------------------------------------
 	def buildTestList(self):
-		mod_list = inspect.getmembers(self)
-		for mod in mod_list:
-			name = mod[0]
-			if name.startswith("test_"):
-				listname = name.replace('test_', '')
-				listname = listname.replace('dash', '-')
-				listname = listname.replace('dot', '.')
-				if listname.startswith("S"):
-					listname = listname.replace('S', 'Standard S')
-				elif listname.startwith("RP"):
-					listname = listname.replace('RP', 'Recommended Practice RP')
-				print "Adding %s..." % listname
-				self.test[listname] = getattr(self, name)
+		for (name, entry) in self.buildCatalog().entries.items():
+			print("Adding %s..." % name)
+			self.test[name] = entry
 		return
 	#--------------------------------------------------------------------------
 	#
@@ -83,10 +692,81 @@ class DCSConformanceTests:
 	#
 	#--------------------------------------------------------------------------
 	def runTest(self, name, dcs):
-		thisTest = self.test[name]
-		dcs.testStatus.text = "Test: %s" % name
-		thisTest(name, dcs) 
-		dcs.testStatus.text = "Test: %s Done." % name
+		(method, settings) = self.test[name]
+		dcs.ui.setText(dcs.testStatus, "Test: %s" % name)
+		self.commandLog.clear()
+		self.commandLog.system = self.getSystemPrefix()
+		self.sendSyncMarker(dcs)
+		for (setting, value) in settings.items():
+			setattr(self, setting, value)
+		getattr(self, method)(name, dcs)
+		self.writeCommandLog(name)
+		dcs.ui.setText(dcs.testStatus, "Test: %s Done." % name)
+	#--------------------------------------------------------------------------
+	#
+	# System prefix of the connection the throttles come from
+	#
+	#--------------------------------------------------------------------------
+	def getSystemPrefix(self):
+		try:
+			if self.throttleManager != None:
+				return self.throttleManager.getSystemPrefix()
+			return jmri.InstanceManager.getDefault(jmri.ThrottleManager).getSystemPrefix()
+		except:
+			return "unknown"
+	#--------------------------------------------------------------------------
+	#
+	# Path of an output file (command log, timings, results)
+	#
+	#--------------------------------------------------------------------------
+	def getOutputPath(self, filename):
+		if self.outputPath != None:
+			return os.path.join(self.outputPath, filename)
+		return os.path.join(jmri.util.FileUtil.getUserFilesPath(), filename)
+	#--------------------------------------------------------------------------
+	#
+	# Send the sync marker that lines up the command log with a capture
+	#
+	# The marker is a 128 step speed packet to an address no test uses, so
+	# its first appearance on the rails marks the start of the log.  The
+	# marker runs for jmri_sync_hold_ms so the command station sends and
+	# refreshes it before the marker loco is stopped again.
+	#
+	#--------------------------------------------------------------------------
+	def sendSyncMarker(self, dcs):
+		address = self.jmri_test_throttle_address
+		isLong = self.jmri_test_throttle_address_long
+		mode = self.jmri_speed_step_mode
+		direction = self.jmri_throttle_direction
+
+		self.jmri_test_throttle_address = self.jmri_sync_address
+		self.jmri_test_throttle_address_long = True
+		self.jmri_speed_step_mode = 128
+		self.jmri_throttle_direction = True
+		if self.configureThrottle(dcs):
+			speed = DCCSpeed.speed_setting(128, self.jmri_sync_step)
+			self.logCommand("sync", speed)
+			dcs.throttle.setSpeedSetting(speed)
+			dcs.waitMsec(self.jmri_sync_hold_ms)
+			self.setThrottle128SpeedStep(dcs, 0)
+
+		self.jmri_test_throttle_address = address
+		self.jmri_test_throttle_address_long = isLong
+		self.jmri_speed_step_mode = mode
+		self.jmri_throttle_direction = direction
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Write the command log of a test to the JMRI user files directory
+	#
+	#--------------------------------------------------------------------------
+	def writeCommandLog(self, name):
+		path = self.getOutputPath("DCSCommandLog-%s.csv" % name.replace(" ", "_"))
+		try:
+			self.commandLog.write(path)
+		except:
+			print("Couldn't write command log %s" % path)
+		return path
 	#--------------------------------------------------------------------------
 	#
 	# Utility function to wait for a button press and return with an action
@@ -94,18 +774,46 @@ class DCSConformanceTests:
 	#--------------------------------------------------------------------------
 	def waitForProceed(self, dcs):
 		while True:
-			if dcs.testNext:
-				dcs.testNext = False
-				return 1
-			elif dcs.testPrev:
-				dcs.testPrev = False
-				return 2
-			elif dcs.testDone:
-				dcs.testDone = False
-				return 0
-			elif dcs.testExit:
-				dcs.testExit = False
-				return -1
+			action = self.checkProceed(dcs)
+			if action != None:
+				return action
+	#--------------------------------------------------------------------------
+	#
+	# Utility function to check for a button press without waiting,
+	# returns None if no button was pressed
+	#
+	#--------------------------------------------------------------------------
+	def checkProceed(self, dcs):
+		if dcs.testNext:
+			dcs.testNext = False
+			return 1
+		elif dcs.testPrev:
+			dcs.testPrev = False
+			return 2
+		elif dcs.testDone:
+			dcs.testDone = False
+			return 0
+		elif dcs.testExit:
+			dcs.testExit = False
+			return -1
+		return None
+	#--------------------------------------------------------------------------
+	#
+	# Sleep until the deadline (a nanoTime value), returns False if 'Done'
+	# or 'Exit' was clicked meanwhile.  Long waits sleep in slices so the
+	# buttons stay live.  Waits round up to whole milliseconds, so it never
+	# returns before the deadline.
+	#
+	#--------------------------------------------------------------------------
+	def waitForDeadline(self, dcs, deadline):
+		while True:
+			action = self.checkProceed(dcs)
+			if action == 0 or action == -1:
+				return False
+			wait = (deadline - java.lang.System.nanoTime() + 999999) // 1000000
+			if wait <= 0:
+				return True
+			dcs.waitMsec(int(min(wait, 100)))
 	#--------------------------------------------------------------------------
 	#
 	# Set the test value labels
@@ -113,16 +821,16 @@ class DCSConformanceTests:
 	#--------------------------------------------------------------------------
 	def setTestValueLabels(self, dcs, info, label1, value1, label2, value2, label3, value3):
 		if (info != None):
-			dcs.testInfoMessage.setText(info)
+			dcs.ui.setText(dcs.testInfoMessage, info)
 		if (label1 != None):
-			dcs.testValueLabel1.setText(label1)
-		dcs.testValue1.text = "%d" % value1
+			dcs.ui.setText(dcs.testValueLabel1, label1)
+		dcs.ui.setText(dcs.testValue1, "%d" % value1)
 		if (label2 != None):
-			dcs.testValueLabel2.setText(label2)
-		dcs.testValue2.text = "%d" % value2
+			dcs.ui.setText(dcs.testValueLabel2, label2)
+		dcs.ui.setText(dcs.testValue2, "%d" % value2)
 		if (label3 != None):
-			dcs.testValueLabel3.setText(label3)
-		dcs.testValue3.text = "%d" % value3
+			dcs.ui.setText(dcs.testValueLabel3, label3)
+		dcs.ui.setText(dcs.testValue3, "%d" % value3)
 		return
 	#--------------------------------------------------------------------------
 	#
@@ -130,13 +838,13 @@ class DCSConformanceTests:
 	#
 	#--------------------------------------------------------------------------
 	def resetTestValueLabels(self, dcs):
-		dcs.testInfoMessage.setText("Test Value Labels with change if a test requires user input")
-		dcs.testValueLabel1.setText("Test Value 1")
-		dcs.testValueLabel2.setText("Test Value 2")
-		dcs.testValueLabel3.setText("Test Value 3")
-		dcs.testValue1.text = ""
-		dcs.testValue2.text = ""
-		dcs.testValue3.text = ""
+		dcs.ui.setText(dcs.testInfoMessage, "Test Value Labels with change if a test requires user input")
+		dcs.ui.setText(dcs.testValueLabel1, "Test Value 1")
+		dcs.ui.setText(dcs.testValueLabel2, "Test Value 2")
+		dcs.ui.setText(dcs.testValueLabel3, "Test Value 3")
+		dcs.ui.setText(dcs.testValue1, "")
+		dcs.ui.setText(dcs.testValue2, "")
+		dcs.ui.setText(dcs.testValue3, "")
 		return
 #-----------------------------------------------------------------------------------
 #
@@ -149,6 +857,7 @@ class DCSConformanceTests:
 	#
 	#--------------------------------------------------------------------------
 	def set14SpeedStepMode(self, dcs):
+		self.logCommand("mode", 14)
 		dcs.throttle.setSpeedStepMode(jmri.SpeedStepMode.NMRA_DCC_14)
 		return
 	#--------------------------------------------------------------------------
@@ -157,6 +866,7 @@ class DCSConformanceTests:
 	#
 	#--------------------------------------------------------------------------
 	def set28SpeedStepMode(self, dcs):
+		self.logCommand("mode", 28)
 		dcs.throttle.setSpeedStepMode(jmri.SpeedStepMode.NMRA_DCC_28)
 		return
 	#--------------------------------------------------------------------------
@@ -165,6 +875,7 @@ class DCSConformanceTests:
 	#
 	#--------------------------------------------------------------------------
 	def set128SpeedStepMode(self, dcs):
+		self.logCommand("mode", 128)
 		dcs.throttle.setSpeedStepMode(jmri.SpeedStepMode.NMRA_DCC_128)
 		return
 	#--------------------------------------------------------------------------
@@ -186,6 +897,7 @@ class DCSConformanceTests:
 	#
 	#--------------------------------------------------------------------------
 	def setThrottleForward(self, dcs):
+		self.logCommand("direction", True)
 		dcs.throttle.setIsForward(True)
 		return
 	#--------------------------------------------------------------------------
@@ -194,6 +906,7 @@ class DCSConformanceTests:
 	#
 	#--------------------------------------------------------------------------
 	def setThrottleReverse(self, dcs):
+		self.logCommand("direction", False)
 		dcs.throttle.setIsForward(False)
 		return
 	#--------------------------------------------------------------------------
@@ -202,18 +915,19 @@ class DCSConformanceTests:
 	#
 	#--------------------------------------------------------------------------
 	def setThrottleDirection(self, dcs):
+		self.logCommand("direction", self.jmri_throttle_direction)
 		dcs.throttle.setIsForward(self.jmri_throttle_direction)
 		return
 	#--------------------------------------------------------------------------
 	#
-	# Set the default throttle the given speed step
+	# JMRI speed setting for a 14 or 28 speed step, STOP if out of range
 	#
 	#--------------------------------------------------------------------------
+	def getThrottleSpeedFrom14StepTable(self, step):
+		return DCCSpeed.speed_setting(14, step)
+
 	def getThrottleSpeedFrom28StepTable(self, step):
-		if step < 0 or step > len(self.jmri_28_speed_step_table):
-			return 0
-		else:
-			return self.jmri_28_speed_step_table[step]
+		return DCCSpeed.speed_setting(28, step)
 	#--------------------------------------------------------------------------
 	#
 	# Set the default throttle to the given speed value
@@ -221,6 +935,7 @@ class DCSConformanceTests:
 	#--------------------------------------------------------------------------
 	def setThrottleSpeed(self, dcs, speed):
 		if (speed == -1 or (speed >= 0 and speed <= 1.0)):
+			self.logCommand("speed", speed)
 			dcs.throttle.setSpeedSetting(speed)
 		return
 	#--------------------------------------------------------------------------
@@ -235,6 +950,7 @@ class DCSConformanceTests:
 	#--------------------------------------------------------------------------
 	def setThrottle14SpeedStep(self, dcs, step):
 		speed = self.getThrottleSpeedFrom14StepTable(step)
+		self.logCommand("speed", speed)
 		dcs.throttle.setSpeedSetting(speed)
 		return
 	#--------------------------------------------------------------------------
@@ -249,6 +965,7 @@ class DCSConformanceTests:
 	#--------------------------------------------------------------------------
 	def setThrottle28SpeedStep(self, dcs, step):
 		speed = self.getThrottleSpeedFrom28StepTable(step)
+		self.logCommand("speed", speed)
 		dcs.throttle.setSpeedSetting(speed)
 		return
 	#--------------------------------------------------------------------------
@@ -262,31 +979,45 @@ class DCSConformanceTests:
 	#
 	#--------------------------------------------------------------------------
 	def setThrottle128SpeedStep(self, dcs, step):
-		if step == 0:
-			speed = 0.0
-		elif step == 127:
-			speed = -1.0
-		elif speed >= 1 and speed <= 126:
-			speed = (step)/126.0
-		else:
+		if step < 0 or step > DCCSpeed.ESTOP[128]:
 			return
-			
+		speed = DCCSpeed.speed_setting(128, step)
+		self.logCommand("speed", speed)
 		dcs.throttle.setSpeedSetting(speed)
 		return
 	#--------------------------------------------------------------------------
 	#
-	# Get and configure the throttle
+	# Set a function (F0-F28) of the default throttle on or off
+	#
+	#--------------------------------------------------------------------------
+	def setThrottleFunction(self, dcs, function, state):
+		self.logCommand("function", "F%d=%d" % (function, state))
+		getattr(dcs.throttle, "setF%d" % function)(state)
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Record a command to the default throttle in the command log
+	#
+	#--------------------------------------------------------------------------
+	def logCommand(self, command, value):
+		self.commandLog.log(self.jmri_test_throttle_address, self.jmri_test_throttle_address_long, command, value)
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Get and configure the throttle, reusing a pooled throttle if one is
+	# already held for the address
 	#
 	#--------------------------------------------------------------------------
 	def configureThrottle(self, dcs):
 		try:
-			dcs.throttle = dcs.getThrottle(self.jmri_test_throttle_address, self.jmri_test_throttle_address_long)
+			dcs.throttle = self.throttlePool.getThrottle(dcs, self.jmri_test_throttle_address, self.jmri_test_throttle_address_long)
 		except:
-			dcs.testStatus.text = "ERROR: Couldn't assign throttle: %d" % self.jmri_test_throttle_address
-			return
+			dcs.ui.setText(dcs.testStatus, "ERROR: Couldn't assign throttle: %d" % self.jmri_test_throttle_address)
+			return False
 
 		self.setSpeedStepMode(dcs)
 		self.setThrottleDirection(dcs)
+		return True
 #-----------------------------------------------------------------------------------
 #
 # Common Test Templates
@@ -310,11 +1041,11 @@ class DCSConformanceTests:
 		#
 		# Configure the necessary buttons for this test
 		#
-		dcs.startButton.enabled = False
-		dcs.exitButton.enabled = False
-		dcs.nextButton.enabled = True
-		dcs.prevButton.enabled = True
-		dcs.doneButton.enabled = True
+		dcs.ui.setEnabled(dcs.startButton, False)
+		dcs.ui.setEnabled(dcs.exitButton, False)
+		dcs.ui.setEnabled(dcs.nextButton, True)
+		dcs.ui.setEnabled(dcs.prevButton, True)
+		dcs.ui.setEnabled(dcs.doneButton, True)
 		#
 		# Configure the throttle
 		#
@@ -331,16 +1062,16 @@ class DCSConformanceTests:
 			thdir = "REV"
 		while not done:
 			if step == 0:
-				dcs.prevButton.enabled = False
+				dcs.ui.setEnabled(dcs.prevButton, False)
 			else:
-				dcs.prevButton.enabled = True
+				dcs.ui.setEnabled(dcs.prevButton, True)
 			if step == last:
-				dcs.nextButton.enabled = False
+				dcs.ui.setEnabled(dcs.nextButton, False)
 			else:
-				dcs.nextButton.enabled = True
+				dcs.ui.setEnabled(dcs.nextButton, True)
 
 			speed = self.getThrottleSpeedFrom28StepTable(step)
-			dcs.testStatus.text = "Address = %d, %s Step %d, Throttle Value: %7.3f" % (self.jmri_test_throttle_address, thdir, step, speed)
+			dcs.ui.setText(dcs.testStatus, "Address = %d, %s Step %d, Throttle Value: %7.3f" % (self.jmri_test_throttle_address, thdir, step, speed))
 			self.setThrottle28SpeedStep(dcs, step)
 			action = self.waitForProceed(dcs)
 			if action == 1:
@@ -354,331 +1085,264 @@ class DCSConformanceTests:
 		speed = self.getThrottleSpeedFrom28StepTable(step)
 		self.setThrottle28SpeedStep(dcs, step)
 
-		dcs.testStatus.text = "Test %s Done." % name
+		dcs.ui.setText(dcs.testStatus, "Test %s Done." % name)
 		return
-#-----------------------------------------------------------------------------------
-#
-# Test methods--all must take the same arguments
-#
-# Test method naming convention:
-#
-# MUST start with 'test_'
-# Then must contain either 'S' or 'RP' for Standard or Recommended Practice
-# Use the word 'dash' to insert a '-' in the name
-# Use the word 'dot' to inssert a '.' in the name
-#
-# Example:
-# def test_Sdash9dot1dashAdot1(self, name, dcs):
-# Will become 'Standard S-9.1-A.1'
-#
-# Each test shall follow these basic templates:
-#
-#------------------------------------------------
-#
-# Case 1: just a few basic steps
-#
-#------------------------------------------------
-#def test_Sdash9dot1dashAdot1dash4(self, name, dcs):
-#	#
-#	# Configure global test settings
-#	#
-#	self.jmri_test_throttle_address_long = False
-#	self.jmri_test_throttle_address = 3
-#	self.jmri_speed_step_mode = 28
-#	#
-#	# Configure the necessary buttons for this test
-#	#
-#	dcs.startButton.enabled = False
-#	dcs.exitButton.enabled = False
-#	#
-#	# Configure the throttle
-#	#
-#	self.configureThrottle(dcs)
-#	#
-#	# Execute the test
-#	#
-#	speed = 0.0
-#	dcs.testStatus.text = "Address = %d, Speed set to %f" % (self.jmri_test_throttle_address, speed)
-#	self.setThrottleSpeed(dcs, speed)
-#	return
-#------------------------------------------------
-# 
-# Case 2: using a helper function for common setups
-#
-#------------------------------------------------
-#def test_Sdash9dot2dashAdot1(self, name, dcs):  
-#    #                                           
-#    # Configure global test settings            
-#    #                                           
-#    self.jmri_throttle_direction = True         
-#    self.jmri_test_throttle_address = 3         
-#    self.jmri_test_throttle_address_long = False
-#    self.jmri_speed_step_mode = 28              
-#    #                                           
-#    # Call the common test code                 
-#    #                                           
-#    self.speed28Steps(name, dcs)                
-#------------------------------------------------
-	#-----------------------------------------------------------------------------------
-	#
-	# S-9.1-cab3_full_stop, regular DCC packets, cab at stop
-	#	
-	#-----------------------------------------------------------------------------------
-	def test_Sdash9dot1dashcab3_full_stop(self, name, dcs):
-		#
-		# Configure global test settings
-		#
-		self.jmri_throttle_direction = True
-		self.jmri_test_throttle_address_long = False
-		self.jmri_test_throttle_address = 3
-		self.jmri_speed_step_mode = 28
-		#
-		# Configure the necessary buttons for this test
-		#
-		dcs.startButton.enabled = False
-		dcs.exitButton.enabled = False
-		#
-		# Configure the throttle
-		#
-		self.configureThrottle(dcs)
-		#
-		# Execute the test
-		#
-		if self.jmri_throttle_direction:
-			thdir = "FWD"
-		else:
-			thdir = "REV"
-		speed = 0.0
-		dcs.testStatus.text = "Address = %d, %s Speed set to %f" % (self.jmri_test_throttle_address, thdir, speed)
-		self.setThrottleSpeed(dcs, speed)
-		return
-	#-----------------------------------------------------------------------------------
+	#------------------------------------------------
 	#
-	# S-9.1-cab0_full_stop, regular DCC packets, cab at stop
-	#	
-	#-----------------------------------------------------------------------------------
-	def test_Sdash9dot1dashcab0_full_stop(self, name, dcs):
-		#
-		# Configure global test settings
-		#
-		self.jmri_throttle_direction = True
-		self.jmri_test_throttle_address_long = False
-		self.jmri_test_throttle_address = 0
-		self.jmri_speed_step_mode = 28
-		#
-		# Configure the necessary buttons for this test
-		#
-		dcs.startButton.enabled = False
-		dcs.exitButton.enabled = False
-		#
-		# Configure the throttle
-		#
-		self.configureThrottle(dcs)
-		#
-		# Execute the test
-		#
-		if self.jmri_throttle_direction:
-			thdir = "FWD"
-		else:
-			thdir = "REV"
-		speed = 0.0
-		dcs.testStatus.text = "Address = %d, %s Speed set to %f" % (self.jmri_test_throttle_address, thdir, speed)
-		self.setThrottleSpeed(dcs, speed)
-		return
-	#-----------------------------------------------------------------------------------
+	# Drive many throttles at once at a fixed command rate
 	#
-	# S-9.1-cab0_full_speed, regular DCC packets, cab at full speed
-	#	
-	#-----------------------------------------------------------------------------------
-	def test_Sdash9dot1dashcab0_full_speed(self, name, dcs):
-		#
-		# Configure global test settings
-		#
-		self.jmri_throttle_direction = True
-		self.jmri_test_throttle_address_long = False
-		self.jmri_test_throttle_address = 0
-		self.jmri_speed_step_mode = 28
-		#
-		# Configure the necessary buttons for this test
-		#
-		dcs.startButton.enabled = False
-		dcs.exitButton.enabled = False
-		#
-		# Configure the throttle
-		#
-		self.configureThrottle(dcs)
-		#
-		# Execute the test
-		#
-		if self.jmri_throttle_direction:
-			thdir = "FWD"
-		else:
-			thdir = "REV"
-		speed = 1.0
-		dcs.testStatus.text = "Address = %d, %s Speed set to %f" % (self.jmri_test_throttle_address, thdir, speed)
-		self.setThrottleSpeed(dcs, speed)
-		return
-	#-----------------------------------------------------------------------------------
+	# A throttle is acquired for every address from jmri_load_first_address
+	# to jmri_load_last_address (addresses above 127 are always long).  The
+	# throttles then take turns stepping through jmri_load_script, with
+	# jmri_load_rate commands per second sent in total, until 'Done' or
+	# 'Exit' is clicked.  Every command is written to the command log.
 	#
-	# S-9.2-A.1-short, cab 122 short address, forward speed step 1
-	#	
-	#-----------------------------------------------------------------------------------
-	def test_Sdash9dot2dashAdot1dashshort(self, name, dcs):
+	#------------------------------------------------
+	def loadTest(self, name, dcs):
 		#
 		# Configure global test settings
 		#
-		self.jmri_throttle_direction = True
-		self.jmri_test_throttle_address_long = False
-		self.jmri_test_throttle_address = 122
 		self.jmri_speed_step_mode = 28
 		#
 		# Configure the necessary buttons for this test
 		#
-		dcs.startButton.enabled = False
-		dcs.exitButton.enabled = False
-		dcs.nextButton.enabled = True
-		#
-		# Configure the throttle
-		#
-		self.configureThrottle(dcs)
+		dcs.ui.setEnabled(dcs.startButton, False)
+		dcs.ui.setEnabled(dcs.exitButton, True)
+		dcs.ui.setEnabled(dcs.nextButton, False)
+		dcs.ui.setEnabled(dcs.prevButton, False)
+		dcs.ui.setEnabled(dcs.doneButton, True)
+
+		self.setTestValueLabels(dcs, "Enter the address range and total command rate, click 'Done' when ready", "First Address", self.jmri_load_first_address, "Last Address", self.jmri_load_last_address, "Commands/Second", self.jmri_load_rate)
+		action = self.waitForProceed(dcs)
+		if action == -1:
+			self.resetTestValueLabels(dcs)
+			return
+
+		first = self.jmri_load_first_address
+		last = self.jmri_load_last_address
+		rate = self.jmri_load_rate
+		if dcs.testValue1.text.isnumeric():
+			first = int(dcs.testValue1.text)
+		if dcs.testValue2.text.isnumeric():
+			last = int(dcs.testValue2.text)
+		if dcs.testValue3.text.isnumeric():
+			rate = int(dcs.testValue3.text)
+		if rate < 1:
+			rate = 1
+		#
+		# Configure a throttle for every address, the pool must hold them all
+		#
+		slots = self.throttlePool.maxSlots
+		if (last - first + 1) > slots:
+			self.throttlePool.maxSlots = last - first + 1
+		isLong = self.jmri_test_throttle_address_long
+		locos = []
+		for address in range(first, last + 1):
+			self.jmri_test_throttle_address = address
+			self.jmri_test_throttle_address_long = isLong or address > 127
+			if self.configureThrottle(dcs):
+				locos.append((address, self.jmri_test_throttle_address_long, dcs.throttle))
 		#
 		# Execute the test
 		#
-		if self.jmri_throttle_direction:
-			thdir = "FWD"
-		else:
-			thdir = "REV"
-		step = 1
-		speed = self.getThrottleSpeedFrom28StepTable(step)
-		dcs.testStatus.text = "Address = %d, %s Step %d, Throttle Value: %7.3f" % (self.jmri_test_throttle_address, thdir, step, speed)
-		self.setThrottle28SpeedStep(dcs, step)
+		period = 1000000000 / rate
+		deadline = java.lang.System.nanoTime()
+		count = 0
+		done = len(locos) == 0
+		while not done:
+			(address, self.jmri_test_throttle_address_long, dcs.throttle) = locos[count % len(locos)]
+			self.jmri_test_throttle_address = address
+			(command, value) = self.jmri_load_script[(count // len(locos)) % len(self.jmri_load_script)]
+			if command == "speed":
+				self.setThrottle28SpeedStep(dcs, value)
+			elif command == "function":
+				self.setThrottleFunction(dcs, value[0], value[1])
+			elif command == "direction":
+				self.jmri_throttle_direction = value
+				self.setThrottleDirection(dcs)
+			count = count + 1
+			if (count % len(locos)) == 0:
+				dcs.ui.setText(dcs.testStatus, "%d locos at %d commands/second, %d commands sent" % (len(locos), rate, count))
+
+			deadline = deadline + period
+			done = not self.waitForDeadline(dcs, deadline)
+		#
+		# Stop every loco and give back the extra slots
+		#
+		for (address, self.jmri_test_throttle_address_long, dcs.throttle) in locos:
+			self.jmri_test_throttle_address = address
+			self.setThrottle28SpeedStep(dcs, 0)
+		self.jmri_test_throttle_address_long = isLong
+		self.throttlePool.maxSlots = slots
+		while len(self.throttlePool.throttles) > slots:
+			self.throttlePool.evict()
+
+		self.resetTestValueLabels(dcs)
+		dcs.ui.setText(dcs.testStatus, "Test %s Done. %d commands to %d locos" % (name, count, len(locos)))
 		return
-	#-----------------------------------------------------------------------------------
+	#------------------------------------------------
 	#
-	# S-9.2-A.1-long, cab 122 short address, forward speed step 1
-	#	
-	#-----------------------------------------------------------------------------------
-	def test_Sdash9dot2dashAdot1dashlong(self, name, dcs):
-		#
-		# Configure global test settings
-		#
-		self.jmri_throttle_direction = True
-		self.jmri_test_throttle_address_long = True
-		self.jmri_test_throttle_address = 122
-		self.jmri_speed_step_mode = 28
-		#
-		# Configure the necessary buttons for this test
-		#
-		dcs.startButton.enabled = False
-		dcs.exitButton.enabled = False
-		dcs.nextButton.enabled = True
-		#
-		# Configure the throttle
-		#
-		self.configureThrottle(dcs)
-		#
-		# Execute the test
-		#
-		if self.jmri_throttle_direction:
-			thdir = "FWD"
-		else:
-			thdir = "REV"
-		step = 1
-		speed = self.getThrottleSpeedFrom28StepTable(step)
-		dcs.testStatus.text = "Address = %d, %s Step %d, Throttle Value: %7.3f" % (self.jmri_test_throttle_address, thdir, step, speed)
-		self.setThrottle28SpeedStep(dcs, step)
-		return
-	#-----------------------------------------------------------------------------------
+	# Run the timed scenario in jmri_scenario
 	#
-	# S-9.2-A.2-14step, cab 3 short address, reverse speed step 12
-	#	
-	#-----------------------------------------------------------------------------------
-	def test_Sdash9dot2dashAdot2dash14step(self, name, dcs):
-		#
-		# Configure global test settings
-		#
-		self.jmri_throttle_direction = False
-		self.jmri_test_throttle_address_long = False
-		self.jmri_test_throttle_address = 3
-		self.jmri_speed_step_mode = 14
+	# The number of passes is entered first.  The planned and actual time
+	# of every action is written to DCSScenario-<test>.csv in the JMRI
+	# user files directory.
+	#
+	#------------------------------------------------
+	def scenarioTest(self, name, dcs):
 		#
 		# Configure the necessary buttons for this test
 		#
-		dcs.startButton.enabled = False
-		dcs.exitButton.enabled = False
-		dcs.nextButton.enabled = True
+		dcs.ui.setEnabled(dcs.startButton, False)
+		dcs.ui.setEnabled(dcs.exitButton, True)
+		dcs.ui.setEnabled(dcs.nextButton, False)
+		dcs.ui.setEnabled(dcs.prevButton, False)
+		dcs.ui.setEnabled(dcs.doneButton, True)
+
+		scenario = self.jmri_scenario
+		self.setTestValueLabels(dcs, "Enter the number of passes (%.1f s each), click 'Done' when ready" % (scenario.duration() + 1.0), "Passes", self.jmri_scenario_loops, "Actions", len(scenario.actions), "Addresses", len(scenario.addresses()))
+		action = self.waitForProceed(dcs)
+		if action == -1:
+			self.resetTestValueLabels(dcs)
+			return
+
+		loops = self.jmri_scenario_loops
+		if dcs.testValue1.text.isnumeric():
+			loops = max(1, int(dcs.testValue1.text))
 		#
-		# Configure the throttle
+		# Execute the test
 		#
-		self.configureThrottle(dcs)
+		completed = scenario.run(self, dcs, loops)
 		#
-		# Execute the test
+		# Stop every loco the scenario drove
 		#
-		if self.jmri_throttle_direction:
-			thdir = "FWD"
+		for (address, isLong) in scenario.addresses():
+			self.jmri_test_throttle_address = address
+			self.jmri_test_throttle_address_long = isLong
+			if self.configureThrottle(dcs):
+				self.setThrottleSpeed(dcs, 0.0)
+
+		path = self.getOutputPath("DCSScenario-%s.csv" % name.replace(" ", "_"))
+		try:
+			scenario.write(path)
+		except:
+			print("Couldn't write scenario timing %s" % path)
+		print("Scenario %s: %s" % (scenario.name, scenario.getStatsText()))
+
+		self.resetTestValueLabels(dcs)
+		if completed:
+			dcs.ui.setText(dcs.testStatus, "Test %s Done. %s" % (name, scenario.getStatsText()))
 		else:
-			thdir = "REV"
-		step = 12
-		speed = self.getThrottleSpeedFrom28StepTable(step)
-		dcs.testStatus.text = "Address = %d, %s Step %d, Throttle Value: %7.3f" % (self.jmri_test_throttle_address, thdir, step, speed)
-		self.setThrottle14SpeedStep(dcs, step)
+			dcs.ui.setText(dcs.testStatus, "Test %s stopped. %s" % (name, scenario.getStatsText()))
 		return
-	#-----------------------------------------------------------------------------------
+	#------------------------------------------------
 	#
-	# S-9.2-A.2-28step, cab 3 short address, reverse speed step 12
-	#	
-	#-----------------------------------------------------------------------------------
-	def test_Sdash9dot2dashAdot2dash28step(self, name, dcs):
-		#
-		# Configure global test settings
-		#
-		self.jmri_throttle_direction = False
-		self.jmri_test_throttle_address_long = False
-		self.jmri_test_throttle_address = 3
-		self.jmri_speed_step_mode = 28
+	# Run the parameter sweep in jmri_sweep
+	#
+	# Points run back to back, jmri_sweep.dwell seconds apart from
+	# jmri_sweep_start (or now), until the sweep ends or 'Done' or 'Exit'
+	# is clicked.  The throttle of each
+	# group is configured once.  A sweep of more than one point stops
+	# every address it drove at the end.  The outcome of every point is
+	# written to DCSSweep-<test>.csv in the JMRI user files directory.
+	#
+	#------------------------------------------------
+	def sweepTest(self, name, dcs):
 		#
 		# Configure the necessary buttons for this test
 		#
-		dcs.startButton.enabled = False
-		dcs.exitButton.enabled = False
-		dcs.nextButton.enabled = True
-		#
-		# Configure the throttle
-		#
-		self.configureThrottle(dcs)
+		dcs.ui.setEnabled(dcs.startButton, False)
+		dcs.ui.setEnabled(dcs.exitButton, True)
+		dcs.ui.setEnabled(dcs.nextButton, False)
+		dcs.ui.setEnabled(dcs.prevButton, False)
+		dcs.ui.setEnabled(dcs.doneButton, True)
 		#
 		# Execute the test
 		#
-		if self.jmri_throttle_direction:
-			thdir = "FWD"
+		sweep = self.jmri_sweep
+		sweep.results = []
+		total = sweep.count()
+		period = int(sweep.dwell * 1000000000)
+		group = None
+		configured = False
+		driven = []
+		point = 0
+		start = self.jmri_sweep_start
+		if start == None:
+			start = java.lang.System.nanoTime()
+		deadline = start
+		points = sweep.points()
+		if not self.waitForDeadline(dcs, start):
+			points = []
+		for (address, isLong, mode, forward, step) in points:
+			if (address, isLong, mode) != group:
+				group = (address, isLong, mode)
+				self.jmri_test_throttle_address = address
+				self.jmri_test_throttle_address_long = isLong
+				self.jmri_speed_step_mode = mode
+				self.jmri_throttle_direction = forward
+				configured = self.configureThrottle(dcs)
+				if configured and (address, isLong) not in [(a, l) for (a, l, t) in driven]:
+					driven.append((address, isLong, dcs.throttle))
+			elif forward != self.jmri_throttle_direction:
+				self.jmri_throttle_direction = forward
+				if configured:
+					self.setThrottleDirection(dcs)
+
+			speed = DCCSpeed.speed_setting(mode, step)
+			if configured:
+				if forward:
+					thdir = "FWD"
+				else:
+					thdir = "REV"
+				dcs.ui.setText(dcs.testStatus, "Point %d of %d: Address = %d, %s Step %d, Throttle Value: %7.3f" % (point + 1, total, address, thdir, step, speed))
+				self.setThrottleSpeed(dcs, speed)
+				result = "sent"
+			else:
+				result = "no throttle"
+			sweep.record(point, address, isLong, mode, forward, step, speed, java.lang.System.nanoTime() - start, result)
+			point = point + 1
+			if point < total:
+				deadline = deadline + period
+				if not self.waitForDeadline(dcs, deadline):
+					break
+		#
+		# Stop every address the sweep drove
+		#
+		if total > 1:
+			for (address, isLong, throttle) in driven:
+				self.jmri_test_throttle_address = address
+				self.jmri_test_throttle_address_long = isLong
+				dcs.throttle = throttle
+				self.setThrottleSpeed(dcs, 0.0)
+
+		path = self.getOutputPath("DCSSweep-%s.csv" % name.replace(" ", "_"))
+		try:
+			sweep.write(path)
+		except:
+			print("Couldn't write sweep results %s" % path)
+
+		sent = len([result for result in sweep.results if result[-1] == "sent"])
+		if point < total:
+			dcs.ui.setText(dcs.testStatus, "Test %s stopped. %d of %d points, %d sent" % (name, point, total, sent))
 		else:
-			thdir = "REV"
-		step = 12
-		speed = self.getThrottleSpeedFrom28StepTable(step)
-		dcs.testStatus.text = "Address = %d, %s Step %d, Throttle Value: %7.3f" % (self.jmri_test_throttle_address, thdir, step, speed)
-		self.setThrottle28SpeedStep(dcs, step)
+			dcs.ui.setText(dcs.testStatus, "Test %s Done. %d points, %d sent" % (name, total, sent))
 		return
-	#-----------------------------------------------------------------------------------
+	#------------------------------------------------
 	#
-	# S-9.2-B.1, check documented address range
-	#	
-	#-----------------------------------------------------------------------------------
-	def test_Sdash9dot2dashBdot1(self, name, dcs):
-		#
-		# Configure global test settings
-		#
-		self.jmri_throttle_direction = True
-		self.jmri_test_throttle_address_long = False
-		self.jmri_test_throttle_address = 3
-		self.jmri_speed_step_mode = 28
+	# Step 1 on the first, mid and last documented decoder addresses,
+	# entered by the user, moving between them with 'Next' and 'Prev'
+	#
+	#------------------------------------------------
+	def documentedAddressTest(self, name, dcs):
 		#
 		# Configure the necessary buttons for this test
 		#
-		dcs.startButton.enabled = False
-		dcs.exitButton.enabled = True
-		dcs.nextButton.enabled = False
-		dcs.prevButton.enabled = False
-		dcs.doneButton.enabled = True
+		dcs.ui.setEnabled(dcs.startButton, False)
+		dcs.ui.setEnabled(dcs.exitButton, True)
+		dcs.ui.setEnabled(dcs.nextButton, False)
+		dcs.ui.setEnabled(dcs.prevButton, False)
+		dcs.ui.setEnabled(dcs.doneButton, True)
 		
 		addr1 = 1
 		addr2 = 63
@@ -689,10 +1353,10 @@ class DCSConformanceTests:
 		if action == -1:
 			self.resetTestValueLabels(dcs)
 			return
-		dcs.exitButton.enabled = True
-		dcs.nextButton.enabled = True
-		dcs.prevButton.enabled = True
-		dcs.doneButton.enabled = True
+		dcs.ui.setEnabled(dcs.exitButton, True)
+		dcs.ui.setEnabled(dcs.nextButton, True)
+		dcs.ui.setEnabled(dcs.prevButton, True)
+		dcs.ui.setEnabled(dcs.doneButton, True)
 		
 		if dcs.testValue1.text.isnumeric():
 			addr1 = int(dcs.testValue1.text)
@@ -719,7 +1383,7 @@ class DCSConformanceTests:
 				thdir = "REV"
 			step = 1
 			speed = self.getThrottleSpeedFrom28StepTable(step)
-			dcs.testStatus.text = "Address = %d, %s Step %d, Throttle Value: %7.3f" % (self.jmri_test_throttle_address, thdir, step, speed)
+			dcs.ui.setText(dcs.testStatus, "Address = %d, %s Step %d, Throttle Value: %7.3f" % (self.jmri_test_throttle_address, thdir, step, speed))
 			self.setThrottle28SpeedStep(dcs, step)
 			action = self.waitForProceed(dcs)
 			if action == 1:
@@ -738,38 +1402,415 @@ class DCSConformanceTests:
 
 		self.resetTestValueLabels(dcs)
 		return
-	#-----------------------------------------------------------------------------------
+	#------------------------------------------------
 	#
-	# S-9.2-cab3_28steps_forward
-	#	
-	#-----------------------------------------------------------------------------------
-	def test_Sdash9dot2dashcab3_28steps_forward(self, name, dcs):
-		#
-		# Configure global test settings
-		#
-		self.jmri_throttle_direction = True
-		self.jmri_test_throttle_address = 3
-		self.jmri_test_throttle_address_long = False
+	# Run the sweeps in jmri_campaign_tests on every JMRI connection at
+	# once, see DCSCampaign
+	#
+	#------------------------------------------------
+	def campaignTest(self, name, dcs):
 		#
-		# Call the common test code
+		# Configure the necessary buttons for this test
 		#
-		self.speed28Steps(name, dcs)
-	#-----------------------------------------------------------------------------------
-	#
-	# S-9.2-cab3_28steps_reverse
-	#	
-	#-----------------------------------------------------------------------------------
-	def test_Sdash9dot2dashcab3_steps_reverse(self, name, dcs):
+		dcs.ui.setEnabled(dcs.startButton, False)
+		dcs.ui.setEnabled(dcs.exitButton, True)
+		dcs.ui.setEnabled(dcs.nextButton, False)
+		dcs.ui.setEnabled(dcs.prevButton, False)
+		dcs.ui.setEnabled(dcs.doneButton, True)
 		#
-		# Configure global test settings
+		# The stations acquire their own throttles, including on the
+		# default connection
 		#
-		self.jmri_throttle_direction = False
-		self.jmri_test_throttle_address = 3
-		self.jmri_test_throttle_address_long = False
+		self.throttlePool.releaseAll()
+		try:
+			campaign = DCSCampaign(name.replace(" ", "_"), self.jmri_campaign_tests)
+		except ValueError as e:
+			dcs.ui.setText(dcs.testStatus, "ERROR: %s" % e)
+			return
 		#
-		# Call the common test code
+		# Execute the test
 		#
-		self.speed28Steps(name, dcs)
+		campaign.start()
+		while campaign.isRunning():
+			action = self.checkProceed(dcs)
+			if action == 0 or action == -1:
+				campaign.stop()
+			dcs.ui.setText(dcs.testStatus, campaign.getStatusText().replace("\n", "; "))
+			dcs.waitMsec(200)
+		campaign.write()
+		print(campaign.getStatusText())
+
+		dcs.ui.setText(dcs.testStatus, "Test %s Done. %d stations, timeline in %s" % (name, len(campaign.stations), campaign.path))
+		return
+#-----------------------------------------------------------------------------------
+#
+# Test catalog
+#
+# Every test is one catalog entry, see DCSTestCatalog.  A sweep lists its
+# parameter space:
+#
+#	catalog.sweep("S-9.2-A.2-28step", [3], forms = (False,), modes = (28,),
+#		directions = (False,), steps = (12,))
+#
+# runs cab 3 short address in 28 step mode, reverse, speed step 12 and
+# becomes 'Standard S-9.2-A.2-28step'.  Other tests name a template
+# method and the settings it runs with:
+#
+#	catalog.template("S-9.2-cab3_28steps_forward", "speed28Steps",
+#		{ "jmri_throttle_direction": True, "jmri_test_throttle_address": 3 })
+#
+#-----------------------------------------------------------------------------------
+	def buildCatalog(self):
+		catalog = DCSTestCatalog()
+		#
+		# S-9.1, regular DCC packets with the cab at stop or full speed
+		#
+		catalog.sweep("S-9.1-cab3_full_stop", [3], steps = (0,))
+		catalog.sweep("S-9.1-cab0_full_stop", [0], steps = (0,))
+		catalog.sweep("S-9.1-cab0_full_speed", [0], steps = (28,))
+		#
+		# S-9.2-A, cab 122 short and long address forward speed step 1,
+		# cab 3 reverse speed step 12 in 14 and 28 step mode
+		#
+		catalog.sweep("S-9.2-A.1-short", [122], forms = (False,), steps = (1,))
+		catalog.sweep("S-9.2-A.1-long", [122], forms = (True,), steps = (1,))
+		catalog.sweep("S-9.2-A.2-14step", [3], modes = (14,), directions = (False,), steps = (12,))
+		catalog.sweep("S-9.2-A.2-28step", [3], modes = (28,), directions = (False,), steps = (12,))
+		#
+		# S-9.2 sweeps: the address range edges in both forms, and every
+		# speed step of every mode in both directions
+		#
+		catalog.sweep("S-9.2-sweep_short_addresses", [1, 3, 63, 100, 127], forms = (False,),
+			directions = (True, False), steps = (0, 1, 14, 28), dwell = 0.5)
+		catalog.sweep("S-9.2-sweep_long_addresses", [1, 127, 128, 1000, 10239], forms = (True,),
+			directions = (True, False), steps = (0, 1, 14, 28), dwell = 0.5)
+		catalog.sweep("S-9.2-sweep_speed_steps", [3], forms = (False, True), modes = (14, 28, 128),
+			directions = (True, False), steps = None, dwell = 0.25)
+		#
+		# The sweeps above on every JMRI connection at once
+		#
+		catalog.template("S-9.2-campaign_sweeps", "campaignTest",
+			{ "jmri_campaign_tests": [ "Standard S-9.2-sweep_short_addresses", "Standard S-9.2-sweep_long_addresses",
+			  "Standard S-9.2-sweep_speed_steps" ] })
+		#
+		# S-9.2-B.1, check documented address range
+		#
+		catalog.template("S-9.2-B.1", "documentedAddressTest",
+			{ "jmri_throttle_direction": True, "jmri_test_throttle_address": 3,
+			  "jmri_test_throttle_address_long": False, "jmri_speed_step_mode": 28 })
+		#
+		# S-9.2 cab 3 stepped through the 28 speed steps with 'Next' and 'Prev'
+		#
+		catalog.template("S-9.2-cab3_28steps_forward", "speed28Steps",
+			{ "jmri_throttle_direction": True, "jmri_test_throttle_address": 3,
+			  "jmri_test_throttle_address_long": False })
+		catalog.template("S-9.2-cab3_steps_reverse", "speed28Steps",
+			{ "jmri_throttle_direction": False, "jmri_test_throttle_address": 3,
+			  "jmri_test_throttle_address_long": False })
+		#
+		# S-9.2 many short or long address cabs driven at once
+		#
+		catalog.template("S-9.2-load_short", "loadTest",
+			{ "jmri_throttle_direction": True, "jmri_test_throttle_address_long": False,
+			  "jmri_load_first_address": 1, "jmri_load_last_address": 8 })
+		catalog.template("S-9.2-load_long", "loadTest",
+			{ "jmri_throttle_direction": True, "jmri_test_throttle_address_long": True,
+			  "jmri_load_first_address": 1000, "jmri_load_last_address": 1007 })
+		#
+		# S-9.2-scenario_ramp: up and down through the 28 steps at 4 steps
+		# per second with F0 toggling twice a second, then ten stop/start
+		# bursts 200 ms apart on cab 3
+		#
+		scenario = DCSScenario("ramp")
+		scenario.ramp(0.0, 3, False, 0, 28, 0.25)
+		scenario.ramp(7.25, 3, False, 28, 0, 0.25)
+		scenario.toggle(0.0, 3, False, 0, 0.5, 29)
+		scenario.burst(15.0, 3, False, 14, 0.2, 10)
+		catalog.template("S-9.2-scenario_ramp", "scenarioTest",
+			{ "jmri_throttle_direction": True, "jmri_speed_step_mode": 28, "jmri_scenario": scenario })
+		return catalog
+####################################################################################
+#
+# Test Campaign
+#
+# Runs the same sequence of catalog tests against several command
+# stations at once, one worker thread per JMRI connection (throttle
+# manager system prefix).  Every station has its own DCSConformanceTests,
+# so its own throttle pool and command log, and writes its command logs
+# and sweep results to DCSCampaign-<name>/<prefix>/ in the JMRI user
+# files directory.
+#
+# The timelines are kept aligned for side by side comparison: the workers
+# meet before every test and all start it at the same deadline, and the
+# sweep points run at deadlines counted from that common start, so a
+# station that is slow to hand out a throttle only falls behind for that
+# point.  DCSCampaign-<name>/timeline.csv lists when every station ran
+# every test, in seconds from the campaign start.
+#
+# Only sweeps can be part of a campaign, the other tests wait for input.
+#
+####################################################################################
+class DCSThrottleRequest(jmri.ThrottleListener):
+
+	def __init__(self):
+		self.event = threading.Event()
+		self.lock = threading.Lock()
+		self.throttle = None
+		self.reason = None
+		self.abandoned = False
+
+	def notifyThrottleFound(self, throttle):
+		self.lock.acquire()
+		try:
+			abandoned = self.abandoned
+			if not abandoned:
+				self.throttle = throttle
+		finally:
+			self.lock.release()
+		if abandoned:
+			throttle.release(None)
+			return
+		self.event.set()
+	#--------------------------------------------------------------------------
+	#
+	# Give up waiting, returns the throttle if it arrived meanwhile.  A
+	# throttle found after this is released at once, so a late answer
+	# from an asynchronous manager does not hold a slot nobody uses.
+	#
+	#--------------------------------------------------------------------------
+	def abandon(self):
+		self.lock.acquire()
+		try:
+			self.abandoned = True
+			return self.throttle
+		finally:
+			self.lock.release()
+
+	def notifyFailedThrottleRequest(self, address, reason):
+		self.reason = reason
+		self.event.set()
+
+	def notifyDecisionRequired(self, address, question):
+		self.reason = "decision required: %s" % question
+		self.event.set()
+
+#-----------------------------------------------------------------------------------
+#
+# One command station of a campaign, standing in for the automaton (dcs)
+# the tests drive: throttles come from the station's own throttle manager
+# and status text is kept instead of shown
+#
+#-----------------------------------------------------------------------------------
+class DCSCampaignStation:
+
+	def __init__(self, manager, path, timeout = 5.0):
+		self.manager = manager
+		self.prefix = manager.getSystemPrefix()
+		self.timeout = timeout
+		self.tests = DCSConformanceTests()
+		self.tests.outputPath = path
+		self.tests.throttleManager = manager
+		self.tests.test.update(self.tests.buildCatalog().entries)
+		self.ui = self
+		self.throttle = None
+		self.status = ""
+		self.testStatus = "status"
+		self.startButton = self.exitButton = self.nextButton = self.prevButton = self.doneButton = None
+		self.testNext = self.testPrev = self.testDone = self.testExit = False
+		self.runs = []		# (test, start ns, end ns, points, sent, result)
+
+	def setText(self, widget, text):
+		if widget == self.testStatus:
+			self.status = text
+		return
+
+	def setEnabled(self, widget, enabled):
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Request a throttle from the station's manager and wait for it,
+	# None if the request fails or times out.  A request that times out
+	# is cancelled.
+	#
+	#--------------------------------------------------------------------------
+	def getThrottle(self, address, isLong):
+		locoAddress = jmri.DccLocoAddress(address, isLong)
+		request = DCSThrottleRequest()
+		if not self.manager.requestThrottle(locoAddress, request, False):
+			return None
+		request.event.wait(self.timeout)
+		throttle = request.abandon()
+		if throttle == None and request.reason == None:
+			self.manager.cancelThrottleRequest(locoAddress, request)
+		return throttle
+
+	def waitMsec(self, msec):
+		java.lang.Thread.sleep(int(msec))
+		return True
+
+class DCSCampaign:
+
+	def __init__(self, name, tests, managers = None, lead = 0.5, settle = 1.0):
+		self.name = name
+		self.tests = tests
+		self.lead = lead		# seconds from the last worker arriving to the test start
+		self.settle = settle	# seconds from the test start (and sync marker) to the first point
+		if managers == None:
+			managers = jmri.InstanceManager.getList(jmri.ThrottleManager)
+		self.path = os.path.join(jmri.util.FileUtil.getUserFilesPath(), "DCSCampaign-%s" % name)
+		self.stations = []
+		for manager in managers:
+			path = os.path.join(self.path, manager.getSystemPrefix())
+			if not os.path.isdir(path):
+				os.makedirs(path)
+			self.stations.append(DCSCampaignStation(manager, path))
+		if len(self.stations) == 0:
+			raise ValueError("no throttle managers")
+		for test in tests:
+			entry = self.stations[0].tests.test.get(test)
+			if entry == None or entry[0] != "sweepTest":
+				raise ValueError("%s is not a sweep test" % test)
+		self.condition = threading.Condition()
+		self.arrivals = {}	# test number -> workers arrived
+		self.starts = {}	# test number -> start deadline (nanoTime)
+		self.active = 0
+		self.stopped = False
+		self.threads = []
+		self.startTime = None
+	#--------------------------------------------------------------------------
+	#
+	# Start one worker thread per station
+	#
+	#--------------------------------------------------------------------------
+	def start(self):
+		self.startTime = java.lang.System.nanoTime()
+		self.active = len(self.stations)
+		for station in self.stations:
+			thread = threading.Thread(target = self.work, args = (station,), name = "DCSCampaign-%s" % station.prefix)
+			thread.daemon = True
+			self.threads.append(thread)
+			thread.start()
+		return
+
+	def isRunning(self):
+		return len([thread for thread in self.threads if thread.is_alive()]) > 0
+	#--------------------------------------------------------------------------
+	#
+	# Stop every station after the sweep point it is on
+	#
+	#--------------------------------------------------------------------------
+	def stop(self):
+		self.condition.acquire()
+		try:
+			self.stopped = True
+			for station in self.stations:
+				station.testDone = True
+			self.condition.notifyAll()
+		finally:
+			self.condition.release()
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Run the campaign to the end, then write the timeline
+	#
+	#--------------------------------------------------------------------------
+	def run(self):
+		self.start()
+		for thread in self.threads:
+			thread.join()
+		self.write()
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Wait for every running worker to reach test number, returns the
+	# common start deadline or None once the campaign is stopped
+	#
+	#--------------------------------------------------------------------------
+	def meet(self, number):
+		self.condition.acquire()
+		try:
+			self.arrivals[number] = self.arrivals.get(number, 0) + 1
+			self.release(number)
+			while number not in self.starts and not self.stopped:
+				self.condition.wait(0.1)
+			if self.stopped:
+				return None
+			return self.starts[number]
+		finally:
+			self.condition.release()
+
+	def release(self, number):
+		if number not in self.starts and self.arrivals.get(number, 0) >= self.active:
+			self.starts[number] = java.lang.System.nanoTime() + int(self.lead * 1000000000)
+			self.condition.notifyAll()
+		return
+	#--------------------------------------------------------------------------
+	#
+	# Worker thread of one station
+	#
+	#--------------------------------------------------------------------------
+	def work(self, station):
+		tests = station.tests
+		try:
+			for (number, test) in enumerate(self.tests):
+				start = self.meet(number)
+				if start == None:
+					break
+				wait = (start - java.lang.System.nanoTime()) // 1000000
+				if wait > 0:
+					station.waitMsec(wait)
+				tests.jmri_sweep_start = start + int(self.settle * 1000000000)
+				result = "done"
+				try:
+					tests.runTest(test, station)
+				except Exception as e:
+					result = "error: %s" % e
+				sweep = tests.test[test][1]["jmri_sweep"]
+				sent = len([r for r in sweep.results if r[-1] == "sent"])
+				if result == "done" and len(sweep.results) < sweep.count():
+					result = "stopped"
+				station.runs.append((test, start, java.lang.System.nanoTime(), len(sweep.results), sent, result))
+		finally:
+			tests.jmri_sweep_start = None
+			tests.throttlePool.releaseAll()
+			self.condition.acquire()
+			try:
+				self.active = self.active - 1
+				for number in list(self.arrivals.keys()):
+					self.release(number)
+			finally:
+				self.condition.release()
+		return
+	#--------------------------------------------------------------------------
+	#
+	# One line per station with the test it is on and its progress
+	#
+	#--------------------------------------------------------------------------
+	def getStatusText(self):
+		lines = []
+		for station in self.stations:
+			lines.append("%s: %d of %d tests, %s" % (station.prefix, len(station.runs), len(self.tests), station.status))
+		return "\n".join(lines)
+	#--------------------------------------------------------------------------
+	#
+	# Write when every station ran every test as CSV, in seconds from the
+	# campaign start
+	#
+	#--------------------------------------------------------------------------
+	def write(self):
+		out = open(os.path.join(self.path, "timeline.csv"), "w")
+		try:
+			out.write("test,system,start,end,points,sent,result\n")
+			for (number, test) in enumerate(self.tests):
+				for station in self.stations:
+					for (name, start, end, points, sent, result) in station.runs:
+						if name == test:
+							out.write("%s,%s,%.6f,%.6f,%d,%d,%s\n" % (test, station.prefix, (start - self.startTime) / 1000000000.0,
+								(end - self.startTime) / 1000000000.0, points, sent, result))
+		finally:
+			out.close()
+		return
+
 ####################################################################################
 #
 # Create an instance of the AbstractAutomation class 
@@ -788,7 +1829,7 @@ class DCCCommandStationControl(jmri.jmrit.automat.AbstractAutomaton) :
 		
 		self.scriptversion = "0.0.1"
 		
-		print "DCS Control Script Version %s" % self.scriptversion
+		print("DCS Control Script Version %s" % self.scriptversion)
 		self.scriptState = "wait"
 		self.testNext = False
 		self.testPrev = False
@@ -803,14 +1844,17 @@ class DCCCommandStationControl(jmri.jmrit.automat.AbstractAutomaton) :
 #-----------------------------------------------------------------------------------
 	def handle(self):
 
-		self.startButton.enabled = True
-		self.exitButton.enabled = True
-		self.nextButton.enabled = False
-		self.prevButton.enabled = False
-		self.doneButton.enabled = False
+		self.ui.setEnabled(self.startButton, True)
+		self.ui.setEnabled(self.exitButton, True)
+		self.ui.setEnabled(self.nextButton, False)
+		self.ui.setEnabled(self.prevButton, False)
+		self.ui.setEnabled(self.doneButton, False)
 		
 		while self.scriptState == "wait":
 			if self.testExit:
+				print(self.nmraTests.throttlePool.getStatsText())
+				print(self.ui.getStatsText())
+				self.nmraTests.throttlePool.releaseAll()
 				self.frame.dispose()
 				return False
 			
@@ -830,7 +1874,7 @@ class DCCCommandStationControl(jmri.jmrit.automat.AbstractAutomaton) :
 	def whenMyStartButtonClicked(self,event) :
 		if self.scriptState == "wait":
 			self.scriptState = "run"
-			self.startButton.enabled = False
+			self.ui.setEnabled(self.startButton, False)
 		return
 
 	def whenMyNextButtonClicked(self,event) :
@@ -861,6 +1905,7 @@ class DCCCommandStationControl(jmri.jmrit.automat.AbstractAutomaton) :
 		self.testPanelValue3 = 0
 		self.nmraTests = DCSConformanceTests()
 		self.nmraTests.buildTestList()
+		self.ui = DCSPanelUpdates()
 		
 		# create a frame to hold the button, set up for nice layout
 		self.frame = javax.swing.JFrame("DCS Conformance Test Control")		# argument is the frames title
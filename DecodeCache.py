@@ -0,0 +1,294 @@
+#
+# Persistent decode cache
+#
+# Decoding a long capture again after changing a report option or a rule
+# threshold repeats the same work, since the decoded packets only depend
+# on the frames and the decoder.  This cache keeps decoded packet streams
+# on disk, keyed by:
+#
+#	- the SHA-256 of the frame CSV contents (remembered per path, size
+#	  and modification time so an unchanged file is not hashed again)
+#	- the decoder version, a hash of the DCCPacket.py and DCCSpeed.py
+#	  sources, so any decoder change invalidates every entry
+#	- the decode settings, if any
+#
+# Each entry is one file holding a JSON header with the distinct decoded
+# results (refresh makes nearly every packet a repeat) and three columns:
+# start times and end times as float64 and the result index as uint32, 20
+# bytes a packet.  Loading maps the file and reads the columns in place,
+# so a cached capture costs about as much as paging its columns in.
+#
+# Entries are evicted least recently used first once the cache holds more
+# than max_bytes; loading an entry marks it used.
+#
+# Usage:
+#
+#	python DCCFrames.py capture.csv --cache DIR
+#	python DecodeCache.py [--dir DIR] [--max-size MB] [--clear]
+#
+
+import array
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import DCCFrames
+from DCCPacket import DCCPacket
+
+
+MAGIC = b'DCCCACHE'
+FORMAT_VERSION = 1
+SUFFIX = '.dcc'
+PATHS = 'paths.json'
+MAX_PATHS = 10000
+HASH_BLOCK = 1 << 20
+
+#
+# uint32 column type code, 'I' is 4 bytes nearly everywhere
+#
+INDEX_TYPE = 'I' if array.array('I').itemsize == 4 else 'L'
+
+
+def default_directory():
+	return os.environ.get('DCC_DECODE_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'dccutilities')
+
+_decoder_version = None
+
+def decoder_version():
+	global _decoder_version
+	if _decoder_version is None:
+		digest = hashlib.sha256()
+		here = os.path.dirname(os.path.abspath(__file__))
+		for name in ('DCCPacket.py', 'DCCSpeed.py'):
+			with open(os.path.join(here, name), 'rb') as f:
+				digest.update(f.read())
+		_decoder_version = digest.hexdigest()[:16]
+	return _decoder_version
+
+def file_digest(path):
+	digest = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(HASH_BLOCK), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+#
+# A decoded packet stream loaded from (or just stored in) the cache.
+# Iterating yields (ptype, pstime, petime, presult) like
+# DCCFrames.decode_frames; packets with the same result share one presult
+# dict, which must not be modified.
+#
+class CachedPackets:
+	def __init__(self, header, starts, ends, indexes, mapping=None):
+		self.Header = header
+		self.Errors = header.get('errors', {})
+		self.Results = [(ptype, presult) for ptype, presult in header['results']]
+		self.Starts = starts
+		self.Ends = ends
+		self.Indexes = indexes
+		self.Mapping = mapping
+
+	def __len__(self):
+		return len(self.Indexes)
+
+	def __iter__(self):
+		results = self.Results
+		for start, end, index in zip(self.Starts, self.Ends, self.Indexes):
+			ptype, presult = results[index]
+			yield ptype, start, end, presult
+
+	def Close(self):
+		if self.Mapping is not None:
+			self.Starts = self.Ends = self.Indexes = ()
+			self.Mapping.close()
+			self.Mapping = None
+
+class DecodeCache:
+	def __init__(self, directory=None, max_bytes=1 << 30):
+		self.Directory = directory or default_directory()
+		self.MaxBytes = max_bytes
+		self.Hits = 0
+		self.Misses = 0
+		os.makedirs(self.Directory, exist_ok=True)
+
+	#
+	# Content hash of a file, hashed again only when its size or
+	# modification time changed
+	#
+	def Digest(self, path):
+		path = os.path.abspath(path)
+		stat = os.stat(path)
+		paths = self.ReadPaths()
+		known = paths.get(path)
+		if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+			return known[2]
+		digest = file_digest(path)
+		paths[path] = (stat.st_size, stat.st_mtime_ns, digest)
+		while len(paths) > MAX_PATHS:
+			del paths[next(iter(paths))]
+		self.WriteAtomic(PATHS, json.dumps(paths).encode())
+		return digest
+
+	def ReadPaths(self):
+		try:
+			with open(os.path.join(self.Directory, PATHS)) as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+	def Key(self, path, settings=None):
+		key = json.dumps([FORMAT_VERSION, self.Digest(path), decoder_version(), settings or {}], sort_keys=True)
+		return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+	def EntryPath(self, key):
+		return os.path.join(self.Directory, key + SUFFIX)
+
+	#
+	# Map a cached entry, None on a miss or an unreadable entry
+	#
+	def Load(self, key):
+		path = self.EntryPath(key)
+		try:
+			f = open(path, 'rb')
+		except OSError:
+			self.Misses += 1
+			return None
+		with f:
+			try:
+				mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError:
+				self.Misses += 1
+				return None
+		try:
+			if mapping[:len(MAGIC)] != MAGIC:
+				raise ValueError("not a cache entry")
+			length = struct.unpack_from('<I', mapping, len(MAGIC))[0]
+			offset = len(MAGIC) + 4
+			header = json.loads(mapping[offset:offset + length].decode())
+			if header['format'] != FORMAT_VERSION or header['byteorder'] != sys.byteorder:
+				raise ValueError("incompatible cache entry")
+			count = header['count']
+			view = memoryview(mapping)
+			columns = []
+			for code, column in zip(('d', 'd', INDEX_TYPE), header['columns']):
+				columns.append(view[column:column + count * array.array(code).itemsize].cast(code))
+		except (ValueError, KeyError, struct.error):
+			mapping.close()
+			self.Misses += 1
+			return None
+		os.utime(path)
+		self.Hits += 1
+		return CachedPackets(header, columns[0], columns[1], columns[2], mapping)
+
+	#
+	# Store a decoded packet stream, returns it as CachedPackets.  The
+	# decoder's error counts are read once the stream is exhausted.
+	#
+	def Store(self, key, packets, decoder=None, source=None):
+		starts = array.array('d')
+		ends = array.array('d')
+		indexes = array.array(INDEX_TYPE)
+		results = []
+		known = {}
+		for ptype, pstime, petime, presult in packets:
+			result = (ptype, tuple(presult.items()))
+			index = known.get(result)
+			if index is None:
+				index = known[result] = len(results)
+				results.append((ptype, presult))
+			starts.append(pstime)
+			ends.append(petime)
+			indexes.append(index)
+
+		header = { 'format': FORMAT_VERSION, 'byteorder': sys.byteorder, 'decoder': decoder_version(),
+			'source': source, 'count': len(indexes), 'results': results, 'errors': decoder.ErrorSummary() if decoder is not None else {} }
+		#
+		# Column offsets depend on the header length, which depends on the
+		# offsets: leave room for them, then pad the header so the first
+		# column starts 8 byte aligned
+		#
+		header['columns'] = [0] * 3
+		text = json.dumps(header).encode()
+		base = len(MAGIC) + 4 + len(text) + 3 * 24
+		base += -base % 8
+		columns = [base, base + len(starts) * 8, base + len(starts) * 16]
+		header['columns'] = columns
+		text = json.dumps(header).encode()
+		text += b' ' * (base - len(MAGIC) - 4 - len(text))
+		data = [MAGIC, struct.pack('<I', len(text)), text, starts.tobytes(), ends.tobytes(), indexes.tobytes()]
+		self.WriteAtomic(os.path.basename(self.EntryPath(key)), b''.join(data))
+		self.Evict()
+		return CachedPackets(header, starts, ends, indexes)
+
+	def WriteAtomic(self, name, data):
+		path = os.path.join(self.Directory, name)
+		temp = "%s.%d.tmp" % (path, os.getpid())
+		with open(temp, 'wb') as f:
+			f.write(data)
+		os.replace(temp, path)
+
+	def Entries(self):
+		entries = []
+		for name in os.listdir(self.Directory):
+			if name.endswith(SUFFIX):
+				try:
+					stat = os.stat(os.path.join(self.Directory, name))
+				except OSError:
+					continue
+				entries.append((stat.st_mtime, stat.st_size, name))
+		return sorted(entries)
+
+	#
+	# Remove the least recently used entries until the cache fits in
+	# max_bytes, returns the number removed
+	#
+	def Evict(self, max_bytes=None):
+		if max_bytes is None:
+			max_bytes = self.MaxBytes
+		entries = self.Entries()
+		total = sum(size for used, size, name in entries)
+		removed = 0
+		for used, size, name in entries:
+			if total <= max_bytes:
+				break
+			try:
+				os.remove(os.path.join(self.Directory, name))
+			except OSError:
+				continue
+			total -= size
+			removed += 1
+		return removed
+
+	#
+	# Decoded packets of a frame CSV, from the cache when possible
+	#
+	def Decode(self, path, settings=None):
+		key = self.Key(path, settings)
+		packets = self.Load(key)
+		if packets is None:
+			decoder = DCCPacket()
+			packets = self.Store(key, DCCFrames.decode_frames(DCCFrames.read_frames(path), decoder), decoder, os.path.basename(path))
+		return packets
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Show or trim the decode cache")
+	parser.add_argument('--dir', help="cache directory (default: $DCC_DECODE_CACHE or ~/.cache/dccutilities)")
+	parser.add_argument('--max-size', type=float, help="evict least recently used entries down to this many MB")
+	parser.add_argument('--clear', action='store_true', help="remove every entry")
+	args = parser.parse_args(argv)
+
+	cache = DecodeCache(args.dir)
+	if args.clear:
+		print("%d entries removed" % cache.Evict(0))
+	elif args.max_size is not None:
+		print("%d entries removed" % cache.Evict(int(args.max_size * 1024 * 1024)))
+	entries = cache.Entries()
+	print("%s: %d entries, %.1f MB" % (cache.Directory, len(entries), sum(size for used, size, name in entries) / 1048576.0))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
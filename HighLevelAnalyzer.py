@@ -4,14 +4,41 @@
 from saleae.analyzers import HighLevelAnalyzer, AnalyzerFrame, StringSetting, NumberSetting, ChoicesSetting
 
 from DCCPacket import DCCPacket
+from RefreshMonitor import RefreshMonitor
+from PacketFilter import PacketFilter
+from ConformanceRules import ConformanceRules
  
 		
 # High level analyzers must subclass the HighLevelAnalyzer class.
 class Hla(HighLevelAnalyzer):
 
-	Packet = DCCPacket()
+	refresh_monitor = ChoicesSetting(label='Refresh Monitor', choices=('Off', 'On'))
+	refresh_threshold = NumberSetting(label='Refresh Threshold (ms)', min_value=1, max_value=60000)
+	rate_window = NumberSetting(label='Packet Rate Window (ms)', min_value=1, max_value=60000)
+	rate_floor = NumberSetting(label='Packet Rate Floor (packets/s, 0 = off)', min_value=0, max_value=10000)
+	packet_filter = StringSetting(label='Packet Filter (e.g. address 3 and speed128 > 100)')
+	filter_mode = ChoicesSetting(label='Filter Mode (warnings and violations always shown)', choices=('Show Matching', 'Mark Matching'))
+	conformance_rules = ChoicesSetting(label='Conformance Rules (S-9.2 timing)', choices=('Off', 'On'))
 	
 	def __init__(self):
+		#
+		# Decoder state is per instance so several DCCUtilities analyzers
+		# (main and programming track, or two boosters) can run at once
+		#
+		self.Packet = DCCPacket()
+		self.Monitor = None
+		self.Origin = None
+		if getattr(self, 'refresh_monitor', 'Off') == 'On':
+			self.Monitor = RefreshMonitor(threshold=float(self.refresh_threshold or 500) / 1000.0,
+				window=float(self.rate_window or 1000) / 1000.0,
+				floor=float(self.rate_floor or 0))
+		self.Rules = None
+		if getattr(self, 'conformance_rules', 'Off') == 'On':
+			self.Rules = ConformanceRules()
+		self.Filter = None
+		self.FilterMark = getattr(self, 'filter_mode', 'Show Matching') == 'Mark Matching'
+		if (getattr(self, 'packet_filter', '') or '').strip():
+			self.Filter = PacketFilter(self.packet_filter)
 		return
 	
 	def get_capabilities(self):
@@ -25,6 +52,15 @@ class Hla(HighLevelAnalyzer):
 				},
 				"packet": {
 					'format': 'preamble; sbit; address: {{data.address}}; [ {{sbit}, {cmd.data}} ]; checksum; pebit'
+				},
+				'warning': {
+					'format': '{{data.warning}}'
+				},
+				'match': {
+					'format': 'Match: {{data.data}}'
+				},
+				'violation': {
+					'format': '{{data.violation}}'
 				}
 			}
 		}
@@ -37,5 +73,62 @@ class Hla(HighLevelAnalyzer):
 			pstime   = result[1]
 			petime   = result[2]
 			presult  = result[3]
-			return AnalyzerFrame(ptype, pstime, petime, presult)
+			match = None
+			if self.Filter is not None:
+				match = self.Filter.Match(presult)
+			if match:
+				packet = AnalyzerFrame('match' if self.FilterMark else ptype, pstime, petime, presult)
+			elif match is None or self.FilterMark:
+				packet = AnalyzerFrame(ptype, pstime, petime, presult)
+			else:
+				packet = None
+			notes = {}
+			if self.Monitor is not None and ptype == 'Packet':
+				notes.update(self.CheckRefresh(pstime, petime, presult))
+			if self.Rules is not None:
+				notes.update(self.CheckRules(ptype, pstime, petime, presult))
+			#
+			# A warning or violation is shown even on a packet the filter
+			# hides; the frame keeps the filter result in its match field
+			#
+			if notes:
+				if match is not None:
+					notes['match'] = match
+				return AnalyzerFrame('violation' if 'violation' in notes else 'warning', pstime, petime, dict(presult, **notes))
+			return packet
+
+	#
+	# Feed a decoded packet to the refresh monitor, returns its warnings as
+	# fields for the packet frame, or {} if there are none
+	#
+	# The warnings go on the packet that revealed them rather than on frames
+	# spanning the refresh gap: the gap starts at an earlier packet, and
+	# Logic 2 needs the frames of an HLA in time order without overlaps.
+	#
+	def CheckRefresh(self, pstime, petime, presult):
+		if self.Origin is None:
+			self.Origin = pstime
+		address = presult.get('address')
+		if address is not None and address[0] == 'A':
+			address = None
+		warnings = self.Monitor.Packet(float(pstime - self.Origin), address, (pstime, petime))
+		if not warnings:
+			return {}
+		return { 'warning': '; '.join(message for (kind, waddress, wstart, wend, message) in warnings),
+			'kind': ','.join(kind for (kind, waddress, wstart, wend, message) in warnings) }
+
+	#
+	# Check a decoded packet or error against the S-9.2 timing rules,
+	# returns the violations as fields for the packet frame, or {} if there
+	# are none.  Like the refresh warnings they go on the packet that broke
+	# the rule, since the spacing and gap rules reach back to earlier packets.
+	#
+	def CheckRules(self, ptype, pstime, petime, presult):
+		if self.Origin is None:
+			self.Origin = pstime
+		violations = self.Rules.Packet(ptype, float(pstime - self.Origin), float(petime - self.Origin), presult, pstime, petime)
+		if not violations:
+			return {}
+		return { 'violation': '; '.join(message for (rule, address, vstart, vend, message) in violations),
+			'rule': ','.join(rule for (rule, address, vstart, vend, message) in violations) }
 				
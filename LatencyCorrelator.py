@@ -0,0 +1,183 @@
+####################################################################################
+#
+# Command-to-rail latency from a DCSControl command log and a decoded capture
+#
+# DCSControl.py writes a command log with the time of every throttle action
+# and the packet the command station should send for it.  Each run starts
+# with a sync marker packet.  The first appearance of that packet in the
+# decoded capture (exported from the DCCUtilities HLA data table) lines up
+# the log clock with the capture clock.  The latency of a command is the
+# time from the command to the first matching packet on the rails.
+#
+# Latencies are relative to the latency of the sync marker itself, which
+# cannot be measured without a shared clock.
+#
+# Usage:
+#
+#	python LatencyCorrelator.py --run capture.csv DCSCommandLog-test.csv [--run ...]
+#
+####################################################################################
+import argparse
+import bisect
+import csv
+import json
+import sys
+
+#-----------------------------------------------------------------------------------
+#
+# Read a decoded capture, returns { packet hex: sorted list of start times }
+#
+#-----------------------------------------------------------------------------------
+def read_capture(path):
+	index = {}
+	with open(path, newline='') as f:
+		for row in csv.DictReader(f):
+			packet = row.get('packet')
+			if not packet:
+				continue
+			index.setdefault(packet.strip().lower(), []).append(float(row['start_time']))
+	for times in index.values():
+		times.sort()
+	return index
+
+#-----------------------------------------------------------------------------------
+#
+# Read a DCSControl command log, returns a list of dicts in log order
+#
+#-----------------------------------------------------------------------------------
+def read_log(path):
+	with open(path, newline='') as f:
+		records = list(csv.DictReader(f))
+	for record in records:
+		record['time'] = float(record['time'])
+	return records
+
+#-----------------------------------------------------------------------------------
+#
+# Commands of the same kind for an address replace each other on the rails:
+# speed and direction share the speed packet and each function group has
+# its own packet
+#
+#-----------------------------------------------------------------------------------
+def instruction_kind(record):
+	if record['command'] != 'function':
+		return 'speed'
+	function = int(record['value'][1:record['value'].index('=')])
+	for group, last in enumerate((4, 8, 12, 20)):
+		if function <= last:
+			return 'function%d' % group
+	return 'function4'
+
+#-----------------------------------------------------------------------------------
+#
+# Correlate one run, returns (system, { command: [latency, ...] }, { command: missing })
+#
+# A command whose packet is the same as the previous packet of the same
+# kind logged for its address is skipped, because that packet is already
+# being refreshed on the rails and the first match says nothing about it.
+#
+#-----------------------------------------------------------------------------------
+def correlate(capture, records, window=5.0):
+	sync = next((r for r in records if r['command'] == 'sync'), None)
+	if sync is None:
+		raise ValueError("command log has no sync marker")
+	marks = capture.get(sync['packet'])
+	if not marks:
+		raise ValueError("sync marker %s not found in capture" % sync['packet'])
+	offset = marks[0] - sync['time']
+
+	latencies = {}
+	missing = {}
+	last = {}
+	for record in records:
+		packet = record['packet']
+		if not packet or record is sync:
+			continue
+		key = (record['address'], record['long'], instruction_kind(record))
+		if last.get(key) == packet:
+			continue
+		last[key] = packet
+
+		command = record['command']
+		sent = record['time'] + offset
+		times = capture.get(packet, ())
+		i = bisect.bisect_left(times, sent)
+		if i < len(times) and times[i] - sent <= window:
+			latencies.setdefault(command, []).append(times[i] - sent)
+		else:
+			missing[command] = missing.get(command, 0) + 1
+	return sync.get('system', ''), latencies, missing
+
+#-----------------------------------------------------------------------------------
+#
+# Summarize a list of latencies
+#
+#-----------------------------------------------------------------------------------
+def percentile(values, fraction):
+	return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def summarize(values):
+	values = sorted(values)
+	if not values:
+		return { "count": 0 }
+	return {
+		"count": len(values),
+		"min": values[0],
+		"p50": percentile(values, 0.50),
+		"p90": percentile(values, 0.90),
+		"p99": percentile(values, 0.99),
+		"max": values[-1],
+		"mean": sum(values) / len(values),
+	}
+
+#-----------------------------------------------------------------------------------
+#
+# Correlate every (capture, log) run and combine the results per
+# command station and command type
+#
+#-----------------------------------------------------------------------------------
+def report(runs, window=5.0):
+	latencies = {}
+	missing = {}
+	for capture_path, log_path in runs:
+		system, run_latencies, run_missing = correlate(read_capture(capture_path), read_log(log_path), window)
+		for command, values in run_latencies.items():
+			latencies.setdefault((system, command), []).extend(values)
+		for command, count in run_missing.items():
+			missing[(system, command)] = missing.get((system, command), 0) + count
+
+	result = {}
+	for key in sorted(set(latencies) | set(missing)):
+		summary = summarize(latencies.get(key, []))
+		summary["missing"] = missing.get(key, 0)
+		result.setdefault(key[0], {})[key[1]] = summary
+	return result
+
+def print_report(result, out=sys.stdout):
+	out.write("%-8s %-10s %6s %6s %9s %9s %9s %9s %9s\n" % ("system", "command", "count", "miss", "min ms", "p50 ms", "p90 ms", "p99 ms", "max ms"))
+	for system, commands in result.items():
+		for command, s in commands.items():
+			if s["count"]:
+				out.write("%-8s %-10s %6d %6d %9.2f %9.2f %9.2f %9.2f %9.2f\n" % (system, command, s["count"], s["missing"],
+					s["min"] * 1000, s["p50"] * 1000, s["p90"] * 1000, s["p99"] * 1000, s["max"] * 1000))
+			else:
+				out.write("%-8s %-10s %6d %6d\n" % (system, command, 0, s["missing"]))
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Command-to-rail latency from DCSControl command logs and decoded captures")
+	parser.add_argument('--run', nargs=2, action='append', required=True, metavar=('CAPTURE', 'LOG'),
+		help="decoded capture CSV and the DCSControl command log recorded with it")
+	parser.add_argument('--window', type=float, default=5.0, help="longest latency in seconds before a command counts as missing")
+	parser.add_argument('--json', action='store_true', help="print the report as JSON")
+	args = parser.parse_args(argv)
+
+	result = report(args.run, args.window)
+	if args.json:
+		json.dump(result, sys.stdout, indent=2)
+		sys.stdout.write("\n")
+	else:
+		print_report(result)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,294 @@
+#
+# Live decoding of a growing capture export
+#
+# Follows a frame CSV while it is still being written (a streaming export
+# or a capture tool appending frames) and decodes the new frames as they
+# arrive.  One DCCPacket decodes the whole file, so a packet whose frames
+# straddle two reads decodes normally, and so does a line cut in half by a
+# read: the unfinished tail is kept until the rest of it is written.
+#
+# Every decoded packet goes to the subscribers:
+#
+#	stats       SoakStats buckets and anomalies, written to --stats DIR
+#	rules       ConformanceRules checks (--rules)
+#	feed        a local TCP feed (--port) sending every packet and rule
+#	            violation as a JSON line to each connected client
+#
+# The follower runs on asyncio.  When the file has no new data it sleeps,
+# starting at --poll and doubling up to --max-poll while the file stays
+# idle, so it never spins and picks up new data within --poll of a burst.
+# A slow feed client never holds up decoding: each client has a bounded
+# queue and loses its oldest lines when it falls behind.
+#
+# Usage:
+#
+#	python LiveDecoder.py frames.csv [--end] [--port 8765] [--rules] [--stats DIR] [--status 10] [--idle-exit S]
+#
+#	nc localhost 8765
+#
+
+import asyncio
+import json
+import os
+import sys
+
+import DCCFrames
+from ConformanceRules import ConformanceRules, RULES
+from DCCPacket import DCCPacket
+from SoakDecoder import SoakStats
+
+
+READ_SIZE = 1 << 20
+
+#
+# Frame of one frame CSV line, None for the header and malformed lines
+#
+def parse_frame(line):
+	row = line.decode('ascii', 'replace').rstrip('\r').split(',')
+	try:
+		return DCCFrames.make_frame(row[0], float(row[1]), float(row[2]), int(row[3], 0) if row[3] else None)
+	except (IndexError, ValueError):
+		return None
+
+class LiveDecoder:
+	def __init__(self, path, from_end=False, poll=0.005, max_poll=0.1, idle_exit=None):
+		self.Path = path
+		self.FromEnd = from_end
+		self.Poll = poll
+		self.MaxPoll = max_poll
+		self.IdleExit = idle_exit
+		self.Packet = DCCPacket()
+		self.Subscribers = []
+		self.Packets = 0
+		self.Restarts = 0
+		self.Stopped = False
+
+	#
+	# callback(ptype, pstime, petime, presult) is called for every decoded
+	# packet or error, in order
+	#
+	def Subscribe(self, callback):
+		self.Subscribers.append(callback)
+
+	def Stop(self):
+		self.Stopped = True
+
+	def Feed(self, lines):
+		decode = self.Packet.Decode
+		subscribers = self.Subscribers
+		for line in lines:
+			frame = parse_frame(line)
+			if frame is None:
+				continue
+			result = decode(frame)
+			if len(result) == 4:
+				self.Packets += 1
+				for callback in subscribers:
+					callback(*result)
+
+	#
+	# Follow the file until Stop() or until it has been idle for idle_exit
+	# seconds.  A file that shrinks was rewritten and is decoded again from
+	# the start with a fresh decoder.
+	#
+	async def Follow(self):
+		while not os.path.exists(self.Path):
+			await asyncio.sleep(self.MaxPoll)
+		with open(self.Path, 'rb') as f:
+			skip = False
+			if self.FromEnd:
+				#
+				# Start at the next line, the last one may still be partial
+				#
+				size = f.seek(0, os.SEEK_END)
+				if size > 0:
+					f.seek(size - 1)
+					skip = f.read(1) != b'\n'
+			tail = b''
+			poll = self.Poll
+			idle = 0.0
+			while not self.Stopped:
+				data = f.read(READ_SIZE)
+				if not data:
+					if os.fstat(f.fileno()).st_size < f.tell():
+						f.seek(0)
+						tail = b''
+						skip = False
+						self.Packet = DCCPacket()
+						self.Restarts += 1
+						continue
+					if self.IdleExit is not None and idle >= self.IdleExit:
+						break
+					await asyncio.sleep(poll)
+					idle += poll
+					poll = min(poll * 2, self.MaxPoll)
+					continue
+				poll = self.Poll
+				idle = 0.0
+				lines = (tail + data).split(b'\n')
+				tail = lines.pop()
+				if skip and lines:
+					lines = lines[1:]
+					skip = False
+				self.Feed(lines)
+				#
+				# Let the feed and the other tasks run between reads
+				#
+				await asyncio.sleep(0)
+
+#
+# TCP feed of JSON lines to any number of local clients
+#
+class LiveFeed:
+	def __init__(self, queue_size=10000):
+		self.QueueSize = queue_size
+		self.Clients = set()
+		self.Handlers = set()
+		self.Dropped = 0
+		self.Server = None
+
+	async def Start(self, host, port):
+		self.Server = await asyncio.start_server(self.Client, host, port)
+		return self.Server
+
+	#
+	# Stop serving and let every client send what it has queued, a None
+	# line ends a client
+	#
+	async def Close(self):
+		self.Server.close()
+		for queue in self.Clients:
+			if queue.full():
+				queue.get_nowait()
+			queue.put_nowait(None)
+		if self.Handlers:
+			await asyncio.wait(self.Handlers)
+
+	async def Client(self, reader, writer):
+		queue = asyncio.Queue(self.QueueSize)
+		self.Clients.add(queue)
+		self.Handlers.add(asyncio.current_task())
+		try:
+			while True:
+				line = await queue.get()
+				if line is None:
+					break
+				writer.write(line)
+				await writer.drain()
+		except ConnectionError:
+			pass
+		finally:
+			self.Clients.discard(queue)
+			self.Handlers.discard(asyncio.current_task())
+			writer.close()
+
+	def Send(self, message):
+		if not self.Clients:
+			return
+		line = (json.dumps(message) + "\n").encode()
+		for queue in self.Clients:
+			if queue.full():
+				queue.get_nowait()
+				self.Dropped += 1
+			queue.put_nowait(line)
+
+	def Packet(self, ptype, pstime, petime, presult):
+		if self.Clients:
+			self.Send(dict(zip(DCCFrames.PACKET_FIELDS, DCCFrames.packet_row(ptype, pstime, petime, presult))))
+
+	def Violation(self, violation):
+		rule, address, start, end, message = violation
+		self.Send({ "violation": rule, "address": address, "start_time": start, "end_time": end, "message": message })
+
+#
+# Print a status line every interval seconds
+#
+async def status(live, rules, feed, interval):
+	last = 0
+	while True:
+		await asyncio.sleep(interval)
+		text = "%d packets (%.0f/s)" % (live.Packets, (live.Packets - last) / interval)
+		errors = sum(live.Packet.ErrorCounts)
+		if errors:
+			text += ", %d errors" % errors
+		if rules is not None:
+			text += ", %d rule violations" % sum(rules.Counts.values())
+		if feed is not None:
+			text += ", %d clients" % len(feed.Clients)
+			if feed.Dropped:
+				text += " (%d lines dropped)" % feed.Dropped
+		print(text)
+		sys.stdout.flush()
+		last = live.Packets
+
+async def run(args):
+	live = LiveDecoder(args.frames, args.end, args.poll / 1000.0, args.max_poll / 1000.0, args.idle_exit)
+	feed = None
+	rules = None
+	stats = None
+	files = []
+	tasks = []
+	if args.port:
+		feed = LiveFeed()
+		await feed.Start(args.host, args.port)
+		live.Subscribe(feed.Packet)
+	if args.rules:
+		rules = ConformanceRules()
+		check = rules.Packet
+		def check_rules(ptype, pstime, petime, presult):
+			for violation in check(ptype, pstime, petime, presult):
+				if feed is not None:
+					feed.Violation(violation)
+		live.Subscribe(check_rules)
+	if args.stats:
+		os.makedirs(args.stats, exist_ok=True)
+		files = [open(os.path.join(args.stats, name), 'w', buffering=1) for name in ('buckets.jsonl', 'anomalies.jsonl')]
+		stats = SoakStats(args.bucket, bucket_out=files[0], anomaly_out=files[1])
+		live.Subscribe(stats.Add)
+	if args.status:
+		tasks.append(asyncio.ensure_future(status(live, rules, feed, args.status)))
+
+	try:
+		await live.Follow()
+	finally:
+		for task in tasks:
+			task.cancel()
+		if feed is not None:
+			await feed.Close()
+		if stats is not None:
+			with open(os.path.join(args.stats, 'summary.json'), 'w') as f:
+				json.dump(stats.Finish(), f, indent=2)
+		for f in files:
+			f.close()
+	return live, rules
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Decode a frame CSV while it is being written")
+	parser.add_argument('frames', help="frame CSV file, waited for if it does not exist yet")
+	parser.add_argument('--end', action='store_true', help="skip the frames already in the file")
+	parser.add_argument('--host', default='127.0.0.1', help="feed address")
+	parser.add_argument('--port', type=int, help="serve packets and violations as JSON lines on this TCP port")
+	parser.add_argument('--rules', action='store_true', help="check the S-9.2 timing rules")
+	parser.add_argument('--stats', metavar='DIR', help="write soak statistics to DIR")
+	parser.add_argument('--bucket', type=float, default=60.0, help="statistics bucket length in seconds")
+	parser.add_argument('--status', type=float, default=10.0, help="seconds between status lines, 0 for none")
+	parser.add_argument('--poll', type=float, default=5.0, help="ms to wait for new data")
+	parser.add_argument('--max-poll', type=float, default=100.0, help="longest ms to wait for new data while the file is idle")
+	parser.add_argument('--idle-exit', type=float, help="stop after the file has not grown for this many seconds")
+	args = parser.parse_args(argv)
+
+	try:
+		live, rules = asyncio.run(run(args))
+	except KeyboardInterrupt:
+		return 0
+	print("%s: %d packets" % (args.frames, live.Packets))
+	for name, count in sorted(live.Packet.ErrorSummary().items()):
+		print("    %8d  %s" % (count, name))
+	if rules is not None:
+		for rule in RULES:
+			print("    %-8s %8d" % (rule, rules.Counts[rule]))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,544 @@
+####################################################################################
+#
+# Headless stand-in for the JMRI runtime used by DCSControl.py
+#
+# DCSControl.py is a JMRI Jython script and imports java, javax.swing and
+# jmri at module level.  This module builds small fake versions of those
+# packages so the script can be loaded, driven and timed under plain CPython
+# (for example in CI) without a JMRI install.
+#
+# Usage:
+#
+#	import MockJMRI
+#	MockJMRI.install()
+#	import DCSControl
+#	...
+#	for (timestamp, address, method, value) in MockJMRI.throttleManager().commands:
+#		...
+#
+####################################################################################
+import sys
+import threading
+import time
+import types
+
+#-----------------------------------------------------------------------------------
+#
+# Clock used for every recorded timestamp (seconds, monotonic)
+#
+#-----------------------------------------------------------------------------------
+_clock = getattr(time, "perf_counter", time.time)
+
+def now():
+	return _clock()
+
+####################################################################################
+#
+# Fake java.lang
+#
+####################################################################################
+class System(object):
+	@staticmethod
+	def nanoTime():
+		return int(now() * 1000000000)
+
+	@staticmethod
+	def currentTimeMillis():
+		return int(time.time() * 1000)
+
+class Thread(object):
+	@staticmethod
+	def sleep(msec):
+		time.sleep(msec / 1000.0)
+
+####################################################################################
+#
+# Fake javax.swing widgets
+#
+# Only the attributes and methods used by the JMRI scripts are provided.
+# Every widget keeps the Jython bean-property style (.text, .enabled) as
+# well as the Java getter/setter style.
+#
+####################################################################################
+class ActionEvent(object):
+	def __init__(self, source):
+		self.source = source
+
+	def getSource(self):
+		return self.source
+
+class Component(object):
+	def __init__(self):
+		self.enabled = True
+		self.visible = True
+		self.children = []
+
+	def add(self, component):
+		self.children.append(component)
+		return component
+
+	def setEnabled(self, enabled):
+		self.enabled = enabled
+
+	def isEnabled(self):
+		return self.enabled
+
+	def setVisible(self, visible):
+		self.visible = visible
+
+	def repaint(self):
+		return
+
+class JLabel(Component):
+	LEFT = 2
+	CENTER = 0
+	RIGHT = 4
+
+	def __init__(self, text="", alignment=LEFT):
+		Component.__init__(self)
+		self.text = text
+		self.alignment = alignment
+
+	def setText(self, text):
+		self.text = text
+
+	def getText(self):
+		return self.text
+
+class JTextField(Component):
+	def __init__(self, columns=0):
+		Component.__init__(self)
+		self.text = ""
+		self.columns = columns
+
+	def setText(self, text):
+		self.text = text
+
+	def getText(self):
+		return self.text
+
+class JButton(Component):
+	def __init__(self, text=""):
+		Component.__init__(self)
+		self.text = text
+		self.actionPerformed = None
+
+	def setText(self, text):
+		self.text = text
+
+	def getText(self):
+		return self.text
+
+	def doClick(self):
+		if self.enabled and self.actionPerformed is not None:
+			self.actionPerformed(ActionEvent(self))
+
+class JComboBox(Component):
+	def __init__(self, items=None):
+		Component.__init__(self)
+		self.items = list(items or [])
+		self.selectedIndex = 0 if self.items else -1
+
+	def addItem(self, item):
+		self.items.append(item)
+		if self.selectedIndex < 0:
+			self.selectedIndex = 0
+
+	def getItemCount(self):
+		return len(self.items)
+
+	def getItemAt(self, index):
+		return self.items[index]
+
+	def getSelectedItem(self):
+		if self.selectedIndex < 0:
+			return None
+		return self.items[self.selectedIndex]
+
+	def setSelectedItem(self, item):
+		self.selectedIndex = self.items.index(item)
+
+	def getSelectedIndex(self):
+		return self.selectedIndex
+
+	def setSelectedIndex(self, index):
+		self.selectedIndex = index
+
+class JPanel(Component):
+	def setLayout(self, layout):
+		self.layout = layout
+
+class JFrame(Component):
+	def __init__(self, title=""):
+		Component.__init__(self)
+		self.title = title
+		self.contentPane = JPanel()
+		self.location = (0, 0)
+		self.size = (0, 0)
+		self.disposed = False
+
+	def setLocation(self, x, y):
+		self.location = (x, y)
+
+	def setSize(self, width, height):
+		self.size = (width, height)
+
+	def pack(self):
+		return
+
+	def show(self):
+		self.visible = True
+
+	def dispose(self):
+		self.disposed = True
+		self.visible = False
+
+class BoxLayout(object):
+	X_AXIS = 0
+	Y_AXIS = 1
+
+	def __init__(self, target, axis):
+		self.target = target
+		self.axis = axis
+
+class SwingUtilities(object):
+	#
+	# There is no event dispatch thread headless, so runnables are executed
+	# immediately on the calling thread.
+	#
+	@staticmethod
+	def invokeLater(runnable):
+		if hasattr(runnable, "run"):
+			runnable.run()
+		else:
+			runnable()
+
+	@staticmethod
+	def isEventDispatchThread():
+		return True
+
+####################################################################################
+#
+# Fake jmri throttles and throttle manager
+#
+####################################################################################
+class SpeedStepMode(object):
+	NMRA_DCC_128 = "128"
+	NMRA_DCC_28 = "28"
+	NMRA_DCC_27 = "27"
+	NMRA_DCC_14 = "14"
+
+class DccLocoAddress(object):
+	def __init__(self, number, isLong):
+		self.number = number
+		self.isLong = isLong
+
+	def getNumber(self):
+		return self.number
+
+	def isLongAddress(self):
+		return self.isLong
+
+	def __eq__(self, other):
+		return isinstance(other, DccLocoAddress) and (self.number, self.isLong) == (other.number, other.isLong)
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __hash__(self):
+		return hash((self.number, self.isLong))
+
+	def __repr__(self):
+		return "%d(%s)" % (self.number, "L" if self.isLong else "S")
+
+#-----------------------------------------------------------------------------------
+#
+# A fake DccThrottle
+#
+# Every state change is recorded as (timestamp, method, value) in self.calls
+# and forwarded to the owning manager's global command log.
+#
+#-----------------------------------------------------------------------------------
+class FakeThrottle(object):
+	FUNCTION_COUNT = 29
+
+	def __init__(self, manager, address):
+		self.manager = manager
+		self.address = address
+		self.speedSetting = 0.0
+		self.isForward = True
+		self.speedStepMode = SpeedStepMode.NMRA_DCC_128
+		self.functions = [False] * self.FUNCTION_COUNT
+		self.released = False
+		self.calls = []
+		for fn in range(self.FUNCTION_COUNT):
+			setattr(self, "setF%d" % fn, self._functionSetter(fn))
+			setattr(self, "getF%d" % fn, self._functionGetter(fn))
+
+	def _functionSetter(self, fn):
+		def setter(state):
+			self.setFunction(fn, state)
+		return setter
+
+	def _functionGetter(self, fn):
+		def getter():
+			return self.functions[fn]
+		return getter
+
+	def _record(self, method, value):
+		stamp = now()
+		self.calls.append((stamp, method, value))
+		self.manager._record(stamp, self.address, method, value)
+
+	def getLocoAddress(self):
+		return self.address
+
+	def setSpeedSetting(self, speed):
+		self.speedSetting = speed
+		self._record("setSpeedSetting", speed)
+
+	def getSpeedSetting(self):
+		return self.speedSetting
+
+	def setIsForward(self, forward):
+		self.isForward = forward
+		self._record("setIsForward", forward)
+
+	def getIsForward(self):
+		return self.isForward
+
+	def setSpeedStepMode(self, mode):
+		self.speedStepMode = mode
+		self._record("setSpeedStepMode", mode)
+
+	def getSpeedStepMode(self):
+		return self.speedStepMode
+
+	def setFunction(self, fn, state):
+		self.functions[fn] = state
+		self._record("setFunction", (fn, state))
+
+	def getFunction(self, fn):
+		return self.functions[fn]
+
+	def release(self, listener=None):
+		if not self.released:
+			self.released = True
+			self._record("release", None)
+			self.manager._release(self)
+
+	def dispose(self, listener=None):
+		self.release(listener)
+
+#-----------------------------------------------------------------------------------
+#
+# A fake ThrottleManager
+#
+# acquireDelay simulates the acquisition round trip of a real command
+# station and maxSlots simulates a slot limited system (LocoNet, XpressNet).
+# When no slot is available, acquisition fails the same way JMRI does.
+#
+#-----------------------------------------------------------------------------------
+class FakeThrottleManager(object):
+	def __init__(self, systemPrefix="L", userName="Mock", acquireDelay=0.0, maxSlots=None):
+		self.systemPrefix = systemPrefix
+		self.userName = userName
+		self.acquireDelay = acquireDelay
+		self.maxSlots = maxSlots
+		self.active = {}
+		self.acquisitions = 0
+		self.commands = []
+		self.cancelled = []		# (address, listener) of cancelled requests
+		self.lock = threading.Lock()
+
+	def getSystemPrefix(self):
+		return self.systemPrefix
+
+	def getUserName(self):
+		return self.userName
+
+	def _record(self, stamp, address, method, value):
+		with self.lock:
+			self.commands.append((stamp, address, method, value))
+
+	def _release(self, throttle):
+		with self.lock:
+			if self.active.get(throttle.address) is throttle:
+				del self.active[throttle.address]
+
+	def _acquire(self, address):
+		if self.acquireDelay:
+			time.sleep(self.acquireDelay)
+		with self.lock:
+			self.acquisitions += 1
+			throttle = self.active.get(address)
+			if throttle is None:
+				if self.maxSlots is not None and len(self.active) >= self.maxSlots:
+					return None
+				throttle = FakeThrottle(self, address)
+				self.active[address] = throttle
+			return throttle
+
+	def getThrottle(self, number, isLong):
+		return self._acquire(DccLocoAddress(number, isLong))
+
+	def requestThrottle(self, address, listener, *args):
+		if not isinstance(address, DccLocoAddress):
+			address = DccLocoAddress(address, address > 127)
+		throttle = self._acquire(address)
+		if throttle is None:
+			if hasattr(listener, "notifyFailedThrottleRequest"):
+				listener.notifyFailedThrottleRequest(address, "No slot available")
+			return False
+		listener.notifyThrottleFound(throttle)
+		return True
+
+	def cancelThrottleRequest(self, address, listener):
+		with self.lock:
+			self.cancelled.append((address, listener))
+
+	def activeCount(self):
+		return len(self.active)
+
+	def reset(self):
+		with self.lock:
+			self.active = {}
+			self.acquisitions = 0
+			self.commands = []
+			self.cancelled = []
+
+class InstanceManager(object):
+	managers = []
+
+	@staticmethod
+	def getDefault(type=None):
+		return InstanceManager.managers[0]
+
+	@staticmethod
+	def getList(type=None):
+		return list(InstanceManager.managers)
+
+	@staticmethod
+	def throttleManagerInstance():
+		return InstanceManager.managers[0]
+
+class ThrottleManager(object):
+	pass
+
+class ThrottleListener(object):
+	pass
+
+#-----------------------------------------------------------------------------------
+#
+# A fake jmri.jmrit.automat.AbstractAutomaton
+#
+# start() runs init() once then handle() until it returns False on a daemon
+# thread, as JMRI does.  getThrottle() uses the default throttle manager.
+#
+#-----------------------------------------------------------------------------------
+class AbstractAutomaton(object):
+	autostart = True
+
+	def __init__(self, name=None):
+		self.name = name
+		self.thread = None
+		self.running = False
+
+	def setName(self, name):
+		self.name = name
+
+	def getName(self):
+		return self.name
+
+	def init(self):
+		return
+
+	def handle(self):
+		return False
+
+	def start(self):
+		if not AbstractAutomaton.autostart:
+			return
+		self.thread = threading.Thread(target=self._run, name=self.name)
+		self.thread.daemon = True
+		self.running = True
+		self.thread.start()
+
+	def _run(self):
+		self.init()
+		while self.running and self.handle():
+			pass
+		self.running = False
+
+	def stop(self):
+		self.running = False
+
+	def waitMsec(self, msec):
+		time.sleep(msec / 1000.0)
+		return True
+
+	def getThrottle(self, address, isLong, *args):
+		throttle = InstanceManager.getDefault(ThrottleManager).getThrottle(address, isLong)
+		if throttle is None:
+			raise RuntimeError("Throttle request failed for %d" % address)
+		return throttle
+
+class FileUtil(object):
+	userFilesPath = "."
+
+	@staticmethod
+	def getUserFilesPath():
+		return FileUtil.userFilesPath
+
+####################################################################################
+#
+# Install the fake packages into sys.modules
+#
+####################################################################################
+def _module(name, **attrs):
+	module = types.ModuleType(name)
+	for key, value in attrs.items():
+		setattr(module, key, value)
+	sys.modules[name] = module
+	return module
+
+#-----------------------------------------------------------------------------------
+#
+# Install java, javax.swing and jmri stand-ins.  One fake throttle manager is
+# created per system prefix; the first one is the default.  Returns the
+# default manager.
+#
+#-----------------------------------------------------------------------------------
+def install(systemPrefixes=("L",), acquireDelay=0.0, maxSlots=None, autostart=True):
+	java = _module("java")
+	java.lang = _module("java.lang", System=System, Thread=Thread)
+
+	javax = _module("javax")
+	javax.swing = _module("javax.swing",
+		JFrame=JFrame, JPanel=JPanel, JLabel=JLabel, JButton=JButton,
+		JTextField=JTextField, JComboBox=JComboBox, BoxLayout=BoxLayout,
+		SwingUtilities=SwingUtilities)
+
+	InstanceManager.managers = [FakeThrottleManager(prefix, acquireDelay=acquireDelay, maxSlots=maxSlots) for prefix in systemPrefixes]
+	AbstractAutomaton.autostart = autostart
+
+	jmri = _module("jmri",
+		SpeedStepMode=SpeedStepMode, DccLocoAddress=DccLocoAddress,
+		InstanceManager=InstanceManager, ThrottleManager=ThrottleManager,
+		ThrottleListener=ThrottleListener)
+	jmri.jmrit = _module("jmri.jmrit")
+	jmri.jmrit.automat = _module("jmri.jmrit.automat", AbstractAutomaton=AbstractAutomaton)
+	jmri.util = _module("jmri.util", FileUtil=FileUtil)
+	return InstanceManager.managers[0]
+
+def uninstall():
+	for name in list(sys.modules):
+		if name.split(".")[0] in ("java", "javax", "jmri"):
+			del sys.modules[name]
+	InstanceManager.managers = []
+
+def throttleManager(systemPrefix=None):
+	for manager in InstanceManager.managers:
+		if systemPrefix is None or manager.systemPrefix == systemPrefix:
+			return manager
+	return None
@@ -0,0 +1,144 @@
+#
+# Multi-channel offline decoding
+#
+# Decodes several frame CSVs captured at the same time (main and
+# programming track, or two boosters), each with its own DCCPacket state
+# machine, and merges the decoded packets into one stream ordered by start
+# time.  The merge keeps one pending packet per channel in a heap, so it
+# runs in a single streaming pass whatever the number or length of the
+# captures.
+#
+# With --sync every packet of the other channels is paired with the same
+# packet on the first (reference) channel when they start within the sync
+# window, which gives the booster skew distribution per channel.
+#
+# Merged packet CSV columns:  channel,type,start_time,end_time,data,address,packet,error
+#
+# Usage:
+#
+#	python MultiChannel.py main.csv booster.csv [more.csv ...] [--out merged.csv] [--sync] [--window MS]
+#
+
+import csv
+import heapq
+import os
+import sys
+
+import DCCFrames
+from CaptureDiff import percentiles
+from DCCPacket import DCCPacket
+
+
+MERGED_FIELDS = ('channel',) + DCCFrames.PACKET_FIELDS
+
+
+def channel_name(path):
+	name = os.path.basename(path)
+	for suffix in ('.frames.csv', '.csv'):
+		if name.endswith(suffix):
+			return name[:-len(suffix)]
+	return name
+
+#
+# Decode one channel, yields (start_time, channel, ptype, pstime, petime,
+# presult) so the tuples order by time and then by channel
+#
+def channel_packets(channel, frames, packet):
+	for ptype, pstime, petime, presult in DCCFrames.decode_frames(frames, packet):
+		yield (pstime, channel, ptype, pstime, petime, presult)
+
+#
+# Decode frame streams in parallel and merge them by start time, yields
+# (channel, ptype, pstime, petime, presult).  decoders receives the
+# DCCPacket of every channel, for their error counts.
+#
+def merge_channels(streams, decoders=None):
+	if decoders is None:
+		decoders = []
+	sources = []
+	for channel, frames in enumerate(streams):
+		packet = DCCPacket()
+		decoders.append(packet)
+		sources.append(channel_packets(channel, frames, packet))
+	for (key, channel, ptype, pstime, petime, presult) in heapq.merge(*sources, key=lambda item: (item[0], item[1])):
+		yield channel, ptype, pstime, petime, presult
+
+#
+# Pairs the packets of the other channels with the same packet on channel
+# 0 when they start within window seconds, and collects the skew (start on
+# the channel minus start on channel 0).  Unpaired packets are kept per
+# channel and packet only until a newer copy replaces them.
+#
+class SyncCheck:
+	def __init__(self, channels, window=0.001):
+		self.Window = window
+		self.Unpaired = [{} for channel in range(channels)]		# packet -> start time
+		self.Skews = [[] for channel in range(channels)]
+		self.Packets = [0] * channels
+
+	def Add(self, channel, ptype, pstime, presult):
+		self.Packets[channel] += 1
+		packet = presult.get('packet')
+		if ptype != 'Packet' or not packet:
+			return
+		if channel == 0:
+			for other in range(1, len(self.Unpaired)):
+				start = self.Unpaired[other].get(packet)
+				if start is not None and pstime - start <= self.Window:
+					del self.Unpaired[other][packet]
+					self.Skews[other].append(start - pstime)
+			self.Unpaired[0][packet] = pstime
+		else:
+			start = self.Unpaired[0].get(packet)
+			if start is not None and pstime - start <= self.Window:
+				self.Skews[channel].append(pstime - start)
+			else:
+				self.Unpaired[channel][packet] = pstime
+
+	def Report(self, names):
+		report = {}
+		for channel in range(1, len(names)):
+			skews = self.Skews[channel]
+			report[names[channel]] = {
+				"packets": self.Packets[channel],
+				"paired": len(skews),
+				"unpaired": self.Packets[channel] - len(skews),
+				"skew": percentiles(skews),
+			}
+		return report
+
+def main(argv=None):
+	import argparse
+	import json
+	parser = argparse.ArgumentParser(description="Decode simultaneous DCC captures and merge them by time")
+	parser.add_argument('files', nargs='+', help="frame CSV files, one per channel")
+	parser.add_argument('--out', help="merged packet CSV (default: merged.packets.csv next to the first file)")
+	parser.add_argument('--sync', action='store_true', help="report the skew of every channel against the first")
+	parser.add_argument('--window', type=float, default=1.0, help="sync pairing window in ms")
+	args = parser.parse_args(argv)
+
+	names = [channel_name(path) for path in args.files]
+	out = args.out or os.path.join(os.path.dirname(args.files[0]), 'merged.packets.csv')
+	sync = SyncCheck(len(names), args.window / 1000.0) if args.sync else None
+	decoders = []
+	count = 0
+	with open(out, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(MERGED_FIELDS)
+		for channel, ptype, pstime, petime, presult in merge_channels([DCCFrames.read_frames(path) for path in args.files], decoders):
+			writer.writerow([names[channel]] + DCCFrames.packet_row(ptype, pstime, petime, presult))
+			if sync is not None:
+				sync.Add(channel, ptype, pstime, presult)
+			count += 1
+
+	print("%s: %d packets" % (out, count))
+	for name, decoder in zip(names, decoders):
+		for error, error_count in sorted(decoder.ErrorSummary().items()):
+			print("    %-16s %8d  %s" % (name, error_count, error))
+	if sync is not None:
+		json.dump(sync.Report(names), sys.stdout, indent=2)
+		sys.stdout.write("\n")
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,313 @@
+#
+# Packet filter and trigger expressions
+#
+# A small expression language over decoded DCC packets, for picking rare
+# events out of long captures, for example:
+#
+#	address 3 and speed128 step > 100
+#	any ESTOP
+#	long address with bad checksum
+#	function 0 on and not short address 3
+#	"Consist"
+#
+# Terms:
+#
+#	address [op N]              decoder address (short, long or broadcast 0)
+#	speed [step] [op N]         speed step in any mode (STOP is 0)
+#	speed128 [step] [op N]      128 step speed packets only
+#	speed28 [step] [op N]       14/28 step speed packets only
+#	function [N [on|off]]       function group packets (carrying function N)
+#	cv [op N]                   CV access packets (long form, CV numbers from 1)
+#	short, long, accessory, broadcast, idle
+#	stop, estop, fwd, rev
+#	error, bad checksum, short preamble, truncated
+#	"text"                      text found in the decoded description
+#
+# where op is one of = == != < <= > >= (= if left out).  Terms combine with
+# and, or, not and parentheses; "with" is the same as "and" and "any" and
+# "bad" are ignored.  Words are case insensitive.
+#
+# An expression is compiled once into a Python predicate over the fields
+# of a packet.  The fields only depend on the packet bytes and the error,
+# and nearly every packet on the rails is a refresh repeat, so the outcome
+# is cached per distinct packet and a match usually costs one dict lookup.
+#
+# Like DCCPacket, this module only depends on the speed step tables in
+# DCCSpeed.py.
+#
+
+import re
+
+from DCCSpeed import ESTOP, STEP_FROM_28, STEP_FROM_128
+
+
+class FilterError(ValueError):
+	pass
+
+#
+# Fields of one decoded packet, None where a field does not apply
+#
+class PacketFields:
+	__slots__ = ('address', 'short', 'long', 'accessory', 'broadcast', 'idle',
+		'speed', 'speed128', 'speed28', 'stop', 'estop', 'fwd', 'rev',
+		'functions', 'cv', 'error', 'data')
+
+	def __init__(self, packet, error, data):
+		self.address = None
+		self.short = self.long = self.accessory = self.broadcast = self.idle = False
+		self.speed = self.speed128 = self.speed28 = None
+		self.stop = self.estop = self.fwd = self.rev = False
+		self.functions = None
+		self.cv = None
+		self.error = error or ""
+		self.data = data or ""
+		if not packet:
+			return
+		try:
+			self.parse([int(byte, 16) for byte in packet.split()])
+		except (IndexError, ValueError):
+			pass
+
+	def parse(self, packet):
+		first = packet[0]
+		i = 1
+		if first == 0:
+			self.broadcast = True
+			self.address = 0
+		elif first < 128:
+			self.short = True
+			self.address = first
+		elif first < 192:
+			self.accessory = True
+			return
+		elif first < 232:
+			self.long = True
+			self.address = ((first & 0x3F) << 8) | packet[1]
+			i = 2
+		else:
+			self.idle = first == 255
+			return
+		if i >= len(packet) - 1:
+			return
+
+		instruction = packet[i]
+		group = instruction >> 4
+		if instruction == 0x3F:
+			self.speed_step(STEP_FROM_128[packet[i + 1] & 0x7F], packet[i + 1] & 0x80, 128)
+			self.speed128 = self.speed
+		elif group in (4, 5, 6, 7):
+			self.speed_step(STEP_FROM_28[instruction & 0x1F], instruction & 0x20, 28)
+			self.speed28 = self.speed
+		elif group in (8, 9):
+			self.functions = function_states(instruction, 1, 4)
+			self.functions[0] = bool(instruction & 0x10)
+		elif group in (10, 11):
+			if instruction & 0x10:
+				self.functions = function_states(instruction, 5, 4)
+			else:
+				self.functions = function_states(instruction, 9, 4)
+		elif instruction == 0xDE:
+			self.functions = function_states(packet[i + 1], 13, 8)
+		elif instruction == 0xDF:
+			self.functions = function_states(packet[i + 1], 21, 8)
+		elif group == 14:
+			self.cv = (((instruction & 0x03) << 8) | packet[i + 1]) + 1
+
+	#
+	# Speed fields from a decoded speed step (see DCCSpeed.py), ESTOP has
+	# speed 0 like STOP
+	#
+	def speed_step(self, step, forward, mode):
+		self.fwd = bool(forward)
+		self.rev = not forward
+		self.stop = step == 0
+		self.estop = step == ESTOP[mode]
+		self.speed = 0 if self.estop else step
+
+def function_states(bits, first, count):
+	return dict((first + n, bool(bits & (1 << n))) for n in range(count))
+
+#
+# Tokenizer
+#
+TOKEN = re.compile(r'\s*(?:(0x[0-9a-fA-F]+|\d+)|(==|!=|<=|>=|<|>|=)|([A-Za-z_][A-Za-z0-9_]*)|(\()|(\))|"([^"]*)")')
+
+NOISE = ('any', 'bad')
+
+FLAGS = {
+	'short': 'f.short', 'long': 'f.long', 'accessory': 'f.accessory', 'broadcast': 'f.broadcast',
+	'idle': 'f.idle', 'stop': 'f.stop', 'estop': 'f.estop', 'fwd': 'f.fwd', 'forward': 'f.fwd',
+	'rev': 'f.rev', 'reverse': 'f.rev', 'error': 'bool(f.error)', 'errors': 'bool(f.error)',
+	'checksum': "('bad error detection byte' in f.error)", 'truncated': "('truncated packet' in f.error)",
+}
+
+NUMERIC = { 'address': 'f.address', 'speed': 'f.speed', 'speed128': 'f.speed128', 'speed28': 'f.speed28', 'speed14': 'f.speed28', 'cv': 'f.cv' }
+
+def tokenize(expression):
+	tokens = []
+	position = 0
+	expression = expression.rstrip()
+	while position < len(expression):
+		match = TOKEN.match(expression, position)
+		if match is None or match.end() == position:
+			raise FilterError("unexpected %r at position %d" % (expression[position:].strip()[:10], position))
+		number, op, word, lparen, rparen, text = match.groups()
+		if number is not None:
+			tokens.append(('number', int(number, 0)))
+		elif op is not None:
+			tokens.append(('op', '==' if op == '=' else op))
+		elif word is not None:
+			word = word.lower()
+			if word not in NOISE:
+				tokens.append(('word', word))
+		elif lparen is not None:
+			tokens.append(('(', None))
+		elif rparen is not None:
+			tokens.append((')', None))
+		else:
+			tokens.append(('text', text))
+		position = match.end()
+	return tokens
+
+#
+# Recursive descent compiler from tokens to Python source
+#
+class Compiler:
+	def __init__(self, expression):
+		self.Tokens = tokenize(expression)
+		self.Position = 0
+		self.UsesData = False
+
+	def peek(self, kind=None, value=None):
+		if self.Position >= len(self.Tokens):
+			return None
+		token = self.Tokens[self.Position]
+		if kind is not None and token[0] != kind:
+			return None
+		if value is not None and token[1] != value:
+			return None
+		return token
+
+	def take(self, kind=None, value=None):
+		token = self.peek(kind, value)
+		if token is not None:
+			self.Position += 1
+		return token
+
+	def fail(self, message):
+		token = self.peek()
+		found = "end of expression" if token is None else repr(token[1] if token[1] is not None else token[0])
+		raise FilterError("%s, found %s" % (message, found))
+
+	def compile(self):
+		if not self.Tokens:
+			raise FilterError("empty filter expression")
+		source = self.parse_or()
+		if self.peek() is not None:
+			self.fail("expected and, or or the end of the expression")
+		return source
+
+	def parse_or(self):
+		terms = [self.parse_and()]
+		while self.take('word', 'or'):
+			terms.append(self.parse_and())
+		return terms[0] if len(terms) == 1 else "(%s)" % " or ".join(terms)
+
+	def parse_and(self):
+		terms = [self.parse_not()]
+		while self.take('word', 'and') or self.take('word', 'with'):
+			terms.append(self.parse_not())
+		return terms[0] if len(terms) == 1 else "(%s)" % " and ".join(terms)
+
+	def parse_not(self):
+		if self.take('word', 'not'):
+			return "(not %s)" % self.parse_not()
+		return self.parse_term()
+
+	def parse_term(self):
+		if self.take('('):
+			source = self.parse_or()
+			if not self.take(')'):
+				self.fail("expected )")
+			return source
+		token = self.take('text')
+		if token is not None:
+			self.UsesData = True
+			return "(%r in f.data)" % token[1]
+		token = self.take('word')
+		if token is None:
+			self.fail("expected a filter term")
+		word = token[1]
+
+		if word == 'short' and self.take('word', 'preamble'):
+			return "('short preamble' in f.error)"
+		if word in ('short', 'long') and self.peek('word', 'address'):
+			#
+			# "long address 1000" is long and address 1000
+			#
+			self.take()
+			comparison = self.parse_comparison('f.address')
+			if comparison is None:
+				return FLAGS[word]
+			return "(%s and %s)" % (FLAGS[word], comparison)
+		if word in FLAGS:
+			return FLAGS[word]
+		if word in NUMERIC:
+			self.take('word', 'step')
+			comparison = self.parse_comparison(NUMERIC[word])
+			if comparison is None:
+				return "(%s is not None)" % NUMERIC[word]
+			return comparison
+		if word == 'function':
+			number = self.take('number')
+			if number is None:
+				return "(f.functions is not None)"
+			if self.take('word', 'on'):
+				return "(f.functions is not None and f.functions.get(%d) is True)" % number[1]
+			if self.take('word', 'off'):
+				return "(f.functions is not None and f.functions.get(%d) is False)" % number[1]
+			return "(f.functions is not None and %d in f.functions)" % number[1]
+		raise FilterError("unknown filter term %r" % word)
+
+	#
+	# Optional [op] N after a numeric field, None if there is none
+	#
+	def parse_comparison(self, field):
+		op = self.take('op')
+		number = self.take('number')
+		if number is None:
+			if op is not None:
+				self.fail("expected a number after %s" % op[1])
+			return None
+		op = '==' if op is None else op[1]
+		if op in ('==', '!='):
+			return "(%s %s %d)" % (field, op, number[1])
+		return "(%s is not None and %s %s %d)" % (field, field, op, number[1])
+
+class PacketFilter:
+	CacheLimit = 65536
+
+	def __init__(self, expression):
+		compiler = Compiler(expression)
+		self.Expression = expression
+		self.Source = compiler.compile()
+		self.UsesData = compiler.UsesData
+		self.Predicate = eval("lambda f: " + self.Source, { '__builtins__': {}, 'bool': bool })
+		self.Cache = {}
+
+	#
+	# True if a decoded result (the presult dict returned by
+	# DCCPacket.Decode) matches the expression
+	#
+	def Match(self, presult):
+		key = presult.get('packet')
+		error = presult.get('error')
+		if error is not None or self.UsesData:
+			key = (key, error, presult.get('data'))
+		matched = self.Cache.get(key)
+		if matched is None:
+			matched = self.Predicate(PacketFields(presult.get('packet'), error, presult.get('data')))
+			if len(self.Cache) >= self.CacheLimit:
+				self.Cache.clear()
+			self.Cache[key] = matched
+		return matched
@@ -0,0 +1,242 @@
+#
+# RailCom cutout detection and timing
+#
+# A command station with RailCom cuts the track power after every packet
+# so decoders can answer in the cutout.  The frame analyzer knows nothing
+# about it (the cutout eats into the next preamble), so this tool finds
+# the cutouts in the digital edges of the same capture and attaches each
+# one to the packet it follows, as decoded from the frame CSV.
+#
+# RP-9.3.2 times the cutout from the end of the packet end bit:
+#
+#	start delay   TCS, 26 to 32 us
+#	end           TCE, 454 to 488 us
+#
+# With both rails recorded on two channels the cutout is where both rails
+# are at the same level, which gives its start and end exactly.  With one
+# channel it is a quiet interval of at least --min-quiet (which has to be
+# longer than the 0 half-bits, stretched zeros included), and its start is
+# only seen if the signal changes level when the cutout starts; otherwise
+# the start delay reads 0.
+#
+# The edges are handled as whole numpy arrays: the rail states between
+# edges come from one searchsorted per channel, the quiet runs from one
+# comparison and one diff, and the packets from one searchsorted over the
+# packet end times, so no Python code runs per edge.
+#
+# Edge files:
+#
+#	Logic 2 binary export   one digital channel per file, give both files
+#	                        for two channels
+#	Logic 2 CSV export      Time [s],Channel 0[,Channel 1] (state rows)
+#	.npy                    edge times of one channel, starting low
+#
+# Packet CSV columns:  type,start_time,end_time,data,address,packet,error,cutout_start,cutout_end,start_delay_us,end_us,duration_us,cutout
+#
+# Usage:
+#
+#	python RailComCutout.py frames.csv edges.csv [edges_b.bin] [--out cutouts.csv] [--min-quiet 200] [--max-delay 100] [--cache DIR] [--json]
+#
+
+import csv
+import os
+import struct
+import sys
+
+import numpy as np
+
+import DCCFrames
+from AckDetector import SALEAE_MAGIC
+
+
+SALEAE_DIGITAL = 0
+
+#
+# RP-9.3.2 limits in seconds from the end of the packet end bit
+#
+START_DELAY = (26e-6, 32e-6)
+END_TIME = (454e-6, 488e-6)
+
+CUTOUT_FIELDS = ('cutout_start', 'cutout_end', 'start_delay_us', 'end_us', 'duration_us', 'cutout')
+
+
+#
+# Edge times and initial state of one channel, from a Logic 2 binary
+# digital export or an .npy of edge times
+#
+def load_channel(path):
+	with open(path, 'rb') as f:
+		header = f.read(44)
+	if header[:8] == SALEAE_MAGIC:
+		version, kind, initial = struct.unpack_from('<iiI', header, 8)
+		if kind != SALEAE_DIGITAL:
+			raise ValueError("%s: not a digital channel export" % path)
+		if version not in (0, 1):
+			raise ValueError("%s: unsupported Logic 2 binary export version %d" % (path, version))
+		count = struct.unpack_from('<Q', header, 36)[0]
+		return np.memmap(path, dtype='<f8', mode='r', offset=44, shape=(count,)), initial & 1
+	if path.endswith('.npy'):
+		return np.load(path, mmap_mode='r'), 0
+	raise ValueError("%s: not a Logic 2 binary export or .npy file" % path)
+
+#
+# Edge times and the rail states from each edge on, (times, states) with
+# states shaped (edges, channels)
+#
+def load_edges(paths):
+	if len(paths) == 1 and not paths[0].endswith('.npy'):
+		with open(paths[0], 'rb') as f:
+			binary = f.read(8) == SALEAE_MAGIC
+		if not binary:
+			rows = np.loadtxt(paths[0], delimiter=',', skiprows=1, ndmin=2)
+			return rows[:, 0].copy(), rows[:, 1:].astype(np.uint8)
+	channels = [load_channel(path) for path in paths]
+	if len(channels) == 1:
+		times, initial = channels[0]
+		states = (initial ^ (np.arange(len(times)) + 1)) & 1
+		return np.asarray(times), states.astype(np.uint8).reshape(-1, 1)
+	times = np.unique(np.concatenate([np.asarray(edges) for edges, initial in channels]))
+	states = np.empty((len(times), len(channels)), dtype=np.uint8)
+	for i, (edges, initial) in enumerate(channels):
+		states[:, i] = (initial ^ np.searchsorted(edges, times, 'right')) & 1
+	return times, states
+
+#
+# Cutouts in the edges, (start times, end times).  With two channels a
+# cutout is a run of both rails at the same level, with one a single
+# interval without edges; either has to last at least min_quiet seconds.
+#
+def detect_cutouts(times, states, min_quiet=200e-6):
+	if len(times) < 2:
+		return np.empty(0), np.empty(0)
+	if states.shape[1] > 1:
+		quiet = np.all(states[:-1] == states[:-1, :1], axis=1)
+	else:
+		quiet = np.diff(times) >= min_quiet
+	change = np.diff(np.concatenate(([0], quiet.view(np.int8), [0])))
+	first = np.flatnonzero(change == 1)
+	last = np.flatnonzero(change == -1)
+	starts = times[first]
+	ends = times[last]
+	keep = ends - starts >= min_quiet
+	return starts[keep], ends[keep]
+
+#
+# Index of the packet each cutout follows, -1 where no packet ended within
+# max_delay before it.  A packet keeps only its first cutout.
+#
+def attach_cutouts(packet_ends, starts, max_delay=100e-6, tolerance=1e-6):
+	index = np.searchsorted(packet_ends, starts + tolerance, 'right') - 1
+	valid = index >= 0
+	delay = starts - packet_ends[np.maximum(index, 0)]
+	valid &= delay <= max_delay
+	order = np.flatnonzero(valid)
+	first = order[np.unique(index[order], return_index=True)[1]]
+	valid[:] = False
+	valid[first] = True
+	index[~valid] = -1
+	return index
+
+#
+# RP-9.3.2 verdict of one cutout
+#
+def cutout_result(delay, end):
+	problems = []
+	if not START_DELAY[0] <= delay <= START_DELAY[1]:
+		problems.append("start" if delay > 0 else "start not seen")
+	if not END_TIME[0] <= end <= END_TIME[1]:
+		problems.append("end")
+	return "ok" if not problems else "bad " + " and ".join(problems)
+
+#
+# Decoded packets with their cutouts, returns (rows, counts): the packet
+# CSV row of every packet with the cutout fields, empty where the packet
+# has none, and the summary counts
+#
+def analyze(packets, times, states, min_quiet=200e-6, max_delay=100e-6):
+	packets = list(packets)
+	ends = np.array([petime for ptype, pstime, petime, presult in packets], dtype=np.float64)
+	starts, stops = detect_cutouts(times, states, min_quiet)
+	index = attach_cutouts(ends, starts, max_delay)
+	attached = index >= 0
+	cutouts = {}
+	for packet, start, stop in zip(index[attached].tolist(), starts[attached].tolist(), stops[attached].tolist()):
+		cutouts[packet] = (start, stop)
+
+	counts = { "packets": len(packets), "cutouts": len(starts), "attached": len(cutouts),
+		"unattached": len(starts) - len(cutouts), "without": 0, "results": {} }
+	delays = []
+	end_times = []
+	rows = []
+	for i, (ptype, pstime, petime, presult) in enumerate(packets):
+		row = DCCFrames.packet_row(ptype, pstime, petime, presult)
+		cutout = cutouts.get(i)
+		if cutout is None:
+			if ptype == 'Packet':
+				counts["without"] += 1
+			rows.append(row + [''] * len(CUTOUT_FIELDS))
+			continue
+		start, stop = cutout
+		delay = max(0.0, start - petime)
+		end = stop - petime
+		result = cutout_result(delay, end)
+		counts["results"][result] = counts["results"].get(result, 0) + 1
+		delays.append(delay)
+		end_times.append(end)
+		rows.append(row + [repr(start), repr(stop), "%.2f" % (delay * 1e6), "%.2f" % (end * 1e6), "%.2f" % ((stop - start) * 1e6), result])
+	counts["start_delay_us"] = microseconds(delays)
+	counts["end_us"] = microseconds(end_times)
+	return rows, counts
+
+def microseconds(values):
+	if not values:
+		return {}
+	values = np.array(values) * 1e6
+	return { "min": float(values.min()), "p50": float(np.median(values)), "p99": float(np.percentile(values, 99)), "max": float(values.max()) }
+
+def write_cutouts(path, rows):
+	with open(path, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(DCCFrames.PACKET_FIELDS + CUTOUT_FIELDS)
+		writer.writerows(rows)
+
+def main(argv=None):
+	import argparse
+	import json
+	parser = argparse.ArgumentParser(description="Find RailCom cutouts in a capture's edges and time them against RP-9.3.2")
+	parser.add_argument('frames', help="frame CSV of the capture")
+	parser.add_argument('edges', nargs='+', help="edges: Logic 2 CSV export, or one Logic 2 binary export or .npy per rail")
+	parser.add_argument('--min-quiet', type=float, default=200.0, help="shortest cutout in us, above the longest 0 half-bit of the capture")
+	parser.add_argument('--max-delay', type=float, default=100.0, help="longest us from the packet end bit to the cutout start")
+	parser.add_argument('--cache', metavar='DIR', help="reuse decoded packets from the decode cache in DIR")
+	parser.add_argument('--out', help="packet CSV with cutouts (default: <frames>.cutouts.csv)")
+	parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+	args = parser.parse_args(argv)
+
+	times, states = load_edges(args.edges)
+	if args.cache:
+		from DecodeCache import DecodeCache
+		packets = DecodeCache(args.cache).Decode(args.frames)
+	else:
+		packets = DCCFrames.decode_frames(DCCFrames.read_frames(args.frames))
+	rows, counts = analyze(packets, times, states, args.min_quiet / 1e6, args.max_delay / 1e6)
+
+	out = args.out or os.path.splitext(args.frames)[0] + '.cutouts.csv'
+	write_cutouts(out, rows)
+	counts["edges"] = len(times)
+	counts["channels"] = states.shape[1]
+	if args.json:
+		json.dump(counts, sys.stdout, indent=2)
+		sys.stdout.write("\n")
+	else:
+		print("%s: %d packets, %d edges on %d channel%s" % (out, counts["packets"], len(times), states.shape[1], "s" if states.shape[1] > 1 else ""))
+		print("    %d cutouts, %d after a packet, %d packets without one" % (counts["cutouts"], counts["attached"], counts["without"]))
+		for result, count in sorted(counts["results"].items()):
+			print("    %-24s %6d" % (result, count))
+		for name, label in (("start_delay_us", "start delay us"), ("end_us", "end us")):
+			if counts[name]:
+				print("    %-16s min/p50/p99/max %.1f/%.1f/%.1f/%.1f" % ((label,) + tuple(counts[name][key] for key in ("min", "p50", "p99", "max"))))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,84 @@
+####################################################################################
+#
+# Refresh starvation monitor
+#
+# Tracks when every active decoder address was last seen on the rails and
+# reports addresses that go longer than a threshold without a packet, and
+# stretches where the overall packet rate in a sliding window falls below
+# a floor.  Deadlines are kept in a heap so each packet costs O(log n) for
+# n active addresses, whatever the length of the capture.
+#
+# Times are floats in seconds.  Each packet may carry an opaque stamp (the
+# HLA passes the frame GraphTime) which is handed back in the warnings so
+# callers can place annotations without converting times back.
+#
+####################################################################################
+import collections
+import heapq
+
+
+class RefreshMonitor:
+	def __init__(self, threshold=0.5, window=1.0, floor=0.0):
+		self.Threshold = threshold
+		self.Window = window
+		self.Floor = floor
+
+		self.Deadlines = []		# heap of (deadline, address)
+		self.LastSeen = {}		# address -> (time, stamp)
+		self.Starved = set()	# addresses already reported and not seen since
+		self.Recent = collections.deque()
+		self.StartTime = None
+		self.RateLow = False
+
+	#-----------------------------------------------------------------------------------
+	#
+	# Account for one packet at time t, returns a list of warnings
+	#
+	# A warning is (kind, address, start_stamp, end_stamp, message) where
+	# kind is 'starved' or 'rate'.  address is None for all non-decoder
+	# packets; they count toward the packet rate only.
+	#
+	#-----------------------------------------------------------------------------------
+	def Packet(self, t, address=None, stamp=None):
+		warnings = []
+		if self.StartTime is None:
+			self.StartTime = t
+
+		deadlines = self.Deadlines
+		while deadlines and deadlines[0][0] < t:
+			deadline, starved = heapq.heappop(deadlines)
+			seen, seen_stamp = self.LastSeen[starved]
+			if seen + self.Threshold != deadline or starved in self.Starved:
+				continue
+			self.Starved.add(starved)
+			warnings.append(('starved', starved, seen_stamp, stamp,
+				"%s not refreshed for %.1f ms" % (starved, (t - seen) * 1000.0)))
+
+		if address is not None:
+			self.LastSeen[address] = (t, stamp)
+			self.Starved.discard(address)
+			heapq.heappush(deadlines, (t + self.Threshold, address))
+
+		if self.Floor > 0:
+			recent = self.Recent
+			recent.append((t, stamp))
+			while recent[0][0] < t - self.Window:
+				recent.popleft()
+			rate = len(recent) / self.Window
+			if t - self.StartTime < self.Window:
+				pass
+			elif rate < self.Floor and not self.RateLow:
+				self.RateLow = True
+				warnings.append(('rate', None, recent[0][1], stamp,
+					"packet rate %.1f/s below %.1f/s" % (rate, self.Floor)))
+			elif rate >= self.Floor:
+				self.RateLow = False
+		return warnings
+
+	#-----------------------------------------------------------------------------------
+	#
+	# Addresses currently being refreshed
+	#
+	#-----------------------------------------------------------------------------------
+	def ActiveAddresses(self):
+		return [address for address in self.LastSeen if address not in self.Starved]
@@ -0,0 +1,329 @@
+#
+# Command station scheduler fairness
+#
+# Reconstructs how a command station schedules packets from a decoded
+# capture, so stations can be compared under the same load:
+#
+#	service intervals   time between two packets to the same locomotive
+#	                    address, and how many packets went out in between
+#	                    (n - 1 for a perfect round robin over n addresses)
+#	state changes       a speed or function packet that differs from the
+#	                    last one of its kind for the address.  "before" is
+#	                    the service interval that ended with the change (the
+#	                    longest the new command can have waited) and
+#	                    "repeat" the time until the address is served again
+#	                    (stations that favour new commands repeat them fast)
+#	fairness            Jain's index of the packet counts of the addresses
+#	                    served in each window, 1.0 when every address gets
+#	                    the same share, 1/n when one address gets them all
+#	idle packets        share of the rails, longest run, and idle packets
+#	                    sent while locomotives were active
+#
+# One streaming pass: per address the state is a few counters, the last
+# packet of each instruction kind and a fixed size log histogram, and the
+# percentiles come from the histograms, so memory depends on the number
+# of addresses only.
+#
+# Usage:
+#
+#	python SchedulerFairness.py stationA.csv [stationB.csv ...] [--window 1] [--active 0.5] [--cache DIR] [--json]
+#
+
+import bisect
+import sys
+
+import DCCFrames
+
+
+#
+# Log spaced histogram bin upper edges, 0.1 ms to ~30 s in 20% steps;
+# percentiles are reported as the upper edge of their bin
+#
+INTERVAL_EDGES = tuple(0.0001 * 1.2 ** i for i in range(70))
+
+FAIRNESS_BINS = 20
+
+MIX = ('locomotive', 'accessory', 'broadcast', 'idle', 'other')
+
+
+class IntervalHistogram:
+	__slots__ = ('Bins', 'Count', 'Sum', 'Max')
+
+	def __init__(self):
+		self.Bins = [0] * (len(INTERVAL_EDGES) + 1)
+		self.Count = 0
+		self.Sum = 0.0
+		self.Max = 0.0
+
+	def Add(self, value):
+		self.Bins[bisect.bisect_left(INTERVAL_EDGES, value)] += 1
+		self.Count += 1
+		self.Sum += value
+		if value > self.Max:
+			self.Max = value
+
+	#
+	# p50/p90/p99 as bin upper edges (never above the largest interval
+	# seen), mean and max, or {} when empty
+	#
+	def Percentiles(self):
+		if not self.Count:
+			return {}
+		result = { "mean": self.Sum / self.Count, "max": self.Max }
+		total = 0
+		bins = iter(enumerate(self.Bins))
+		for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+			target = fraction * self.Count
+			while total < target:
+				i, n = next(bins)
+				total += n
+			result[name] = min(INTERVAL_EDGES[i] if i < len(INTERVAL_EDGES) else self.Max, self.Max)
+		return result
+
+def jain(counts):
+	total = sum(counts)
+	squares = sum(n * n for n in counts)
+	return float(total * total) / (len(counts) * squares) if squares else 1.0
+
+#
+# Speed and function packets of one address replace each other by kind,
+# named as in LatencyCorrelator.instruction_kind.  Returns None for other
+# instructions.
+#
+def instruction_kind(packet):
+	first = int(packet[0:2], 16)
+	if 0 < first < 128:
+		i = 3
+	elif 192 <= first < 232:
+		i = 6
+	else:
+		return None
+	instruction = int(packet[i:i + 2], 16)
+	if instruction == 0x3F or 0x40 <= instruction < 0x80:
+		return 'speed'
+	if instruction < 0xA0:
+		return 'function0' if instruction >= 0x80 else None
+	if instruction < 0xB0:
+		return 'function2'
+	if instruction < 0xC0:
+		return 'function1'
+	if instruction == 0xDE:
+		return 'function3'
+	if instruction == 0xDF:
+		return 'function4'
+	return None
+
+class AddressState:
+	__slots__ = ('Packets', 'Last', 'LastSeq', 'Intervals', 'Between', 'Changes', 'ChangeTime', 'Kinds')
+
+	def __init__(self, pstime, seq):
+		self.Packets = 1
+		self.Last = pstime
+		self.LastSeq = seq
+		self.Intervals = IntervalHistogram()
+		self.Between = 0
+		self.Changes = 0
+		self.ChangeTime = None
+		self.Kinds = {}		# instruction kind -> last packet
+
+class SchedulerStats:
+	def __init__(self, window=1.0, active=0.5):
+		self.Window = window
+		self.Active = active
+
+		self.Packets = 0
+		self.Errors = 0
+		self.First = None
+		self.Last = None
+		self.Mix = dict.fromkeys(MIX, 0)
+		self.Addresses = {}
+
+		self.Intervals = IntervalHistogram()
+		self.ChangesBefore = IntervalHistogram()
+		self.ChangesRepeat = IntervalHistogram()
+
+		self.IdleRun = 0
+		self.IdleMaxRun = 0
+		self.IdleWhileActive = 0
+		self.LastLocomotive = None
+
+		self.WindowStart = None
+		self.WindowCounts = {}
+		self.Fairness = [0] * FAIRNESS_BINS
+		self.FairnessSum = 0.0
+		self.FairnessMin = None
+		self.Windows = 0
+
+	def Add(self, ptype, pstime, petime, presult):
+		if ptype != 'Packet':
+			self.Errors += 1
+			return
+		packet = presult.get('packet', '')
+		if self.First is None:
+			self.First = pstime
+			self.WindowStart = pstime
+		self.Last = petime
+		while pstime >= self.WindowStart + self.Window:
+			self.CloseWindow()
+		self.Packets += 1
+		seq = self.Packets
+
+		address = presult.get('address')
+		if packet.startswith('ff'):
+			kind = 'idle'
+		elif address and address[0] == 'A':
+			kind = 'accessory'
+		elif address:
+			kind = 'locomotive'
+		elif packet.startswith('00'):
+			kind = 'broadcast'
+		else:
+			kind = 'other'
+		self.Mix[kind] += 1
+
+		if kind == 'idle':
+			self.IdleRun += 1
+			if self.LastLocomotive is not None and pstime - self.LastLocomotive <= self.Active:
+				self.IdleWhileActive += 1
+			return
+		if self.IdleRun > self.IdleMaxRun:
+			self.IdleMaxRun = self.IdleRun
+		self.IdleRun = 0
+		if kind != 'locomotive':
+			return
+
+		self.LastLocomotive = pstime
+		self.WindowCounts[address] = self.WindowCounts.get(address, 0) + 1
+		state = self.Addresses.get(address)
+		if state is None:
+			state = self.Addresses[address] = AddressState(pstime, seq)
+			interval = None
+		else:
+			interval = pstime - state.Last
+			state.Packets += 1
+			state.Intervals.Add(interval)
+			self.Intervals.Add(interval)
+			state.Between += seq - state.LastSeq - 1
+			state.Last = pstime
+			state.LastSeq = seq
+			if state.ChangeTime is not None:
+				self.ChangesRepeat.Add(interval)
+				state.ChangeTime = None
+
+		instruction = instruction_kind(packet)
+		if instruction is not None:
+			last = state.Kinds.get(instruction)
+			if last is not None and last != packet:
+				state.Changes += 1
+				state.ChangeTime = pstime
+				self.ChangesBefore.Add(interval)
+			state.Kinds[instruction] = packet
+
+	def CloseWindow(self):
+		if len(self.WindowCounts) > 1:
+			index = jain(list(self.WindowCounts.values()))
+			self.Fairness[min(FAIRNESS_BINS - 1, int(index * FAIRNESS_BINS))] += 1
+			self.FairnessSum += index
+			self.Windows += 1
+			if self.FairnessMin is None or index < self.FairnessMin:
+				self.FairnessMin = index
+		self.WindowCounts = {}
+		self.WindowStart += self.Window
+
+	def Report(self):
+		if self.IdleRun > self.IdleMaxRun:
+			self.IdleMaxRun = self.IdleRun
+		duration = (self.Last - self.First) if self.First is not None else 0.0
+		packets = self.Packets or 1
+		addresses = {}
+		for address, state in sorted(self.Addresses.items()):
+			addresses[address] = {
+				"packets": state.Packets,
+				"share": float(state.Packets) / max(1, self.Mix['locomotive']),
+				"changes": state.Changes,
+				"interval": state.Intervals.Percentiles(),
+				"between": float(state.Between) / state.Intervals.Count if state.Intervals.Count else None,
+			}
+		return {
+			"packets": self.Packets,
+			"errors": self.Errors,
+			"duration": duration,
+			"packet_rate": self.Packets / duration if duration > 0 else 0.0,
+			"mix": dict((kind, float(count) / packets) for kind, count in self.Mix.items()),
+			"idle": { "share": float(self.Mix['idle']) / packets, "max_run": self.IdleMaxRun,
+				"while_active": float(self.IdleWhileActive) / packets },
+			"locomotives": len(self.Addresses),
+			"interval": self.Intervals.Percentiles(),
+			"changes": { "count": self.ChangesBefore.Count, "before": self.ChangesBefore.Percentiles(),
+				"repeat": self.ChangesRepeat.Percentiles() },
+			"fairness": { "overall": jain([state.Packets for state in self.Addresses.values()]) if self.Addresses else None,
+				"windows": self.Windows, "mean": self.FairnessSum / self.Windows if self.Windows else None,
+				"min": self.FairnessMin, "histogram": self.Fairness },
+			"addresses": addresses,
+		}
+
+def analyze(path, window=1.0, active=0.5, cache=None):
+	stats = SchedulerStats(window, active)
+	if cache:
+		from DecodeCache import DecodeCache
+		packets = DecodeCache(cache).Decode(path)
+	else:
+		packets = DCCFrames.decode_frames(DCCFrames.read_frames(path))
+	add = stats.Add
+	for result in packets:
+		add(*result)
+	return stats.Report()
+
+#
+# Side by side comparison, one column per capture
+#
+def print_comparison(names, reports, out=sys.stdout):
+	ms = lambda value: "-" if value is None else "%.2f" % (value * 1000.0)
+	number = lambda value, format: "-" if value is None else format % value
+	rows = [
+		("packets/s", lambda r: number(r["packet_rate"], "%.1f")),
+		("locomotives", lambda r: "%d" % r["locomotives"]),
+		("locomotive share", lambda r: "%.3f" % r["mix"]["locomotive"]),
+		("idle share", lambda r: "%.3f" % r["idle"]["share"]),
+		("idle while active", lambda r: "%.3f" % r["idle"]["while_active"]),
+		("longest idle run", lambda r: "%d" % r["idle"]["max_run"]),
+		("interval p50 ms", lambda r: ms(r["interval"].get("p50"))),
+		("interval p99 ms", lambda r: ms(r["interval"].get("p99"))),
+		("interval max ms", lambda r: ms(r["interval"].get("max"))),
+		("changes", lambda r: "%d" % r["changes"]["count"]),
+		("change wait p50 ms", lambda r: ms(r["changes"]["before"].get("p50"))),
+		("change wait p99 ms", lambda r: ms(r["changes"]["before"].get("p99"))),
+		("change repeat p50 ms", lambda r: ms(r["changes"]["repeat"].get("p50"))),
+		("change repeat p99 ms", lambda r: ms(r["changes"]["repeat"].get("p99"))),
+		("fairness overall", lambda r: number(r["fairness"]["overall"], "%.3f")),
+		("fairness window mean", lambda r: number(r["fairness"]["mean"], "%.3f")),
+		("fairness window min", lambda r: number(r["fairness"]["min"], "%.3f")),
+	]
+	width = max([12] + [len(name) for name in names])
+	out.write("%-22s" % "" + "".join(" %*s" % (width, name) for name in names) + "\n")
+	for label, value in rows:
+		out.write("%-22s" % label + "".join(" %*s" % (width, value(report)) for report in reports) + "\n")
+
+def main(argv=None):
+	import argparse
+	import json
+	import os
+	parser = argparse.ArgumentParser(description="Reconstruct and compare command station packet scheduling")
+	parser.add_argument('files', nargs='+', help="frame CSV files, one per command station")
+	parser.add_argument('--window', type=float, default=1.0, help="fairness window in seconds")
+	parser.add_argument('--active', type=float, default=0.5, help="seconds a locomotive counts as active after its last packet")
+	parser.add_argument('--cache', metavar='DIR', help="reuse decoded captures from the decode cache in DIR")
+	parser.add_argument('--json', action='store_true', help="print the reports as JSON")
+	args = parser.parse_args(argv)
+
+	names = [os.path.splitext(os.path.basename(path))[0] for path in args.files]
+	reports = [analyze(path, args.window, args.active, args.cache) for path in args.files]
+	if args.json:
+		json.dump(dict(zip(names, reports)), sys.stdout, indent=2)
+		sys.stdout.write("\n")
+	else:
+		print_comparison(names, reports)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
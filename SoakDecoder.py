@@ -0,0 +1,202 @@
+#
+# Bounded-memory soak decoding for multi-day captures
+#
+# Decodes a frame stream of any length while keeping only rolling
+# aggregates in memory:
+#
+#	- per time bucket: packet and error counts, per-address packet counts
+#	  and histograms of packet gaps and per-address refresh intervals;
+#	  every bucket is written out as one JSON line when it closes
+#	- for the whole run: per-address totals and error counts by kind
+#	- a ring buffer of the last packets; on every anomaly (a decode error
+#	  or a refresh gap) the packets before it and the ones that follow
+#	  are written out as one JSON line
+#
+# Memory depends on the ring size and the number of addresses, never on
+# the length of the capture.
+#
+# Usage:
+#
+#	python SoakDecoder.py frames.csv --out soak/ [--bucket 60] [--ring 32] [--after 8]
+#
+
+import collections
+import json
+import os
+import sys
+
+import DCCFrames
+from DCCPacket import DCCPacket
+from RefreshMonitor import RefreshMonitor
+
+
+#
+# Histogram bin upper edges in seconds, the last bin holds everything longer
+#
+HISTOGRAM_EDGES = (0.0005, 0.001, 0.002, 0.004, 0.008, 0.016, 0.032, 0.064, 0.128, 0.256, 0.512, 1.024)
+
+
+def histogram_bin(value):
+	for i, edge in enumerate(HISTOGRAM_EDGES):
+		if value < edge:
+			return i
+	return len(HISTOGRAM_EDGES)
+
+class SoakStats:
+	def __init__(self, bucket=60.0, ring=32, after=8, refresh_threshold=0.5, bucket_out=None, anomaly_out=None, max_anomalies=10000):
+		self.Bucket = bucket
+		self.After = after
+		self.MaxAnomalies = max_anomalies
+		self.BucketOut = bucket_out
+		self.AnomalyOut = anomaly_out
+
+		self.Ring = collections.deque(maxlen=ring)
+		self.Pending = []		# anomalies still collecting the packets that follow
+		self.Monitor = RefreshMonitor(threshold=refresh_threshold)
+		self.LastStart = None
+		self.LastSeen = {}
+
+		self.Packets = 0
+		self.Anomalies = 0
+		self.AddressTotals = collections.Counter()
+		self.ErrorTotals = collections.Counter()
+		self.FirstTime = None
+		self.LastTime = None
+		self.BucketStart = None
+		self.ResetBucket()
+
+	def ResetBucket(self):
+		self.BucketPackets = 0
+		self.BucketErrors = collections.Counter()
+		self.BucketAddresses = collections.Counter()
+		self.BucketGaps = [0] * (len(HISTOGRAM_EDGES) + 1)
+		self.BucketRefresh = [0] * (len(HISTOGRAM_EDGES) + 1)
+
+	def FlushBucket(self):
+		if self.BucketOut is not None and self.BucketStart is not None:
+			self.BucketOut.write(json.dumps({
+				"start": self.BucketStart,
+				"packets": self.BucketPackets,
+				"rate": self.BucketPackets / self.Bucket,
+				"errors": self.BucketErrors,
+				"addresses": self.BucketAddresses,
+				"gap_histogram": self.BucketGaps,
+				"refresh_histogram": self.BucketRefresh,
+			}) + "\n")
+		self.ResetBucket()
+
+	#
+	# Account for one decoded packet or error
+	#
+	def Add(self, ptype, pstime, petime, presult):
+		if self.FirstTime is None:
+			self.FirstTime = pstime
+			self.BucketStart = pstime
+		while pstime >= self.BucketStart + self.Bucket:
+			self.FlushBucket()
+			self.BucketStart += self.Bucket
+		self.LastTime = petime
+
+		self.Packets += 1
+		self.BucketPackets += 1
+		if self.LastStart is not None:
+			self.BucketGaps[histogram_bin(pstime - self.LastStart)] += 1
+		self.LastStart = pstime
+
+		address = presult.get('address')
+		if address:
+			self.AddressTotals[address] += 1
+			self.BucketAddresses[address] += 1
+			last = self.LastSeen.get(address)
+			if last is not None:
+				self.BucketRefresh[histogram_bin(pstime - last)] += 1
+			self.LastSeen[address] = pstime
+
+		entry = (ptype, pstime, presult.get('packet', ''), presult.get('data', ''))
+		for anomaly in self.Pending:
+			anomaly["after"].append(entry)
+		if self.Pending and len(self.Pending[0]["after"]) >= self.After:
+			self.WriteAnomalies(self.After)
+
+		error = presult.get('error')
+		if error:
+			self.ErrorTotals[error] += 1
+			self.BucketErrors[error] += 1
+			self.StartAnomaly(pstime, error)
+		if ptype == 'Packet':
+			monitored = address if address and address[0] != 'A' else None
+			for (kind, waddress, wstart, wend, message) in self.Monitor.Packet(pstime, monitored, pstime):
+				self.StartAnomaly(pstime, message)
+
+		self.Ring.append(entry)
+
+	#
+	# Only the first max_anomalies get their packets written out, a capture
+	# of a dead or noisy bus would otherwise fill the disk with context
+	#
+	def StartAnomaly(self, time, reason):
+		self.Anomalies += 1
+		if self.Anomalies > self.MaxAnomalies:
+			return
+		self.Pending.append({ "time": time, "reason": reason, "before": list(self.Ring), "after": [] })
+
+	#
+	# Write out the pending anomalies that have at least count packets after them
+	#
+	def WriteAnomalies(self, count=0):
+		while self.Pending and len(self.Pending[0]["after"]) >= count:
+			anomaly = self.Pending.pop(0)
+			if self.AnomalyOut is not None:
+				self.AnomalyOut.write(json.dumps(anomaly) + "\n")
+
+	def Finish(self):
+		self.FlushBucket()
+		self.WriteAnomalies()
+		return {
+			"start": self.FirstTime,
+			"end": self.LastTime,
+			"packets": self.Packets,
+			"anomalies": self.Anomalies,
+			"errors": self.ErrorTotals,
+			"addresses": self.AddressTotals,
+			"histogram_edges": HISTOGRAM_EDGES,
+		}
+
+#
+# Decode a frame stream in soak mode, writing buckets.jsonl,
+# anomalies.jsonl and summary.json to out_dir
+#
+def soak(frames, out_dir, bucket=60.0, ring=32, after=8, refresh_threshold=0.5, max_anomalies=10000):
+	os.makedirs(out_dir, exist_ok=True)
+	packet = DCCPacket()
+	with open(os.path.join(out_dir, 'buckets.jsonl'), 'w') as bucket_out, open(os.path.join(out_dir, 'anomalies.jsonl'), 'w') as anomaly_out:
+		stats = SoakStats(bucket, ring, after, refresh_threshold, bucket_out, anomaly_out, max_anomalies)
+		add = stats.Add
+		for result in DCCFrames.decode_frames(frames, packet):
+			add(*result)
+		summary = stats.Finish()
+	summary["decoder_errors"] = packet.ErrorSummary()
+	with open(os.path.join(out_dir, 'summary.json'), 'w') as f:
+		json.dump(summary, f, indent=2)
+	return summary
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Decode a long capture with bounded memory")
+	parser.add_argument('frames', help="frame CSV file")
+	parser.add_argument('--out', required=True, help="output directory")
+	parser.add_argument('--bucket', type=float, default=60.0, help="aggregation bucket length in seconds")
+	parser.add_argument('--ring', type=int, default=32, help="packets kept before each anomaly")
+	parser.add_argument('--after', type=int, default=8, help="packets kept after each anomaly")
+	parser.add_argument('--refresh', type=float, default=0.5, help="refresh gap in seconds reported as an anomaly")
+	parser.add_argument('--max-anomalies', type=int, default=10000, help="anomalies written out with their packets")
+	args = parser.parse_args(argv)
+
+	summary = soak(DCCFrames.read_frames(args.frames), args.out, args.bucket, args.ring, args.after, args.refresh, args.max_anomalies)
+	print("%d packets, %d anomalies" % (summary["packets"], summary["anomalies"]))
+	for name, count in sorted(summary["decoder_errors"].items()):
+		print("    %8d  %s" % (count, name))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
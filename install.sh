@@ -1,6 +1,6 @@
 #!/bin/bash
 
-script="DCSControl.py";
+scripts="DCSControl.py DCCSpeed.py";
 jmri="/Applications/JMRI";
 dest="${jmri}/jython";
 
@@ -10,6 +10,6 @@ if [[ -L "${jmri}" && -d "${jmri}" ]]; then
     echo "Version is ${link}";
 fi;
 
-echo "copying ${script} to ${dest}";
-cp ${script} ${dest}
+echo "copying ${scripts} to ${dest}";
+cp ${scripts} ${dest}
 
@@ -0,0 +1,8 @@
+#
+# The tools are top-level modules next to this directory
+#
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
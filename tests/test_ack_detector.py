@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import AckDetector
+import DCCFrames
+
+
+def packet(values):
+	return " ".join("%02x" % byte for byte in DCCFrames.with_checksum(values))
+
+def stream(packets, start=0.0, spacing=0.01):
+	return [('Packet', start + i * spacing, start + i * spacing + 0.005, { 'packet': p }) for i, p in enumerate(packets)]
+
+def test_service_instruction():
+	verify = AckDetector.service_instruction(DCCFrames.with_checksum([0x74, 0x00, 0x05]))
+	assert verify == ('direct', 'verify byte', None, 1, 5, None)
+	write_bit = AckDetector.service_instruction(DCCFrames.with_checksum([0x7A, 0x1C, 0xFB]))
+	assert write_bit == ('direct', 'write bit', None, 541, 1, 3)
+	register = AckDetector.service_instruction(DCCFrames.with_checksum([0x7D, 0x03]))
+	assert register == ('register', 'write byte', 6, None, 3, None)
+	assert AckDetector.service_instruction(DCCFrames.with_checksum([0x03, 0x60])) is None
+
+def test_service_operations():
+	reset = AckDetector.RESET_PACKET
+	verify = packet([0x74, 0x00, 0x05])
+	page = packet([0x7D, 0x02])
+	paged = packet([0x71, 0x09])
+	packets = stream([reset, reset, verify, verify, verify, reset, page, reset, paged, paged, packet([0x03, 0x60])])
+	operations = list(AckDetector.service_operations(packets, window=0.05))
+	assert [(op['mode'], op['operation'], op['cv'], op['value'], op['packets']) for op in operations] == [
+		('direct', 'verify byte', 1, 5, 3), ('register', 'write byte', None, 2, 1), ('paged', 'verify byte', 6, 9, 2)]
+	assert operations[0]['close'] == operations[1]['start_time']
+	assert operations[-1]['close'] == pytest.approx(operations[-1]['end_time'] + 0.05)
+
+def test_detect_pulses_across_chunks():
+	rate = 100000
+	samples = np.full(rate, 20.0, dtype=np.float32)
+	samples[::2] += 5.0
+	for start in (0.1, 0.5):
+		samples[int(start * rate):int((start + 0.006) * rate)] += 80.0
+	pulses = list(AckDetector.detect_pulses(samples, rate, threshold=60.0, chunk=4096))
+	assert len(pulses) == 2
+	for (rise, fall, peak), start in zip(pulses, (0.1, 0.5)):
+		assert rise == pytest.approx(start, abs=0.0005)
+		assert fall - rise == pytest.approx(0.006, abs=0.0005)
+		assert peak == pytest.approx(80.0, abs=3.0)
+
+def test_match_acks():
+	operations = [
+		{ 'start_time': 0.0, 'end_time': 0.03, 'close': 0.08, 'mode': 'direct', 'operation': 'verify byte', 'cv': 1, 'value': 5 },
+		{ 'start_time': 0.1, 'end_time': 0.13, 'close': 0.18, 'mode': 'direct', 'operation': 'write byte', 'cv': 1, 'value': 6 },
+		{ 'start_time': 0.2, 'end_time': 0.23, 'close': 0.28, 'mode': 'direct', 'operation': 'verify byte', 'cv': 1, 'value': 6 },
+	]
+	pulses = [(0.01, 0.016, 80.0), (0.15, 0.152, 80.0), (0.21, 0.2161, 75.0), (0.5, 0.506, 70.0)]
+	records, counts = AckDetector.match_acks(operations, pulses)
+	assert [record['outcome'] for record in records] == ['match', 'no ack', 'match']
+	assert counts == { 'ack': 2, 'long': 0, 'short': 1, 'stray': 1 }
+	assert records[0]['ack_delay_ms'] == pytest.approx(10.0)
+	assert AckDetector.verified_values(records) == { 1: 6 }
@@ -0,0 +1,36 @@
+import os
+
+import DCCArchive
+import DCCFrames
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'corpus')
+
+def decoded(name):
+	return list(DCCFrames.decode_frames(DCCFrames.read_frames(os.path.join(CORPUS, name + '.frames.csv'))))
+
+def pack(tmp_path, name, chunk=4):
+	out = str(tmp_path / (name + DCCArchive.SUFFIX))
+	DCCArchive.pack(os.path.join(CORPUS, name + '.frames.csv'), out, chunk)
+	return out
+
+def test_round_trip(tmp_path):
+	packets = decoded('instructions_long')
+	with DCCArchive.ArchiveReader(pack(tmp_path, 'instructions_long', 64)) as reader:
+		assert len(reader) == len(packets)
+		for (ptype, pstime, petime, presult), stored in zip(packets, reader):
+			assert stored[0] == ptype
+			assert abs(stored[1] - pstime) < 1e-9
+			assert abs(stored[2] - petime) < 1e-9
+			assert stored[3] == presult
+
+def test_window_bounds_in_ticks(tmp_path):
+	packets = decoded('addresses')
+	with DCCArchive.ArchiveReader(pack(tmp_path, 'addresses')) as reader:
+		assert [p[1] for p in reader.Window(0.1501680000000002)][:1] == [0.150168]
+		for i in range(len(packets)):
+			for j in range(i, len(packets)):
+				window = list(reader.Window(packets[i][1], packets[j][1]))
+				assert len(window) == j - i
+		assert len(list(reader.Window(packets[3][1]))) == len(packets) - 3
+		assert len(list(reader.Window(None, packets[5][1]))) == 5
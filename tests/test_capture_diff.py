@@ -0,0 +1,41 @@
+import CaptureDiff
+
+
+X = "03 3f 10 2c"
+Y = "03 3f 20 1c"
+Z = "03 3f 30 0c"
+
+def write_packets(path, packets, step=0.01):
+	with open(path, 'w') as f:
+		f.write("type,start_time,end_time,data,address,packet,error\n")
+		for i, packet in enumerate(packets):
+			f.write("Packet,%f,%f,,3,%s,\n" % (i * step, i * step + 0.005, packet))
+	return str(path)
+
+def test_identical(tmp_path):
+	a = write_packets(tmp_path / "a.csv", [X, X, Y, Y, Z])
+	b = write_packets(tmp_path / "b.csv", [X, X, Y, Y, Z])
+	totals = CaptureDiff.diff(a, b)["totals"]
+	assert totals["packets_a"] == totals["packets_b"] == 5
+	assert totals["changes_matched"] == 3
+	assert totals["missing"] == totals["extra"] == totals["reordered"] == 0
+
+def test_folded_repeats_counted_once(tmp_path):
+	a = write_packets(tmp_path / "a.csv", [X, X, Y, X, X, Z])
+	b = write_packets(tmp_path / "b.csv", [X, X, X, X, Z])
+	totals = CaptureDiff.diff(a, b)["totals"]
+	assert (totals["packets_a"], totals["packets_b"]) == (6, 5)
+	assert totals["missing"] == 1
+	assert totals["repeat_delta"] == 0
+	totals = CaptureDiff.diff(b, a)["totals"]
+	assert (totals["packets_a"], totals["packets_b"]) == (5, 6)
+	assert totals["extra"] == 1
+
+def test_missing_and_extra(tmp_path):
+	a = write_packets(tmp_path / "a.csv", [X, Y, Z])
+	b = write_packets(tmp_path / "b.csv", [X, Z])
+	totals = CaptureDiff.diff(a, b)["totals"]
+	assert totals["missing"] == 1
+	assert totals["extra"] == 0
+	assert totals["packets_a"] == 3
+	assert totals["packets_b"] == 2
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import ConformanceReport
+import DCCFrames
+
+
+SYNC = [0xE7, 0x0F, 0x3F, 0xD6]
+SPEED = [0x03, 0x3F, 0xC0]
+F0 = [0x03, 0x90]
+
+def text(values):
+	return " ".join("%02x" % byte for byte in DCCFrames.with_checksum(values))
+
+def write_log(logs, name, records):
+	with open(ConformanceReport.log_path(str(logs), name), 'w') as f:
+		f.write("time,system,address,long,command,value,packet\n")
+		for (t, command, value, packet) in records:
+			f.write("%.6f,L,3,0,%s,%s,%s\n" % (t, command, value, packet))
+
+#
+# Two runs of the given packets, each starting with the sync marker
+# refreshed a few times
+#
+def write_capture(path, runs):
+	frames = []
+	for start, packets in runs:
+		t = start
+		for values in [SYNC] * 3 + packets:
+			packet_frames, end = DCCFrames.packet_frames(DCCFrames.with_checksum(values), t)
+			frames.extend(packet_frames)
+			t += 0.01
+	DCCFrames.write_frames(str(path), frames)
+	return str(path)
+
+def test_report(tmp_path):
+	log = [(0.0, 'sync', '0.67', text(SYNC)), (0.015, 'speed', '0.5', text(SPEED)), (0.025, 'function', 'F0=1', text(F0))]
+	write_log(tmp_path, "Standard A", log)
+	write_log(tmp_path, "Standard B", log)
+	frames = write_capture(tmp_path / "frames.csv", [(0.0, [SPEED, F0]), (2.0, [SPEED])])
+	out = str(tmp_path / "report")
+	report = ConformanceReport.build_report(frames, str(tmp_path), out, ["Standard A", "Standard B"],
+		names=["Standard A", "Standard B", "Standard C"])
+	assert report["runs"] == ["Standard A", "Standard B"]
+	assert report["notes"] == []
+	a, b, c = report["tests"]
+	assert a["packets"] == 5 and b["packets"] == 4
+	assert a["latency"]["speed"]["count"] == 1
+	assert a["latency"]["speed"]["max"] == pytest.approx(0.015, abs=0.001)
+	assert a["latency"]["function"]["missing"] == 0
+	assert b["latency"]["function"]["missing"] == 1
+	assert c == { "name": "Standard C", "ran": False }
+	with open(out + '.json') as f:
+		assert json.load(f)["runs"] == report["runs"]
+	with open(out + '.html') as f:
+		page = f.read()
+	assert page.count("Standard C") == 1
+
+def test_missing_sync_markers(tmp_path):
+	log = [(0.0, 'sync', '0.67', text(SYNC)), (0.015, 'speed', '0.5', text(SPEED))]
+	write_log(tmp_path, "Standard A", log)
+	write_log(tmp_path, "Standard B", log)
+	frames = write_capture(tmp_path / "frames.csv", [(0.0, [SPEED])])
+	report = ConformanceReport.build_report(frames, str(tmp_path), str(tmp_path / "report"), ["Standard A", "Standard B"],
+		names=["Standard A", "Standard B"])
+	assert report["runs"] == ["Standard A"]
+	assert report["notes"] == ["2 command logs but only 1 sync markers in the capture"]
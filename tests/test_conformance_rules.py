@@ -0,0 +1,38 @@
+import os
+
+from ConformanceRules import ConformanceRules, RULES, check_file
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'corpus')
+
+def packet(address, preamble=14):
+	return { 'address': address, 'preamble': preamble, 'packet': '' }
+
+def test_rules():
+	rules = ConformanceRules()
+	assert rules.Packet('Packet', 0.000, 0.005, packet('3(S)')) == []
+	assert [v[0] for v in rules.Packet('Packet', 0.008, 0.013, packet('3(S)', 12))] == ['preamble', 'spacing']
+	assert rules.Packet('Packet', 0.015, 0.020, packet('4(S)')) == []
+	assert [v[0] for v in rules.Packet('Packet', 0.060, 0.065, packet('4(S)'))] == ['gap']
+	assert [v[0] for v in rules.Packet('Packet', 0.080, 0.085, packet('5(S)'))] == []
+	assert [v[0] for v in rules.Packet('Packet', 0.600, 0.605, packet('3(S)'))] == ['gap', 'refresh']
+	assert rules.Counts == { 'preamble': 1, 'spacing': 1, 'gap': 2, 'refresh': 1 }
+
+def test_violation_stamps():
+	rules = ConformanceRules()
+	rules.Packet('Packet', 0.000, 0.005, packet('3(S)'), 'a0', 'a1')
+	(rule, address, start, end, message), = rules.Packet('Packet', 0.007, 0.012, packet('3(S)'), 'b0', 'b1')
+	assert (rule, address, start, end) == ('spacing', '3(S)', 'a1', 'b0')
+	assert message == "3(S) repeated after 2.00 ms, minimum 5.0 ms"
+
+def test_errors_only_count_for_gaps():
+	rules = ConformanceRules()
+	rules.Packet('Packet', 0.000, 0.005, packet('3(S)'))
+	assert [v[0] for v in rules.Packet('Error', 0.040, 0.045, { 'error': 'truncated packet' })] == ['gap']
+	assert rules.Packet('Packet', 0.050, 0.055, packet('3(S)')) == []
+
+def test_check_file():
+	counts, examples = check_file(os.path.join(CORPUS, 'packet_errors.frames.csv'), details=1)
+	assert set(counts) == set(RULES)
+	assert counts['preamble'] >= 1
+	assert len([v for v in examples if v[0] == 'preamble']) == 1
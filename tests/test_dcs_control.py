@@ -0,0 +1,333 @@
+#
+# DCSControl.py catalog tests run headless against MockJMRI
+#
+
+import contextlib
+import csv
+import io
+import os
+import threading
+import time
+
+import pytest
+
+import MockJMRI
+
+MockJMRI.install(autostart=False)
+with contextlib.redirect_stdout(io.StringIO()):
+	import DCSControl
+import DCCSpeed
+
+
+SYNC = MockJMRI.DccLocoAddress(9999, True)
+
+@pytest.fixture
+def dcs(tmp_path):
+	manager = MockJMRI.throttleManager()
+	automaton = DCSControl.a
+	if not hasattr(automaton, 'nmraTests'):
+		with contextlib.redirect_stdout(io.StringIO()):
+			automaton.init()
+	tests = automaton.nmraTests
+	tests.outputPath = str(tmp_path)
+	tests.jmri_sync_hold_ms = 20
+	tests.throttlePool.releaseAll()
+	manager.reset()
+	automaton.testNext = automaton.testPrev = automaton.testDone = automaton.testExit = False
+	return automaton
+
+def run(dcs, name, presses=(), dwell=None):
+	tests = dcs.nmraTests
+	name = "Standard " + name
+	sweep = tests.test[name][1].get('jmri_sweep')
+	if sweep is not None and dwell is not None:
+		sweep.dwell = dwell
+	clicker = threading.Thread(target=press, args=(dcs, presses))
+	clicker.start()
+	tests.runTest(name, dcs)
+	clicker.join()
+	return sweep
+
+#
+# Click the buttons in order, each once the test has taken the last click
+#
+def press(dcs, presses):
+	for button in presses:
+		while dcs.testNext or dcs.testPrev or dcs.testDone or dcs.testExit:
+			time.sleep(0.001)
+		time.sleep(0.005)
+		setattr(dcs, button, True)
+
+def commands(address=None):
+	return [(method, value) for (stamp, throttle, method, value) in MockJMRI.throttleManager().commands
+		if throttle != SYNC and (address is None or throttle == address)]
+
+def logged(dcs, command=None):
+	return [(address, isLong, kind, value, packet) for (stamp, address, isLong, kind, value, packet) in dcs.nmraTests.commandLog.records
+		if address != 9999 and (command is None or kind == command)]
+
+def test_catalog(dcs):
+	names = dcs.nmraTests.getTestList()
+	assert "Standard S-9.1-cab3_full_stop" in names
+	assert "Standard S-9.2-sweep_speed_steps" in names
+	assert all(name.startswith("Standard ") for name in names)
+
+def test_sync_marker(dcs):
+	run(dcs, "S-9.1-cab3_full_stop")
+	sync = [(stamp, method, value) for (stamp, throttle, method, value) in MockJMRI.throttleManager().commands if throttle == SYNC]
+	assert [(method, value) for (stamp, method, value) in sync] == [("setSpeedStepMode", "128"), ("setIsForward", True),
+		("setSpeedSetting", DCCSpeed.speed_setting(128, 85)), ("setSpeedSetting", 0.0)]
+	assert sync[3][0] - sync[2][0] >= 0.02
+	records = dcs.nmraTests.commandLog.records
+	assert [(kind, packet) for (stamp, address, isLong, kind, value, packet) in records[:4]] == [("mode", ""),
+		("direction", "e7 0f 3f 80 57"), ("sync", "e7 0f 3f d6 01"), ("speed", "e7 0f 3f 80 57")]
+
+@pytest.mark.parametrize("name, address, mode, forward, step, packet", [
+	("S-9.1-cab3_full_stop", MockJMRI.DccLocoAddress(3, False), 28, True, 0, "03 60 63"),
+	("S-9.1-cab0_full_speed", MockJMRI.DccLocoAddress(0, False), 28, True, 28, "00 7f 7f"),
+	("S-9.2-A.1-short", MockJMRI.DccLocoAddress(122, False), 28, True, 1, "7a 62 18"),
+	("S-9.2-A.1-long", MockJMRI.DccLocoAddress(122, True), 28, True, 1, "c0 7a 62 d8"),
+	("S-9.2-A.2-14step", MockJMRI.DccLocoAddress(3, False), 14, False, 12, "03 4d 4e"),
+	("S-9.2-A.2-28step", MockJMRI.DccLocoAddress(3, False), 28, False, 12, "03 57 54"),
+])
+def test_single_point(dcs, name, address, mode, forward, step, packet):
+	sweep = run(dcs, name)
+	assert commands() == [("setSpeedStepMode", str(mode)), ("setIsForward", forward),
+		("setSpeedSetting", DCCSpeed.speed_setting(mode, step))]
+	assert [result[-1] for result in sweep.results] == ["sent"]
+	assert logged(dcs, "speed")[-1][-1] == packet
+
+def test_sweep_short_addresses(dcs):
+	sweep = run(dcs, "S-9.2-sweep_short_addresses", dwell=0.001)
+	assert len(sweep.results) == sweep.count() == 40
+	assert all(result[-1] == "sent" for result in sweep.results)
+	for number in (1, 3, 63, 100, 127):
+		address = MockJMRI.DccLocoAddress(number, False)
+		speeds = [value for (method, value) in commands(address) if method == "setSpeedSetting"]
+		steps = [DCCSpeed.speed_setting(28, step) for step in (0, 1, 14, 28)]
+		assert speeds == steps + steps + [0.0]
+		assert [value for (method, value) in commands(address) if method == "setIsForward"] == [True, False]
+
+def test_speed28_steps(dcs):
+	run(dcs, "S-9.2-cab3_28steps_forward", ["testNext"] * 28 + ["testPrev", "testDone"])
+	speeds = [value for (method, value) in commands() if method == "setSpeedSetting"]
+	table = DCCSpeed.SETTINGS[28]
+	assert speeds[:30] == [table[step] for step in range(29)] + [table[27]]
+	packets = [packet for (address, isLong, kind, value, packet) in logged(dcs, "speed")]
+	assert packets[:3] == ["03 60 63", "03 62 61", "03 72 71"]
+
+def test_documented_addresses(dcs):
+	run(dcs, "S-9.2-B.1", ["testDone", "testNext", "testNext", "testDone"])
+	addresses = []
+	for (stamp, throttle, method, value) in MockJMRI.throttleManager().commands:
+		if throttle != SYNC and throttle not in addresses:
+			addresses.append(throttle)
+	assert [address.getNumber() for address in addresses] == [1, 63, 127]
+
+#
+# The throttle pool keeps throttles (and their functions) between tests,
+# so the command log must too
+#
+def test_command_log_state_across_tests():
+	log = DCSControl.DCSCommandLog()
+	log.log(3, False, "function", "F1=1")
+	log.clear()
+	assert log.records == []
+	log.log(3, False, "function", "F2=1")
+	assert log.records[0][-1] == "03 83 80"
+
+#
+# A manager that answers throttle requests late, as LocoNet or XpressNet
+# can when the command station is busy
+#
+class LateThrottleManager(MockJMRI.FakeThrottleManager):
+	def requestThrottle(self, address, listener, *args):
+		self.answer = threading.Timer(0.05, MockJMRI.FakeThrottleManager.requestThrottle, (self, address, listener))
+		self.answer.start()
+		return True
+
+def test_campaign_throttle_timeout(tmp_path):
+	manager = LateThrottleManager("X")
+	station = DCSControl.DCSCampaignStation(manager, str(tmp_path), timeout=0.01)
+	assert station.getThrottle(3, False) is None
+	assert [address for (address, listener) in manager.cancelled] == [MockJMRI.DccLocoAddress(3, False)]
+	manager.answer.join()
+	assert manager.activeCount() == 0
+	assert [method for (stamp, address, method, value) in manager.commands] == ["release"]
+
+def test_campaign(tmp_path, monkeypatch):
+	name = "Standard S-9.2-sweep_short_addresses"
+	monkeypatch.setattr(MockJMRI.InstanceManager, "managers", list(MockJMRI.InstanceManager.managers))
+	monkeypatch.setattr(MockJMRI.FileUtil, "userFilesPath", str(tmp_path))
+	MockJMRI.install(systemPrefixes=("L", "X", "N"), autostart=False)
+	for delay, prefix in zip((0.0, 0.002, 0.005), ("L", "X", "N")):
+		MockJMRI.throttleManager(prefix).acquireDelay = delay
+	campaign = DCSControl.DCSCampaign("bench", [name], lead=0.05, settle=0.05)
+	for station in campaign.stations:
+		station.tests.jmri_sync_hold_ms = 20
+		station.tests.test[name][1]["jmri_sweep"].dwell = 0.001
+	campaign.run()
+
+	with open(str(tmp_path / "DCSCampaign-bench" / "timeline.csv")) as f:
+		rows = list(csv.DictReader(f))
+	assert [row["system"] for row in rows] == ["L", "X", "N"]
+	assert len(set(row["start"] for row in rows)) == 1
+	assert all((row["points"], row["sent"], row["result"]) == ("40", "40", "done") for row in rows)
+	for prefix in ("L", "X", "N"):
+		files = sorted(os.listdir(str(tmp_path / "DCSCampaign-bench" / prefix)))
+		assert files == ["DCSCommandLog-%s.csv" % name.replace(" ", "_"), "DCSSweep-%s.csv" % name.replace(" ", "_")]
+		manager = MockJMRI.throttleManager(prefix)
+		assert manager.activeCount() == 0
+		assert len([command for command in manager.commands if command[2] == "setSpeedSetting"]) > 40
+
+def test_campaign_without_managers():
+	with pytest.raises(ValueError, match="no throttle managers"):
+		DCSControl.DCSCampaign("bench", ["Standard S-9.2-sweep_short_addresses"], managers=[])
+
+def test_scenario(dcs):
+	unit = 1.0 / 64
+	scenario = DCSControl.DCSScenario("bench")
+	scenario.add(0.0, 3, False, "mode", 28).add(0.0, 3, False, "direction", True)
+	scenario.ramp(unit, 3, False, 0, 3, unit)
+	scenario.toggle(0.0, 4, False, 1, 2 * unit, 2)
+	scenario.burst(5 * unit, 3, False, 10, 2 * unit, 1)
+	assert scenario.duration() == 6 * unit
+	assert scenario.addresses() == [(3, False), (4, False)]
+	MockJMRI.throttleManager().reset()
+
+	assert scenario.run(dcs.nmraTests, dcs, loops=2, period=8 * unit)
+	timeline = [(0, 3, "mode", 28), (0, 3, "direction", True), (0, 4, "function", (1, True)),
+		(1, 3, "speed", 0), (1, 4, "function", (1, False)), (2, 3, "speed", 1), (2, 4, "function", (1, True)),
+		(3, 3, "speed", 2), (3, 4, "function", (1, False)), (4, 3, "speed", 3), (5, 3, "speed", 10), (6, 3, "speed", 0)]
+	expected = [(loop, int((loop * 8 + step) * unit * 1000000000), address, command, value)
+		for loop in range(2) for (step, address, command, value) in timeline]
+	assert [(loop, planned, address, command, value) for (loop, planned, actual, address, isLong, command, value) in scenario.records] == expected
+	assert all(actual >= planned for (loop, planned, actual, address, isLong, command, value) in scenario.records)
+	assert scenario.getStats()["actions"] == 24
+
+	speeds = [value for (method, value) in commands(MockJMRI.DccLocoAddress(3, False)) if method == "setSpeedSetting"]
+	assert speeds[-12:] == [DCCSpeed.speed_setting(28, step) for step in (0, 1, 2, 3, 10, 0)] * 2
+	functions = [value for (method, value) in commands(MockJMRI.DccLocoAddress(4, False)) if method == "setFunction"]
+	assert functions[-8:] == [(1, True), (1, False)] * 4
+	assert [kind for (address, isLong, kind, value, packet) in logged(dcs) if address == 4][-8:] == ["function"] * 8
+
+#
+# Start the load test once the values are shown, then stop it when count
+# commands are in the command log
+#
+def stop_load(dcs, first, last, rate, count):
+	while (dcs.testValue1.text, dcs.testValue2.text, dcs.testValue3.text) != (str(first), str(last), str(rate)):
+		time.sleep(0.001)
+	dcs.testDone = True
+	while len(dcs.nmraTests.commandLog.records) < count:
+		time.sleep(0.001)
+	dcs.testDone = True
+
+def test_load(dcs, monkeypatch):
+	name = "Standard S-9.2-load_short"
+	tests = dcs.nmraTests
+	monkeypatch.setitem(tests.test[name][1], "jmri_load_last_address", 12)
+	monkeypatch.setattr(tests, "jmri_load_rate", 1000)
+	slots = tests.throttlePool.maxSlots
+	clicker = threading.Thread(target=stop_load, args=(dcs, 1, 12, 1000, 100))
+	clicker.start()
+	tests.runTest(name, dcs)
+	clicker.join()
+
+	sent = [record for record in logged(dcs) if record[2] in ("speed", "function")]
+	load, stops = sent[:-12], sent[-12:]
+	assert len(load) >= 60
+	script = tests.jmri_load_script
+	for i, (address, isLong, kind, value, packet) in enumerate(load):
+		assert address == i % 12 + 1
+		(command, setting) = script[(i // 12) % len(script)]
+		assert kind == command
+		if command == "speed":
+			assert value == DCCSpeed.speed_setting(28, setting)
+		else:
+			assert value == "F%d=%d" % setting
+	assert [(address, value) for (address, isLong, kind, value, packet) in stops] == [(address, 0.0) for address in range(1, 13)]
+
+	throttles = [throttle.getNumber() for (stamp, throttle, method, value) in MockJMRI.throttleManager().commands
+		if throttle != SYNC and method in ("setSpeedSetting", "setFunction")]
+	assert throttles[:len(load)] == [i % 12 + 1 for i in range(len(load))]
+	assert tests.throttlePool.maxSlots == slots
+	assert tests.throttlePool.getStats()["held"] == slots
+	assert MockJMRI.throttleManager().activeCount() == slots
+
+def test_load_stops_between_commands(dcs, monkeypatch):
+	name = "Standard S-9.2-load_short"
+	monkeypatch.setitem(dcs.nmraTests.test[name][1], "jmri_load_last_address", 2)
+	monkeypatch.setattr(dcs.nmraTests, "jmri_load_rate", 1)
+	clicker = threading.Thread(target=stop_load, args=(dcs, 1, 2, 1, 4 + 2 * 2 + 1))
+	clicker.start()
+	start = time.time()
+	dcs.nmraTests.runTest(name, dcs)
+	clicker.join()
+	#
+	# One command at 1 per second, then the stops: 'Done' does not wait
+	# out the period
+	#
+	assert time.time() - start < 0.5
+	assert len([record for record in logged(dcs) if record[2] in ("speed", "function")]) == 1 + 2
+
+#
+# Values actually set on a widget
+#
+def counted(widget, setter):
+	values = []
+	method = getattr(widget, setter)
+	def call(value):
+		values.append(value)
+		method(value)
+	setattr(widget, setter, call)
+	return values
+
+def test_panel_updates():
+	ui = DCSControl.DCSPanelUpdates(maxRate=20)
+	label = MockJMRI.JLabel()
+	button = MockJMRI.JButton()
+	texts = counted(label, "setText")
+	enables = counted(button, "setEnabled")
+	start = time.time()
+	for i in range(200):
+		ui.setText(label, "%d" % i)
+		if i % 50 == 0:
+			ui.setEnabled(button, i == 0)
+		time.sleep(0.001)
+	while ui.scheduled:
+		time.sleep(0.005)
+	elapsed = time.time() - start
+
+	assert label.getText() == "199"
+	assert texts[-1] == "199"
+	assert not button.isEnabled()
+	assert ui.posted == 204
+	assert ui.batches <= elapsed * 20 + 1
+	assert ui.applied == len(texts) + len(enables)
+	assert len(texts) <= ui.batches < 200
+	assert ui.pending == {}
+
+def test_throttle_pool():
+	manager = MockJMRI.FakeThrottleManager(maxSlots=3)
+	pool = DCSControl.ThrottlePool(maxSlots=3)
+	throttles = {}
+	for address in (1, 2, 3, 1, 4, 2, 4):
+		throttle = pool.getThrottle(manager, address, False)
+		assert throttle.getLocoAddress() == MockJMRI.DccLocoAddress(address, False)
+		assert not throttle.released
+		throttles.setdefault(address, []).append(throttle)
+		assert manager.activeCount() <= 3
+	#
+	# 1 was used again before 4 came, so 2 then 3 were the least recently used
+	#
+	assert throttles[1][0] is throttles[1][1]
+	assert throttles[2][0].released and throttles[2][0] is not throttles[2][1]
+	assert throttles[3][0].released
+	assert list(pool.throttles) == [(1, False), (2, False), (4, False)]
+	stats = pool.getStats()
+	assert (stats["acquired"], stats["reused"], stats["evicted"], stats["held"]) == (5, 2, 2, 3)
+
+	pool.releaseAll()
+	assert manager.activeCount() == 0
+	assert pool.getStats()["evicted"] == 5
@@ -0,0 +1,54 @@
+import os
+
+import DCCFrames
+from DecodeCache import DecodeCache
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'corpus')
+FRAMES = os.path.join(CORPUS, 'instructions_short.frames.csv')
+
+def decoded(packets):
+	return [(ptype, pstime, petime, dict(presult)) for ptype, pstime, petime, presult in packets]
+
+def test_round_trip(tmp_path):
+	expected = decoded(DCCFrames.decode_frames(DCCFrames.read_frames(FRAMES)))
+	cache = DecodeCache(str(tmp_path))
+	stored = cache.Decode(FRAMES)
+	assert (cache.Hits, cache.Misses) == (0, 1)
+	assert decoded(stored) == expected
+	loaded = cache.Decode(FRAMES)
+	assert (cache.Hits, cache.Misses) == (1, 1)
+	assert len(loaded) == len(expected)
+	assert decoded(loaded) == expected
+	loaded.Close()
+
+def test_key(tmp_path):
+	cache = DecodeCache(str(tmp_path / "cache"))
+	path = tmp_path / "frames.csv"
+	with open(FRAMES) as f:
+		path.write_text(f.read())
+	key = cache.Key(str(path))
+	assert cache.Key(str(path)) == key
+	assert cache.Key(str(path), { 'option': 1 }) != key
+	with open(str(path), 'a') as f:
+		f.write("\n")
+	assert cache.Key(str(path)) != key
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+	cache = DecodeCache(str(tmp_path))
+	key = cache.Key(FRAMES)
+	with open(cache.EntryPath(key), 'wb') as f:
+		f.write(b'not a cache entry')
+	assert cache.Load(key) is None
+	assert cache.Misses == 1
+
+def test_evict_least_recently_used(tmp_path):
+	cache = DecodeCache(str(tmp_path))
+	for n, name in enumerate(('a', 'b', 'c')):
+		with open(cache.EntryPath(name), 'wb') as f:
+			f.write(b'x' * 100)
+		os.utime(cache.EntryPath(name), (n, n))
+	assert cache.Evict(250) == 1
+	assert [name for used, size, name in cache.Entries()] == ['b.dcc', 'c.dcc']
+	assert cache.Evict(0) == 2
+	assert cache.Entries() == []
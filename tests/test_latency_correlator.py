@@ -0,0 +1,51 @@
+import pytest
+
+import LatencyCorrelator
+
+
+LOG = [
+	(0.000, 'sync', '0.67', 'e7 0f 3f d6 01'),
+	(0.100, 'speed', '0.5', '03 3f c0 fc'),
+	(0.200, 'function', 'F0=1', '03 90 93'),
+	(0.300, 'speed', '0.5', '03 3f c0 fc'),
+	(0.400, 'function', 'F5=1', '03 b1 b2'),
+]
+
+def write_run(tmp_path, captured):
+	log = tmp_path / "log.csv"
+	with open(log, 'w') as f:
+		f.write("time,system,address,long,command,value,packet\n")
+		for (t, command, value, packet) in LOG:
+			f.write("%.6f,L,3,0,%s,%s,%s\n" % (t, command, value, packet))
+	capture = tmp_path / "capture.csv"
+	with open(capture, 'w') as f:
+		f.write("type,start_time,end_time,data,address,packet,error\n")
+		for (t, packet) in sorted(captured):
+			f.write("Packet,%.6f,%.6f,,3(S),%s,\n" % (t, t + 0.005, packet.upper()))
+	return str(capture), str(log)
+
+def test_correlate(tmp_path):
+	capture, log = write_run(tmp_path, [(10.0, 'e7 0f 3f d6 01'), (10.02, 'e7 0f 3f d6 01'),
+		(10.104, '03 3f c0 fc'), (10.110, '03 3f c0 fc'), (10.212, '03 90 93')])
+	system, latencies, missing = LatencyCorrelator.correlate(LatencyCorrelator.read_capture(capture), LatencyCorrelator.read_log(log))
+	assert system == 'L'
+	assert latencies['speed'] == [pytest.approx(0.004)]
+	assert latencies['function'] == [pytest.approx(0.012)]
+	#
+	# The second speed command repeats the packet being refreshed and is
+	# skipped, F5 never reached the rails
+	#
+	assert missing == { 'function': 1 }
+
+def test_report(tmp_path):
+	run = write_run(tmp_path, [(5.0, 'e7 0f 3f d6 01'), (5.101, '03 3f c0 fc'), (5.203, '03 90 93'), (5.405, '03 b1 b2')])
+	result = LatencyCorrelator.report([run])
+	assert result['L']['speed']['count'] == 1
+	assert result['L']['function']['count'] == 2
+	assert result['L']['function']['max'] == pytest.approx(0.005)
+	assert result['L']['function']['missing'] == 0
+
+def test_missing_sync(tmp_path):
+	capture, log = write_run(tmp_path, [(1.0, '03 3f c0 fc')])
+	with pytest.raises(ValueError):
+		LatencyCorrelator.correlate(LatencyCorrelator.read_capture(capture), LatencyCorrelator.read_log(log))
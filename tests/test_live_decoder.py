@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import DCCFrames
+import LiveDecoder
+
+
+PACKETS = [[0x03, 0x60], [0x04, 0x60], [0xC3, 0xE8, 0x3F, 0xE5], [0xFF, 0x00]]
+
+def frame_lines(tmp_path):
+	frames = []
+	t = 0.0
+	for values in PACKETS:
+		packet_frames, t = DCCFrames.packet_frames(DCCFrames.with_checksum(values), t)
+		frames.extend(packet_frames)
+		t += 0.005
+	path = tmp_path / "source.csv"
+	DCCFrames.write_frames(str(path), frames)
+	with open(str(path), 'rb') as f:
+		return f.read()
+
+def expected():
+	return [" ".join("%02x" % byte for byte in DCCFrames.with_checksum(values)) for values in PACKETS]
+
+def test_parse_frame():
+	assert LiveDecoder.parse_frame(b'type,start_time,end_time,data') is None
+	assert LiveDecoder.parse_frame(b'bad,line') is None
+	frame = LiveDecoder.parse_frame(b'byte,0.001,0.002,0x3f\r')
+	assert (frame.type, frame.start_time, frame.end_time) == ('byte', 0.001, 0.002)
+
+def test_follow_growing_file(tmp_path):
+	data = frame_lines(tmp_path)
+	path = tmp_path / "frames.csv"
+	live = LiveDecoder.LiveDecoder(str(path), poll=0.001, max_poll=0.004, idle_exit=0.05)
+	packets = []
+	live.Subscribe(lambda ptype, pstime, petime, presult: packets.append(presult['packet']))
+
+	#
+	# Write the export in pieces that cut lines and packets in half
+	#
+	async def write():
+		with open(str(path), 'wb') as f:
+			for start in range(0, len(data), 37):
+				f.write(data[start:start + 37])
+				f.flush()
+				await asyncio.sleep(0.002)
+
+	async def session():
+		await asyncio.gather(live.Follow(), write())
+	asyncio.run(session())
+	assert packets == expected()
+	assert live.Packets == len(PACKETS)
+
+def test_follow_from_end(tmp_path):
+	data = frame_lines(tmp_path)
+	path = tmp_path / "frames.csv"
+	with open(str(path), 'wb') as f:
+		f.write(data[:len(data) // 2])
+	live = LiveDecoder.LiveDecoder(str(path), from_end=True, poll=0.001, max_poll=0.004, idle_exit=0.05)
+	asyncio.run(live.Follow())
+	assert live.Packets == 0
+
+def test_feed():
+	feed = LiveDecoder.LiveFeed(queue_size=2)
+	queue = asyncio.Queue(2)
+	feed.Clients.add(queue)
+	for n in range(3):
+		feed.Violation(('gap', '3(S)', n, n + 0.1, "gap %d" % n))
+	assert feed.Dropped == 1
+	lines = [json.loads(queue.get_nowait()) for n in range(2)]
+	assert [line['message'] for line in lines] == ["gap 1", "gap 2"]
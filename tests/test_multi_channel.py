@@ -0,0 +1,48 @@
+import csv
+
+import pytest
+
+import DCCFrames
+import MultiChannel
+
+
+def frames(packets, start, spacing=0.01):
+	result = []
+	for i, values in enumerate(packets):
+		packet_frames, end = DCCFrames.packet_frames(DCCFrames.with_checksum(values), start + i * spacing)
+		result.extend(packet_frames)
+	return result
+
+MAIN = [[0x03, 0x60], [0x04, 0x60], [0x05, 0x60]]
+BOOSTER = [[0x03, 0x60], [0x04, 0x60], [0x06, 0x60]]
+
+def test_merge_by_time():
+	decoders = []
+	merged = list(MultiChannel.merge_channels([frames(MAIN, 0.0), frames(BOOSTER, 0.0002)], decoders))
+	assert len(decoders) == 2
+	assert [channel for channel, ptype, pstime, petime, presult in merged] == [0, 1] * 3
+	starts = [pstime for channel, ptype, pstime, petime, presult in merged]
+	assert starts == sorted(starts)
+
+def test_sync():
+	sync = MultiChannel.SyncCheck(2, window=0.001)
+	for channel, ptype, pstime, petime, presult in MultiChannel.merge_channels([frames(MAIN, 0.0), frames(BOOSTER, 0.0002)]):
+		sync.Add(channel, ptype, pstime, presult)
+	report = sync.Report(['main', 'booster'])['booster']
+	assert (report['packets'], report['paired'], report['unpaired']) == (3, 2, 1)
+	assert sync.Skews[1] == [pytest.approx(0.0002), pytest.approx(0.0002)]
+
+def test_channel_name():
+	assert MultiChannel.channel_name('/captures/main.frames.csv') == 'main'
+	assert MultiChannel.channel_name('booster.csv') == 'booster'
+
+def test_main(tmp_path, capsys):
+	paths = [str(tmp_path / "main.frames.csv"), str(tmp_path / "booster.frames.csv")]
+	DCCFrames.write_frames(paths[0], frames(MAIN, 0.0))
+	DCCFrames.write_frames(paths[1], frames(BOOSTER, 0.0002))
+	out = str(tmp_path / "merged.csv")
+	assert MultiChannel.main(paths + ['--out', out, '--sync']) == 0
+	with open(out) as f:
+		rows = list(csv.DictReader(f))
+	assert [row['channel'] for row in rows] == ['main', 'booster'] * 3
+	assert '"paired": 2' in capsys.readouterr().out
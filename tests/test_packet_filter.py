@@ -0,0 +1,55 @@
+import pytest
+
+import DCCFrames
+from PacketFilter import FilterError, PacketFilter
+
+
+PACKETS = {
+	'fast': [0x03, 0x3F, 0xFF],
+	'stop': [0x03, 0x3F, 0x80],
+	'long': [0xC3, 0xE8, 0x3F, 0xE5],
+	'f0': [0x03, 0x90],
+	'reset': [0x00, 0x00, 0x00],
+	'idle': [0xFF, 0x00],
+	'step27': [0x03, 0x6F],
+}
+
+def decoded():
+	frames = []
+	t = 0.0
+	for values in PACKETS.values():
+		packet_frames, t = DCCFrames.packet_frames(DCCFrames.with_checksum(values), t)
+		frames.extend(packet_frames)
+		t += 0.005
+	return dict(zip(PACKETS, (presult for ptype, pstime, petime, presult in DCCFrames.decode_frames(frames))))
+
+@pytest.mark.parametrize("expression, names", [
+	("address 3", ['fast', 'stop', 'f0', 'step27']),
+	("address 3 and speed128 step > 100", ['fast']),
+	("speed128 step >= 100", ['fast', 'long']),
+	("long address", ['long']),
+	("stop", ['stop']),
+	("function 0 on", ['f0']),
+	("speed28 = 27", ['step27']),
+	("idle or broadcast", ['reset', 'idle']),
+	("not short address 3 and not idle", ['long', 'reset']),
+	('"Reset"', ['reset', 'idle']),
+])
+def test_match(expression, names):
+	packets = decoded()
+	packet_filter = PacketFilter(expression)
+	assert [name for name in PACKETS if packet_filter.Match(packets[name])] == names
+	#
+	# Again from the per packet cache
+	#
+	assert [name for name in PACKETS if packet_filter.Match(packets[name])] == names
+
+def test_errors():
+	packet_filter = PacketFilter("bad checksum")
+	assert packet_filter.Match({ 'packet': '03 60 00', 'error': 'bad error detection byte' })
+	assert not packet_filter.Match(decoded()['stop'])
+
+@pytest.mark.parametrize("expression", ["address >", "(address 3", "speed128 step > fast", "frobnicate"])
+def test_syntax_errors(expression):
+	with pytest.raises(FilterError):
+		PacketFilter(expression)
@@ -0,0 +1,94 @@
+import struct
+
+import numpy as np
+import pytest
+
+import DCCFrames
+import RailComCutout
+
+
+HALF_BIT = 58e-6
+
+#
+# Both rails of a capture of a few packets, each followed by a cutout of
+# the given (start delay, end) after its end bit, or none for None.
+# Returns (packets, times, rail A states, rail B states).
+#
+def capture(cutouts):
+	times = [0.0]
+	rail = [0]
+	packets = []
+	t = 0.0
+	for n, cutout in enumerate(cutouts):
+		values = DCCFrames.with_checksum([3 + n, 0x60])
+		frames, end = DCCFrames.packet_frames(values, t, bit_time=2 * HALF_BIT)
+		packets.extend(DCCFrames.decode_frames(frames))
+		while t < end - HALF_BIT / 2:
+			rail.append(rail[-1] ^ 1)
+			times.append(t)
+			t += HALF_BIT
+		t = end
+		rail.append(rail[-1] ^ 1)
+		times.append(t)
+		if cutout is None:
+			t += HALF_BIT
+			continue
+		delay, stop = cutout
+		times += [t + delay, t + stop]
+		rail += [None, 0]
+		t += stop
+	a = np.array([0 if state is None else state for state in rail], dtype=np.uint8)
+	b = np.array([0 if state is None else state ^ 1 for state in rail], dtype=np.uint8)
+	return packets, np.array(times), a, b
+
+def write_binary(path, times, states):
+	edges = times[1:][np.diff(states) != 0]
+	with open(path, 'wb') as f:
+		f.write(RailComCutout.SALEAE_MAGIC + struct.pack('<iiIddQ', 0, 0, int(states[0]), 0.0, float(times[-1]), len(edges)))
+		f.write(edges.astype('<f8').tobytes())
+	return str(path)
+
+def test_two_channel_timing():
+	packets, times, a, b = capture([(29e-6, 470e-6), (40e-6, 470e-6), None, (28e-6, 500e-6)])
+	rows, counts = RailComCutout.analyze(packets, times, np.column_stack((a, b)))
+	assert counts["packets"] == 4
+	assert counts["attached"] == 3
+	assert counts["without"] == 1
+	assert counts["results"] == { "ok": 1, "bad start": 1, "bad end": 1 }
+	assert [row[-1] for row in rows] == ["ok", "bad start", "", "bad end"]
+	assert float(rows[0][-4]) == pytest.approx(29.0, abs=0.01)
+	assert float(rows[0][-3]) == pytest.approx(470.0, abs=0.01)
+
+def test_binary_exports(tmp_path):
+	packets, times, a, b = capture([(29e-6, 470e-6)] * 5 + [None])
+	paths = [write_binary(tmp_path / "a.bin", times, a), write_binary(tmp_path / "b.bin", times, b)]
+	edges, states = RailComCutout.load_edges(paths)
+	assert states.shape[1] == 2
+	rows, counts = RailComCutout.analyze(packets, edges, states)
+	assert counts["results"] == { "ok": 5 }
+
+	edges, states = RailComCutout.load_edges(paths[:1])
+	assert states.shape[1] == 1
+	rows, counts = RailComCutout.analyze(packets, edges, states)
+	assert counts["attached"] == 5
+
+def test_csv_export(tmp_path):
+	packets, times, a, b = capture([(30e-6, 460e-6)] * 3)
+	path = tmp_path / "edges.csv"
+	with open(path, 'w') as f:
+		f.write("Time [s],Channel 0,Channel 1\n")
+		for row in zip(times, a, b):
+			f.write("%.9f,%d,%d\n" % row)
+	edges, states = RailComCutout.load_edges([str(path)])
+	rows, counts = RailComCutout.analyze(packets, edges, states)
+	assert counts["results"] == { "ok": 3 }
+
+def test_attach_first_cutout_only():
+	ends = np.array([1.0, 2.0])
+	starts = np.array([0.5, 1.00003, 1.00005, 2.5])
+	assert RailComCutout.attach_cutouts(ends, starts).tolist() == [-1, 0, -1, -1]
+
+def test_cutout_result():
+	assert RailComCutout.cutout_result(29e-6, 470e-6) == "ok"
+	assert RailComCutout.cutout_result(0.0, 470e-6) == "bad start not seen"
+	assert RailComCutout.cutout_result(20e-6, 500e-6) == "bad start and end"
@@ -0,0 +1,32 @@
+from RefreshMonitor import RefreshMonitor
+
+
+def test_starved_address():
+	monitor = RefreshMonitor(threshold=0.5)
+	assert monitor.Packet(0.0, '3(S)', 'a') == []
+	assert monitor.Packet(0.1, '4(S)', 'b') == []
+	assert monitor.Packet(0.45, '4(S)', 'c') == []
+	(kind, address, start, end, message), = monitor.Packet(0.7, '4(S)', 'd')
+	assert (kind, address, start, end) == ('starved', '3(S)', 'a', 'd')
+	assert message == "3(S) not refreshed for 700.0 ms"
+	assert monitor.ActiveAddresses() == ['4(S)']
+	#
+	# Reported once until the address is seen again
+	#
+	assert monitor.Packet(1.5, None, 'e') == [('starved', '4(S)', 'd', 'e', "4(S) not refreshed for 800.0 ms")]
+	assert monitor.Packet(1.6, '3(S)', 'f') == []
+	assert sorted(monitor.ActiveAddresses()) == ['3(S)']
+
+def test_refreshed_address_not_reported():
+	monitor = RefreshMonitor(threshold=0.5)
+	for i in range(20):
+		assert monitor.Packet(i * 0.4, '3(S)') == []
+
+def test_packet_rate_floor():
+	monitor = RefreshMonitor(threshold=10.0, window=1.0, floor=20.0)
+	warnings = []
+	t = 0.0
+	for spacing in [0.02] * 100 + [0.1] * 20 + [0.02] * 100:
+		warnings += monitor.Packet(t, None, t)
+		t += spacing
+	assert [kind for (kind, address, start, end, message) in warnings] == ['rate']
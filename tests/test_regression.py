@@ -0,0 +1,30 @@
+import filecmp
+import glob
+import os
+
+import pytest
+
+import DCCFrames
+import DCCRegression
+
+
+FRAMES = sorted(glob.glob(os.path.join(DCCRegression.CORPUS, '*.frames.csv')))
+
+@pytest.mark.parametrize("path", FRAMES, ids=[os.path.basename(path)[:-len('.frames.csv')] for path in FRAMES])
+def test_golden(path):
+	rows, error = DCCRegression.decode(list(DCCFrames.read_frames(path)))
+	assert error is None
+	assert rows == DCCRegression.read_golden(path.replace('.frames.csv', '.golden.csv'))
+
+#
+# The checked in synthetic streams are what --bless would write
+#
+@pytest.mark.parametrize("name", sorted(DCCRegression.SYNTHETIC))
+def test_synthetic_streams(tmp_path, name):
+	path = str(tmp_path / (name + '.frames.csv'))
+	DCCFrames.write_frames(path, DCCRegression.synthetic_frames(DCCRegression.SYNTHETIC[name]()))
+	assert filecmp.cmp(path, os.path.join(DCCRegression.CORPUS, name + '.frames.csv'), shallow=False)
+
+def test_addresses_124_127_decode_as_operations_mode():
+	rows = DCCRegression.read_golden(os.path.join(DCCRegression.CORPUS, 'addresses_124_127.golden.csv'))
+	assert [row[4] for row in rows[:4]] == ['124(S)', '125(S)', '126(S)', '127(S)']
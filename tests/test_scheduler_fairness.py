@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import SchedulerFairness
+from SchedulerFairness import IntervalHistogram, SchedulerStats, instruction_kind
+
+
+def locomotive(address, packet):
+	return { 'address': address, 'packet': packet }
+
+def test_instruction_kind():
+	assert instruction_kind('03 3f 80 bc') == 'speed'
+	assert instruction_kind('03 60 63') == 'speed'
+	assert instruction_kind('c3 e8 90 bb') == 'function0'
+	assert instruction_kind('03 b1 b2') == 'function1'
+	assert instruction_kind('03 a1 a2') == 'function2'
+	assert instruction_kind('03 de 01 dc') == 'function3'
+	assert instruction_kind('ff 00 ff') is None
+	assert instruction_kind('03 00 03') is None
+
+def test_jain():
+	assert SchedulerFairness.jain([5, 5, 5]) == 1.0
+	assert SchedulerFairness.jain([9, 0, 0]) == pytest.approx(1.0 / 3)
+
+def test_histogram_percentiles():
+	histogram = IntervalHistogram()
+	assert histogram.Percentiles() == {}
+	for value in [0.01] * 90 + [0.1] * 10:
+		histogram.Add(value)
+	result = histogram.Percentiles()
+	assert result['max'] == 0.1
+	assert result['mean'] == pytest.approx(0.019)
+	assert 0.01 <= result['p50'] < 0.012
+	assert result['p99'] == 0.1
+
+def test_round_robin():
+	stats = SchedulerStats(window=0.1)
+	t = 0.0
+	for n in range(30):
+		for address, number in (('3(S)', 3), ('4(S)', 4)):
+			speed = 0x60 if n < 10 else 0x70
+			stats.Add('Packet', t, t + 0.005, locomotive(address, '%02x %02x %02x' % (number, speed, number ^ speed)))
+			t += 0.01
+		stats.Add('Packet', t, t + 0.005, { 'packet': 'ff 00 ff' })
+		t += 0.01
+	stats.Add('Error', t, t + 0.005, { 'error': 'truncated packet' })
+	report = stats.Report()
+	assert report['packets'] == 90
+	assert report['errors'] == 1
+	assert report['locomotives'] == 2
+	assert report['mix']['idle'] == pytest.approx(1.0 / 3)
+	assert report['idle']['max_run'] == 1
+	assert report['fairness']['overall'] == 1.0
+	assert report['changes']['count'] == 2
+	for state in report['addresses'].values():
+		assert state['packets'] == 30
+		assert state['between'] == 2
+		assert state['interval']['max'] == pytest.approx(0.03)
+
+def test_analyze_corpus():
+	corpus = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'corpus')
+	report = SchedulerFairness.analyze(os.path.join(corpus, 'addresses.frames.csv'))
+	assert report['packets'] > 0
+	assert report['locomotives'] > 1
+	assert sum(report['mix'].values()) == pytest.approx(1.0)
@@ -0,0 +1,71 @@
+import io
+import json
+import os
+
+import DCCFrames
+import SoakDecoder
+from SoakDecoder import SoakStats
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'corpus')
+
+def packet(address, t):
+	return ('Packet', t, t + 0.005, { 'address': address, 'packet': '03 60 63' })
+
+def test_histogram_bin():
+	assert SoakDecoder.histogram_bin(0.0001) == 0
+	assert SoakDecoder.histogram_bin(0.003) == 3
+	assert SoakDecoder.histogram_bin(10.0) == len(SoakDecoder.HISTOGRAM_EDGES)
+
+def test_buckets_and_anomalies():
+	buckets = io.StringIO()
+	anomalies = io.StringIO()
+	stats = SoakStats(bucket=1.0, ring=4, after=2, bucket_out=buckets, anomaly_out=anomalies)
+	t = 0.0
+	for n in range(20):
+		stats.Add(*packet('3(S)', t))
+		t += 0.125
+	stats.Add('Error', t, t + 0.005, { 'error': 'bad error detection byte', 'packet': '03 60 00' })
+	for n in range(3):
+		t += 0.125
+		stats.Add(*packet('3(S)', t))
+	summary = stats.Finish()
+	assert summary['packets'] == 24
+	assert summary['anomalies'] == 1
+	assert summary['errors'] == { 'bad error detection byte': 1 }
+	assert summary['addresses'] == { '3(S)': 23 }
+
+	lines = [json.loads(line) for line in buckets.getvalue().splitlines()]
+	assert [line['packets'] for line in lines] == [8, 8, 8]
+	assert lines[0]['refresh_histogram'][SoakDecoder.histogram_bin(0.125)] == 7
+
+	anomaly, = [json.loads(line) for line in anomalies.getvalue().splitlines()]
+	assert anomaly['reason'] == 'bad error detection byte'
+	assert len(anomaly['before']) == 4
+	assert len(anomaly['after']) == 2
+
+def test_refresh_gap_anomaly():
+	stats = SoakStats(refresh_threshold=0.5)
+	stats.Add(*packet('3(S)', 0.0))
+	stats.Add(*packet('4(S)', 0.3))
+	stats.Add(*packet('4(S)', 0.9))
+	stats.Add(*packet('3(S)', 1.0))
+	assert stats.Anomalies >= 1
+	assert stats.Pending[0]['reason'].startswith('3(S)')
+
+def test_max_anomalies():
+	stats = SoakStats(max_anomalies=2)
+	for n in range(5):
+		stats.Add('Error', n * 0.01, n * 0.01 + 0.005, { 'error': 'truncated packet' })
+	assert stats.Anomalies == 5
+	assert len(stats.Pending) == 2
+
+def test_soak(tmp_path):
+	out = str(tmp_path / "soak")
+	summary = SoakDecoder.soak(DCCFrames.read_frames(os.path.join(CORPUS, 'packet_errors.frames.csv')), out, bucket=0.1)
+	assert summary['packets'] > 0
+	assert summary['anomalies'] >= 1
+	for name in ('buckets.jsonl', 'anomalies.jsonl', 'summary.json'):
+		assert os.path.exists(os.path.join(out, name))
+	with open(os.path.join(out, 'buckets.jsonl')) as f:
+		assert sum(json.loads(line)['packets'] for line in f) == summary['packets']
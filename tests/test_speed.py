@@ -0,0 +1,50 @@
+import pytest
+
+import DCCSpeed
+
+
+STEP_FROM = {
+	14: lambda byte: DCCSpeed.STEP_FROM_14[byte & 0x0F],
+	28: lambda byte: DCCSpeed.STEP_FROM_28[byte & 0x1F],
+	128: lambda byte: DCCSpeed.STEP_FROM_128[byte & 0x7F],
+}
+
+#
+# Throttle side to decoder side and back: step -> JMRI speed setting ->
+# step -> instruction byte -> step
+#
+@pytest.mark.parametrize("mode", DCCSpeed.MODES)
+@pytest.mark.parametrize("forward", [True, False])
+def test_round_trip(mode, forward):
+	for step in range(DCCSpeed.ESTOP[mode] + 1):
+		setting = DCCSpeed.speed_setting(mode, step)
+		assert DCCSpeed.speed_step(setting, mode) == step
+		byte = DCCSpeed.instruction(mode, forward, DCCSpeed.speed_step(setting, mode))[-1]
+		assert bool(byte & (0x80 if mode == 128 else 0x20)) == forward
+		assert STEP_FROM[mode](byte) == step
+
+@pytest.mark.parametrize("mode, forward, expected", [
+	(14, True, [0x61]), (14, False, [0x41]),
+	(28, True, [0x61]), (28, False, [0x41]),
+	(128, True, [0x3F, 0x81]), (128, False, [0x3F, 0x01]),
+])
+def test_estop(mode, forward, expected):
+	assert DCCSpeed.speed_step(-1.0, mode) == DCCSpeed.ESTOP[mode]
+	assert DCCSpeed.instruction(mode, forward, DCCSpeed.ESTOP[mode]) == expected
+
+def test_28_step_bits():
+	assert DCCSpeed.instruction(28, True, 0) == [0x60]
+	assert DCCSpeed.instruction(28, True, 1) == [0x62]
+	assert DCCSpeed.instruction(28, True, 2) == [0x72]
+	assert DCCSpeed.instruction(28, True, 28) == [0x7F]
+	#
+	# STOP(I) and ESTOP(I) decode as STOP and ESTOP
+	#
+	assert DCCSpeed.STEP_FROM_28[0x10] == 0
+	assert DCCSpeed.STEP_FROM_28[0x11] == DCCSpeed.ESTOP[28]
+
+def test_speed_setting_rounding():
+	assert DCCSpeed.speed_step(0.001, 128) == 1
+	assert DCCSpeed.speed_step(1.5, 28) == 28
+	assert DCCSpeed.speed_setting(28, 40) == 0.0
+	assert DCCSpeed.instruction(14, True, 5, fl=True) == [0x76]